@@ -21,6 +21,7 @@ from posthog.models.filters.retention_filter import RetentionFilter
 from posthog.models.filters.session_recordings_filter import SessionRecordingsFilter
 from posthog.models.filters.stickiness_filter import StickinessFilter
 from posthog.models.filters.filter import Filter
+from posthog.models.instance_setting import override_instance_config
 from posthog.models.property import PropertyName, TableWithProperties
 from posthog.constants import FunnelCorrelationType
 
@@ -135,6 +136,26 @@ class QuerySuite:
 
         Trends().run(filter, self.team)
 
+    @benchmark_clickhouse
+    def track_trends_event_property_breakdown_single_pass(self):
+        filter = Filter(data={"events": [{"id": "$pageview"}], "breakdown": "$host", **DATE_RANGE,})
+
+        with override_instance_config("SINGLE_PASS_BREAKDOWN_TEAMS", "all"):
+            Trends().run(filter, self.team)
+
+    @benchmark_clickhouse_read_rows
+    def track_trends_event_property_breakdown_read_rows(self):
+        filter = Filter(data={"events": [{"id": "$pageview"}], "breakdown": "$host", **DATE_RANGE,})
+
+        Trends().run(filter, self.team)
+
+    @benchmark_clickhouse_read_rows
+    def track_trends_event_property_breakdown_single_pass_read_rows(self):
+        filter = Filter(data={"events": [{"id": "$pageview"}], "breakdown": "$host", **DATE_RANGE,})
+
+        with override_instance_config("SINGLE_PASS_BREAKDOWN_TEAMS", "all"):
+            Trends().run(filter, self.team)
+
     @benchmark_clickhouse
     def track_trends_person_property_breakdown(self):
         filter = Filter(
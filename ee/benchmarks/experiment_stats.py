@@ -0,0 +1,45 @@
+# isort: skip_file
+# Needs to be first to set up django environment
+from .helpers import *
+from ee.clickhouse.queries.experiments.funnel_experiment_result import (
+    ClickhouseFunnelExperimentResult,
+    Variant,
+    calculate_expected_loss,
+)
+from ee.clickhouse.queries.experiments.trend_experiment_result import ClickhouseTrendExperimentResult
+from ee.clickhouse.queries.experiments.trend_experiment_result import Variant as CountVariant
+from ee.clickhouse.queries.experiments.trend_experiment_result import calculate_p_value
+
+
+class ExperimentStatsSuite:
+    "What experiment results spend computing their statistics, once ClickHouse returned."
+
+    version = "v001"
+    params = [2, 4, 8]
+    param_names = ["variants"]
+
+    def setup(self, variants: int):
+        self.control = Variant("control", 1_200, 8_800)
+        self.test_variants = [Variant(f"test_{i}", 1_200 + 15 * i, 8_800 - 15 * i) for i in range(1, variants)]
+
+        self.count_control = CountVariant("control", 25_000, 1, 10_000)
+        self.count_test_variants = [CountVariant(f"test_{i}", 25_000 + 100 * i, 1, 10_000) for i in range(1, variants)]
+
+    def time_funnel_results(self, variants: int):
+        samples = ClickhouseFunnelExperimentResult.sample_conversion_rates(self.control, self.test_variants)
+        probabilities = samples.probabilities_of_winning()
+        ClickhouseFunnelExperimentResult.are_results_significant(
+            self.control, self.test_variants, probabilities, samples
+        )
+        samples.credible_intervals()
+
+    def time_expected_loss(self, variants: int):
+        calculate_expected_loss(self.test_variants[-1], [self.control, *self.test_variants[:-1]])
+
+    def time_trend_results(self, variants: int):
+        samples = ClickhouseTrendExperimentResult.sample_arrival_rates(self.count_control, self.count_test_variants)
+        samples.probabilities_of_winning()
+        samples.credible_intervals()
+
+    def time_trend_p_value(self, variants: int):
+        calculate_p_value(self.count_control, self.count_test_variants)
@@ -16,6 +16,7 @@ django.setup()
 
 from ee.clickhouse.materialized_columns.columns import get_materialized_columns
 from posthog import client
+from posthog.clickhouse.query_tagging import tag_queries
 from posthog.models.utils import UUIDT
 
 get_column = lambda rows, index: [row[index] for row in rows]
@@ -23,12 +24,9 @@ get_column = lambda rows, index: [row[index] for row in rows]
 
 def run_query(fn, *args):
     uuid = str(UUIDT())
-    client._request_information = {"kind": "benchmark", "id": f"{uuid}::${fn.__name__}"}
-    try:
+    with tag_queries(kind="benchmark", id=f"{uuid}::${fn.__name__}"):
         fn(*args)
-        return get_clickhouse_query_stats(uuid)
-    finally:
-        client._request_information = None
+    return get_clickhouse_query_stats(uuid)
 
 
 def get_clickhouse_query_stats(uuid):
@@ -70,6 +68,20 @@ def benchmark_clickhouse(fn):
     return inner
 
 
+def benchmark_clickhouse_read_rows(fn):
+    "Like benchmark_clickhouse, but tracks how many rows queries read rather than how long they took"
+
+    @wraps(fn)
+    def inner(*args):
+        samples = [run_query(fn, *args)["read_rows"] for _ in range(4)]
+        return {
+            "samples": samples,
+            "number": len(samples),
+        }
+
+    return inner
+
+
 @contextmanager
 def no_materialized_columns():
     "Allows running a function without any materialized columns being used in query"
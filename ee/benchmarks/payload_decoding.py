@@ -0,0 +1,65 @@
+# isort: skip_file
+# Needs to be first to set up django environment
+from .helpers import *
+import base64
+import gzip
+import json
+import random
+
+import lzstring
+
+from posthog.utils import decompress
+
+
+def _event_batch(size: int):
+    "A batch shaped like what posthog-js sends, with enough variety in it to not compress unrealistically well."
+    rng = random.Random(0)
+    return [
+        {
+            "event": rng.choice(["$pageview", "$autocapture", "$pageleave", "signed up"]),
+            "properties": {
+                "distinct_id": f"user-{rng.randint(0, 10_000)}",
+                "token": "phc_benchmarkbenchmarkbenchmarkbenchmark",
+                "$current_url": f"https://example.com/{rng.choice(['pricing', 'docs', 'blog'])}/{rng.randint(0, 500)}",
+                "$browser": rng.choice(["Chrome", "Firefox", "Safari"]),
+                "$screen_width": rng.choice([1280, 1440, 1920]),
+                "$elements": [
+                    {"tag_name": "button", "attr__class": "btn btn-primary", "nth_child": i, "$el_text": "Sign up 💻"}
+                    for i in range(rng.randint(0, 5))
+                ],
+                "$time": 1660000000 + rng.random() * 1000,
+            },
+        }
+        for _ in range(size)
+    ]
+
+
+class PayloadDecodingSuite:
+    version = "v001"
+
+    def setup(self):
+        payload = json.dumps(_event_batch(500))
+        encoded = payload.encode("utf-8")
+
+        self.plain = encoded
+        self.base64 = base64.b64encode(encoded).decode("utf-8")
+        self.gzip = gzip.compress(encoded)
+        self.lz64 = lzstring.LZString().compressToBase64(payload)
+
+    def time_decompress_plain(self):
+        decompress(self.plain, "")
+
+    def time_decompress_base64(self):
+        decompress(self.base64, "")
+
+    def time_decompress_gzip(self):
+        decompress(self.gzip, "gzip")
+
+    def time_decompress_gzip_js(self):
+        decompress(self.gzip, "gzip-js")
+
+    def time_decompress_gzip_undeclared(self):
+        decompress(self.gzip, "")
+
+    def time_decompress_lz64(self):
+        decompress(self.lz64, "lz64")
@@ -2,7 +2,6 @@ from dataclasses import asdict, dataclass
 from datetime import datetime
 from typing import List, Optional, Tuple, Type
 
-from numpy.random import default_rng
 from rest_framework.exceptions import ValidationError
 
 from ee.clickhouse.queries.experiments import (
@@ -10,6 +9,7 @@ from ee.clickhouse.queries.experiments import (
     FF_DISTRIBUTION_THRESHOLD,
     MIN_PROBABILITY_FOR_SIGNIFICANCE,
 )
+from ee.clickhouse.queries.experiments.stats import PosteriorSamples
 from posthog.constants import ExperimentSignificanceCode
 from posthog.models.feature_flag import FeatureFlag
 from posthog.models.filters.filter import Filter
@@ -36,7 +36,7 @@ class ClickhouseFunnelExperimentResult:
     1. A Funnel Breakdown based on Feature Flag values
     2. Probability that Feature Flag value 1 has better conversion rate then FeatureFlag value 2
 
-    Currently, we support a maximum of 4 feature flag values: control and 3 test variants
+    Any number of feature flag values is supported: control and at least one test variant
 
     The passed in Filter determines which funnel to create, along with the experiment start & end date values
 
@@ -44,7 +44,7 @@ class ClickhouseFunnelExperimentResult:
     we assume the conversion rate follows a Beta(10, 12) distribution. Same for `test` variant.
 
     Then, we calculcate how many times a sample from `test` variant is higher than a sample from the `control` variant. This becomes the
-    probability.
+    probability. Expected loss and credible intervals are calculated from the same samples.
     """
 
     def __init__(
@@ -78,13 +78,18 @@ class ClickhouseFunnelExperimentResult:
         filtered_results = [result for result in funnel_results if result[0]["breakdown_value"][0] in self.variants]
         control_variant, test_variants = self.get_variants(filtered_results)
 
-        probabilities = self.calculate_results(control_variant, test_variants)
+        samples = self.sample_conversion_rates(control_variant, test_variants)
+        probabilities = samples.probabilities_of_winning()
 
         mapping = {
             variant.key: probability for variant, probability in zip([control_variant, *test_variants], probabilities)
         }
 
-        significance_code, loss = self.are_results_significant(control_variant, test_variants, probabilities)
+        significance_code, loss = self.are_results_significant(control_variant, test_variants, probabilities, samples)
+        credible_intervals = {
+            variant.key: interval
+            for variant, interval in zip([control_variant, *test_variants], samples.credible_intervals())
+        }
 
         return {
             "insight": filtered_results,
@@ -93,6 +98,7 @@ class ClickhouseFunnelExperimentResult:
             "filters": self.funnel._filter.to_dict(),
             "significance_code": significance_code,
             "expected_loss": loss,
+            "credible_intervals": credible_intervals,
             "variants": [asdict(variant) for variant in [control_variant, *test_variants]],
         }
 
@@ -118,8 +124,6 @@ class ClickhouseFunnelExperimentResult:
         """
         Calculates probability that A is better than B. First variant is control, rest are test variants.
 
-        Supports maximum 4 variants today
-
         For each variant, we create a Beta distribution of conversion rates,
         where alpha (successes) = success count of variant + prior success
         beta (failures) = failure count + variant + prior failures
@@ -129,21 +133,28 @@ class ClickhouseFunnelExperimentResult:
 
         By default, we choose a non-informative prior. That is, both success & failure are equally likely.
         """
+        return ClickhouseFunnelExperimentResult.sample_conversion_rates(
+            control_variant, test_variants, priors
+        ).probabilities_of_winning()
 
+    @staticmethod
+    def sample_conversion_rates(
+        control_variant: Variant, test_variants: List[Variant], priors: Tuple[int, int] = (1, 1)
+    ) -> PosteriorSamples:
         if not control_variant:
             raise ValidationError("No control variant data found", code="no_data")
 
-        if len(test_variants) > 3:
-            raise ValidationError("Can't calculate A/B test results for more than 4 variants", code="too_much_data")
-
         if len(test_variants) < 1:
             raise ValidationError("Can't calculate A/B test results for less than 2 variants", code="no_data")
 
-        return calculate_probability_of_winning_for_each([control_variant, *test_variants])
+        return sample_conversion_rates([control_variant, *test_variants], priors)
 
     @staticmethod
     def are_results_significant(
-        control_variant: Variant, test_variants: List[Variant], probabilities: List[Probability]
+        control_variant: Variant,
+        test_variants: List[Variant],
+        probabilities: List[Probability],
+        samples: Optional[PosteriorSamples] = None,
     ) -> Tuple[ExperimentSignificanceCode, Probability]:
         control_sample_size = control_variant.success_count + control_variant.failure_count
 
@@ -167,7 +178,9 @@ class ClickhouseFunnelExperimentResult:
             test_variants, key=lambda variant: variant.success_count / (variant.success_count + variant.failure_count)
         )
 
-        expected_loss = calculate_expected_loss(best_test_variant, [control_variant])
+        if samples is None:
+            samples = sample_conversion_rates([control_variant, *test_variants])
+        expected_loss = samples.expected_loss(1 + test_variants.index(best_test_variant), against=[0])
 
         if expected_loss >= EXPECTED_LOSS_SIGNIFICANCE_LEVEL:
             return ExperimentSignificanceCode.HIGH_LOSS, expected_loss
@@ -175,6 +188,12 @@ class ClickhouseFunnelExperimentResult:
         return ExperimentSignificanceCode.SIGNIFICANT, expected_loss
 
 
+def sample_conversion_rates(variants: List[Variant], priors: Tuple[int, int] = (1, 1)) -> PosteriorSamples:
+    return PosteriorSamples.of_conversion_rates(
+        [variant.success_count for variant in variants], [variant.failure_count for variant in variants], priors
+    )
+
+
 def calculate_expected_loss(target_variant: Variant, variants: List[Variant]) -> float:
     """
     Calculates expected loss in conversion rate for a given variant.
@@ -187,93 +206,11 @@ def calculate_expected_loss(target_variant: Variant, variants: List[Variant]) ->
     The unit of the return value is conversion rate values
 
     """
-    random_sampler = default_rng()
-    prior_success = 1
-    prior_failure = 1
-    simulations_count = 100_000
-
-    variant_samples = []
-    for variant in variants:
-        # Get `N=simulations` samples from a Beta distribution with alpha = prior_success + variant_sucess,
-        # and beta = prior_failure + variant_failure
-        samples = random_sampler.beta(
-            variant.success_count + prior_success, variant.failure_count + prior_failure, simulations_count
-        )
-        variant_samples.append(samples)
-
-    target_variant_samples = random_sampler.beta(
-        target_variant.success_count + prior_success, target_variant.failure_count + prior_failure, simulations_count
-    )
-
-    loss = 0
-    variant_conversions = list(zip(*variant_samples))
-    for i in range(simulations_count):
-        loss += max(0, max(variant_conversions[i]) - target_variant_samples[i])
-
-    return loss / simulations_count
-
-
-def simulate_winning_variant_for_conversion(target_variant: Variant, variants: List[Variant]) -> Probability:
-    random_sampler = default_rng()
-    prior_success = 1
-    prior_failure = 1
-    simulations_count = 100_000
-
-    variant_samples = []
-    for variant in variants:
-        # Get `N=simulations` samples from a Beta distribution with alpha = prior_success + variant_sucess,
-        # and beta = prior_failure + variant_failure
-        samples = random_sampler.beta(
-            variant.success_count + prior_success, variant.failure_count + prior_failure, simulations_count
-        )
-        variant_samples.append(samples)
-
-    target_variant_samples = random_sampler.beta(
-        target_variant.success_count + prior_success, target_variant.failure_count + prior_failure, simulations_count
-    )
-
-    winnings = 0
-    variant_conversions = list(zip(*variant_samples))
-    for i in range(simulations_count):
-        if target_variant_samples[i] > max(variant_conversions[i]):
-            winnings += 1
-
-    return winnings / simulations_count
+    return sample_conversion_rates([target_variant, *variants]).expected_loss(0)
 
 
 def calculate_probability_of_winning_for_each(variants: List[Variant]) -> List[Probability]:
     """
     Calculates the probability of winning for each variant.
     """
-    if len(variants) == 2:
-        # simple case
-        probability = simulate_winning_variant_for_conversion(variants[1], [variants[0]])
-        return [max(0, 1 - probability), probability]
-
-    elif len(variants) == 3:
-        probability_third_wins = simulate_winning_variant_for_conversion(variants[2], [variants[0], variants[1]])
-        probability_second_wins = simulate_winning_variant_for_conversion(variants[1], [variants[0], variants[2]])
-        return [
-            max(0, 1 - probability_third_wins - probability_second_wins),
-            probability_second_wins,
-            probability_third_wins,
-        ]
-
-    elif len(variants) == 4:
-        probability_second_wins = simulate_winning_variant_for_conversion(
-            variants[1], [variants[0], variants[2], variants[3]]
-        )
-        probability_third_wins = simulate_winning_variant_for_conversion(
-            variants[2], [variants[0], variants[1], variants[3]]
-        )
-        probability_fourth_wins = simulate_winning_variant_for_conversion(
-            variants[3], [variants[0], variants[1], variants[2]]
-        )
-        return [
-            max(0, 1 - probability_second_wins - probability_third_wins - probability_fourth_wins),
-            probability_second_wins,
-            probability_third_wins,
-            probability_fourth_wins,
-        ]
-    else:
-        raise ValidationError("Can't calculate A/B test results for more than 4 variants", code="too_much_data")
+    return sample_conversion_rates(variants).probabilities_of_winning()
@@ -0,0 +1,109 @@
+"""
+Bayesian statistics of experiments, computed on samples of the posterior distribution of every variant's rate.
+
+All the samples of an experiment are drawn at once, into a matrix with a row per simulation and a column per variant,
+from which every statistic is computed with array operations, for any number of variants.
+"""
+from math import lgamma
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.random import default_rng
+
+Probability = float
+
+SIMULATIONS_COUNT = 100_000
+
+# Terms of p-values summed at once
+P_VALUE_CHUNK_SIZE = 65_536
+
+
+class PosteriorSamples:
+    def __init__(self, samples: np.ndarray):
+        # shape: (simulations, variants)
+        self.samples = samples
+
+    @classmethod
+    def of_conversion_rates(
+        cls,
+        success_counts: Sequence[int],
+        failure_counts: Sequence[int],
+        priors: Tuple[int, int] = (1, 1),
+        simulations_count: int = SIMULATIONS_COUNT,
+    ) -> "PosteriorSamples":
+        """
+        Conversion rates follow a Beta distribution, with alpha = successes + prior successes
+        and beta = failures + prior failures.
+        """
+        alpha = np.asarray(success_counts) + priors[0]
+        beta = np.asarray(failure_counts) + priors[1]
+        return cls(default_rng().beta(alpha, beta, size=(simulations_count, len(alpha))))
+
+    @classmethod
+    def of_arrival_rates(
+        cls, counts: Sequence[int], exposures: Sequence[float], simulations_count: int = SIMULATIONS_COUNT
+    ) -> "PosteriorSamples":
+        """
+        Arrival rates follow a Gamma distribution, with shape = count + 1 and scale = 1 / relative exposure.
+        """
+        shape = np.asarray(counts) + 1
+        scale = 1 / np.asarray(exposures, dtype=float)
+        return cls(default_rng().gamma(shape, scale, size=(simulations_count, len(shape))))
+
+    def probabilities_of_winning(self) -> List[Probability]:
+        "How often each variant has the highest rate of all."
+        winners = np.argmax(self.samples, axis=1)
+        return (np.bincount(winners, minlength=self.samples.shape[1]) / len(self.samples)).tolist()
+
+    def expected_loss(self, target: int, against: Optional[Sequence[int]] = None) -> float:
+        """
+        Expected loss in rate from choosing the `target` variant over the best of the others, or of those `against`.
+        Loss calculation comes from VWO's SmartStats technical paper:
+        https://cdn2.hubspot.net/hubfs/310840/VWO_SmartStats_technical_whitepaper.pdf (pg 12)
+        """
+        others = [index for index in range(self.samples.shape[1]) if index != target] if against is None else against
+        best_of_others = self.samples[:, others].max(axis=1)
+        return float(np.maximum(best_of_others - self.samples[:, target], 0).mean())
+
+    def credible_intervals(self, interval: float = 0.95) -> List[Tuple[float, float]]:
+        "The range each variant's rate is within with `interval` probability, leaving out the same odds on each side."
+        lower, upper = np.quantile(self.samples, [(1 - interval) / 2, (1 + interval) / 2], axis=0)
+        return list(zip(lower.tolist(), upper.tolist()))
+
+
+def poisson_p_value(control_count: int, control_exposure: float, test_count: int, test_exposure: float) -> float:
+    """
+    Calculates the p-value of the A/B test.
+    Calculations from: https://www.evanmiller.org/statistical-formulas-for-programmers.html#count_test
+    """
+    relative_exposure = test_exposure / (control_exposure + test_exposure)
+    total_count = control_count + test_count
+
+    if 0 < relative_exposure < 1:
+        low_p_value = _binomial_probability_between(total_count, relative_exposure, 0, test_count)
+        high_p_value = _binomial_probability_between(total_count, relative_exposure, test_count, total_count)
+    else:
+        # Either variant had no exposure, so every event is expected to be of the other
+        expected_test_count = total_count if relative_exposure >= 1 else 0
+        low_p_value = float(test_count >= expected_test_count)
+        high_p_value = float(test_count <= expected_test_count)
+
+    return float(min(1, 2 * min(low_p_value, high_p_value)))
+
+
+def _binomial_probability_between(total_count: int, probability: float, low: int, high: int) -> float:
+    """
+    The probability of between `low` and `high` successes, inclusive, out of `total_count` trials. Summed a chunk of
+    terms at a time, so that memory doesn't grow with the counts.
+    """
+    log_probability, log_complement = np.log(probability), np.log1p(-probability)
+    result = 0.0
+    for start in range(low, high + 1, P_VALUE_CHUNK_SIZE):
+        counts = np.arange(start, min(start + P_VALUE_CHUNK_SIZE, high + 1))
+        # log(n choose k) of the first count, and of every following one from the ratio to the one before
+        log_coefficients = lgamma(total_count + 1) - lgamma(start + 1) - lgamma(total_count - start + 1)
+        log_coefficients += np.concatenate(
+            ([0.0], np.cumsum(np.log(total_count - counts[1:] + 1) - np.log(counts[1:])))
+        )
+        result += np.exp(log_coefficients + counts * log_probability + (total_count - counts) * log_complement).sum()
+    return float(result)
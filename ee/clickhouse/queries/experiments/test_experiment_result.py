@@ -316,6 +316,30 @@ class TestFunnelExperimentCalculator(unittest.TestCase):
         self.assertAlmostEqual(loss, 0, places=2)
         self.assertEqual(significant, ExperimentSignificanceCode.SIGNIFICANT)
 
+    def test_calculate_results_for_many_test_variants(self):
+        variant_control = Variant("B", 100, 18)
+        test_variants = [Variant(f"A{i}", 100, 18 + i) for i in range(5)] + [Variant("C", 100, 3)]
+
+        probabilities = ClickhouseFunnelExperimentResult.calculate_results(variant_control, test_variants)
+        self.assertEqual(len(probabilities), 7)
+        self.assertAlmostEqual(sum(probabilities), 1)
+        self.assertAlmostEqual(probabilities[-1], 0.99, places=1)
+
+        alternative_probability = calculate_probability_of_winning_for_target(
+            test_variants[-1], [variant_control, *test_variants[:3]]
+        )
+        self.assertAlmostEqual(probabilities[-1], alternative_probability, places=1)
+
+    def test_credible_intervals(self):
+        samples = ClickhouseFunnelExperimentResult.sample_conversion_rates(Variant("B", 10, 90), [Variant("A", 50, 50)])
+
+        (control_lower, control_upper), (test_lower, test_upper) = samples.credible_intervals()
+        # Beta(11, 91) and Beta(51, 51)
+        self.assertAlmostEqual(control_lower, 0.056, places=2)
+        self.assertAlmostEqual(control_upper, 0.175, places=2)
+        self.assertAlmostEqual(test_lower, 0.403, places=2)
+        self.assertAlmostEqual(test_upper, 0.597, places=2)
+
 
 # calculation: https://www.evanmiller.org/bayesian-ab-testing.html#count_ab
 def calculate_probability_of_winning_for_target_count_data(
@@ -484,3 +508,32 @@ class TestTrendExperimentCalculator(unittest.TestCase):
         self.assertAlmostEqual(p_value, 1, places=3)
         # False because max probability is less than 0.9
         self.assertEqual(significant, ExperimentSignificanceCode.LOW_WIN_PROBABILITY)
+
+    def test_calculate_results_with_many_variants(self):
+        variant_a = CountVariant("A", 20, 1, 200)  # control
+        variants = [CountVariant(key, 20, 1, 200) for key in "BCDEF"]
+
+        probabilities = ClickhouseTrendExperimentResult.calculate_results(variant_a, variants)
+        self.assertEqual(len(probabilities), 6)
+        self.assertAlmostEqual(sum(probabilities), 1)
+        for probability in probabilities:
+            self.assertAlmostEqual(probability, 1 / 6, places=1)
+
+    def test_p_value_of_large_counts(self):
+        variant_a = CountVariant("A", 5_000_000, 1, 10_000_000)
+        variant_b = CountVariant("B", 5_003_000, 1, 10_000_000)
+
+        p_value = calculate_p_value(variant_a, [variant_b])
+        self.assertAlmostEqual(p_value, 0.343, places=3)
+
+    def test_p_value_without_exposure(self):
+        variant_a = CountVariant("A", 10, 1, 200)
+        variant_b = CountVariant("B", 0, 0, 0)
+
+        p_value = calculate_p_value(variant_a, [variant_b])
+        self.assertEqual(p_value, 1)
+
+        variant_b = CountVariant("B", 5, 0, 0)
+
+        p_value = calculate_p_value(variant_a, [variant_b])
+        self.assertEqual(p_value, 0)
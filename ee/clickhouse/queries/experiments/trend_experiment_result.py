@@ -1,10 +1,7 @@
 from dataclasses import asdict, dataclass
 from datetime import datetime
-from functools import lru_cache
-from math import exp, lgamma, log
 from typing import List, Optional, Tuple, Type
 
-from numpy.random import default_rng
 from rest_framework.exceptions import ValidationError
 
 from ee.clickhouse.queries.experiments import (
@@ -12,6 +9,7 @@ from ee.clickhouse.queries.experiments import (
     FF_DISTRIBUTION_THRESHOLD,
     MIN_PROBABILITY_FOR_SIGNIFICANCE,
 )
+from ee.clickhouse.queries.experiments.stats import PosteriorSamples, poisson_p_value
 from posthog.constants import ACTIONS, EVENTS, TRENDS_CUMULATIVE, ExperimentSignificanceCode
 from posthog.models.feature_flag import FeatureFlag
 from posthog.models.filters.filter import Filter
@@ -39,7 +37,7 @@ class ClickhouseTrendExperimentResult:
     1. A trend Breakdown based on Feature Flag values
     2. Probability that Feature Flag value 1 has better conversion rate then FeatureFlag value 2
 
-    Currently, it only supports two feature flag values: control and test
+    Any number of feature flag values is supported: control and at least one test variant
 
     The passed in Filter determines which trend to create, along with the experiment start & end date values
 
@@ -105,13 +103,18 @@ class ClickhouseTrendExperimentResult:
         exposure_results = self.insight.run(self.exposure_filter, self.team,)
         control_variant, test_variants = self.get_variants(insight_results, exposure_results)
 
-        probabilities = self.calculate_results(control_variant, test_variants)
+        samples = self.sample_arrival_rates(control_variant, test_variants)
+        probabilities = samples.probabilities_of_winning()
 
         mapping = {
             variant.key: probability for variant, probability in zip([control_variant, *test_variants], probabilities)
         }
 
         significance_code, p_value = self.are_results_significant(control_variant, test_variants, probabilities)
+        credible_intervals = {
+            variant.key: interval
+            for variant, interval in zip([control_variant, *test_variants], samples.credible_intervals())
+        }
 
         return {
             "insight": insight_results,
@@ -120,6 +123,7 @@ class ClickhouseTrendExperimentResult:
             "filters": self.query_filter.to_dict(),
             "significance_code": significance_code,
             "p_value": p_value,
+            "credible_intervals": credible_intervals,
             "variants": [asdict(variant) for variant in [control_variant, *test_variants]],
         }
 
@@ -169,22 +173,23 @@ class ClickhouseTrendExperimentResult:
         """
         Calculates probability that A is better than B. First variant is control, rest are test variants.
 
-        Supports maximum 4 variants today
-
         For each variant, we create a Gamma distribution of arrival rates,
         where alpha (shape parameter) = count of variant + 1
         beta (exposure parameter) = 1
         """
+        return ClickhouseTrendExperimentResult.sample_arrival_rates(
+            control_variant, test_variants
+        ).probabilities_of_winning()
+
+    @staticmethod
+    def sample_arrival_rates(control_variant: Variant, test_variants: List[Variant]) -> PosteriorSamples:
         if not control_variant:
             raise ValidationError("No control variant data found", code="no_data")
 
-        if len(test_variants) > 2:
-            raise ValidationError("Can't calculate A/B test results for more than 3 variants", code="too_much_data")
-
         if len(test_variants) < 1:
             raise ValidationError("Can't calculate A/B test results for less than 2 variants", code="no_data")
 
-        return calculate_probability_of_winning_for_each([control_variant, *test_variants])
+        return sample_arrival_rates([control_variant, *test_variants])
 
     @staticmethod
     def are_results_significant(
@@ -216,102 +221,17 @@ class ClickhouseTrendExperimentResult:
         return ExperimentSignificanceCode.SIGNIFICANT, p_value
 
 
-def simulate_winning_variant_for_arrival_rates(target_variant: Variant, variants: List[Variant]) -> float:
-    random_sampler = default_rng()
-    simulations_count = 100_000
-
-    variant_samples = []
-    for variant in variants:
-        # Get `N=simulations` samples from a Gamma distribution with alpha = variant_sucess + 1,
-        # and exposure = relative exposure of variant
-        samples = random_sampler.gamma(variant.count + 1, 1 / variant.exposure, simulations_count)
-        variant_samples.append(samples)
-
-    target_variant_samples = random_sampler.gamma(
-        target_variant.count + 1, 1 / target_variant.exposure, simulations_count
+def sample_arrival_rates(variants: List[Variant]) -> PosteriorSamples:
+    return PosteriorSamples.of_arrival_rates(
+        [variant.count for variant in variants], [variant.exposure for variant in variants]
     )
 
-    winnings = 0
-    variant_conversions = list(zip(*variant_samples))
-    for i in range(simulations_count):
-        if target_variant_samples[i] > max(variant_conversions[i]):
-            winnings += 1
-
-    return winnings / simulations_count
-
 
 def calculate_probability_of_winning_for_each(variants: List[Variant]) -> List[Probability]:
     """
     Calculates the probability of winning for each variant.
     """
-    if len(variants) == 2:
-        # simple case
-        probability = simulate_winning_variant_for_arrival_rates(variants[1], [variants[0]])
-        return [max(0, 1 - probability), probability]
-
-    elif len(variants) == 3:
-        probability_third_wins = simulate_winning_variant_for_arrival_rates(variants[2], [variants[0], variants[1]])
-        probability_second_wins = simulate_winning_variant_for_arrival_rates(variants[1], [variants[0], variants[2]])
-        return [
-            max(0, 1 - probability_third_wins - probability_second_wins),
-            probability_second_wins,
-            probability_third_wins,
-        ]
-
-    elif len(variants) == 4:
-        probability_fourth_wins = simulate_winning_variant_for_arrival_rates(
-            variants[3], [variants[0], variants[1], variants[2]]
-        )
-        probability_third_wins = simulate_winning_variant_for_arrival_rates(
-            variants[2], [variants[0], variants[1], variants[3]]
-        )
-        probability_second_wins = simulate_winning_variant_for_arrival_rates(
-            variants[1], [variants[0], variants[2], variants[3]]
-        )
-        return [
-            max(0, 1 - probability_fourth_wins - probability_third_wins - probability_second_wins),
-            probability_second_wins,
-            probability_third_wins,
-            probability_fourth_wins,
-        ]
-    else:
-        raise ValidationError("Can't calculate A/B test results for more than 4 variants", code="too_much_data")
-
-
-@lru_cache(maxsize=100_000)
-def combinationln(n: int, k: int) -> float:
-    """
-    Returns the log of the binomial coefficient.
-    """
-    return lgamma(n + 1) - lgamma(k + 1) - lgamma(n - k + 1)
-
-
-def intermediate_poisson_term(count: int, iterator: int, relative_exposure: float):
-    return exp(
-        combinationln(count, iterator)
-        + iterator * log(relative_exposure)
-        + (count - iterator) * log(1 - relative_exposure)
-    )
-
-
-def poisson_p_value(control_count, control_exposure, test_count, test_exposure):
-    """
-    Calculates the p-value of the A/B test.
-    Calculations from: https://www.evanmiller.org/statistical-formulas-for-programmers.html#count_test
-    """
-    relative_exposure = test_exposure / (control_exposure + test_exposure)
-    total_count = control_count + test_count
-
-    low_p_value = 0.0
-    high_p_value = 0.0
-
-    for i in range(test_count + 1):
-        low_p_value += intermediate_poisson_term(total_count, i, relative_exposure)
-
-    for i in range(test_count, total_count + 1):
-        high_p_value += intermediate_poisson_term(total_count, i, relative_exposure)
-
-    return min(1, 2 * min(low_p_value, high_p_value))
+    return sample_arrival_rates(variants).probabilities_of_winning()
 
 
 def calculate_p_value(control_variant: Variant, test_variants: List[Variant]) -> Probability:
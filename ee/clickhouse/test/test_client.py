@@ -1,19 +1,37 @@
+import contextvars
 import datetime
+import socket
+import threading
+import time
 from unittest.mock import patch
 
 import fakeredis
+import sqlparse
 from clickhouse_driver.errors import ServerException
 from django.test import TestCase
 from freezegun import freeze_time
 
 from posthog import client
-from posthog.client import CACHE_TTL, _deserialize, _key_hash, cache_sync_execute, sync_execute
+from posthog.clickhouse.cancellation import track_queries
+from posthog.clickhouse.query_executor import query_deadline
+from posthog.clickhouse.query_tagging import profile_queries, tag_queries
+from posthog.client import (
+    CACHE_TTL,
+    _deserialize,
+    _key_hash,
+    _serialize,
+    cache_sync_execute,
+    execute_iter,
+    sync_execute,
+)
+from posthog.exceptions import QueryDeadlineExceeded
 from posthog.test.base import ClickhouseTestMixin
 
 
 class ClickhouseClientTestCase(TestCase, ClickhouseTestMixin):
     def setUp(self):
         self.redis_client = fakeredis.FakeStrictRedis()
+        client._result_cache.clear()
 
     def test_caching_client(self):
         ts_start = datetime.datetime.now()
@@ -48,6 +66,70 @@ class ClickhouseClientTestCase(TestCase, ClickhouseTestMixin):
             exists = self.redis_client.exists(_key_hash(query, args=args))
             self.assertFalse(exists)
 
+    def test_caching_client_keeps_results_in_memory(self):
+        query = "select 2"
+        res = cache_sync_execute(query, redis_client=self.redis_client)
+        self.redis_client.delete(_key_hash(query, args=None))
+
+        with patch("posthog.client.sync_execute") as sync_execute_mock:
+            self.assertEqual(cache_sync_execute(query, redis_client=self.redis_client), res)
+        sync_execute_mock.assert_not_called()
+
+    @patch("posthog.client.sync_execute")
+    def test_caching_client_runs_concurrent_identical_queries_once(self, sync_execute_mock):
+        def slow_query(*args, **kwargs):
+            time.sleep(0.2)
+            return [(1,)]
+
+        sync_execute_mock.side_effect = slow_query
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(cache_sync_execute("select 3", redis_client=self.redis_client))
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sync_execute_mock.call_count, 1)
+        self.assertEqual(results, [[(1,)]] * 5)
+
+    def test_result_serialization(self):
+        small = [(1, "a", datetime.datetime(2022, 1, 1), [1, 2])]
+        large = [(i, "b" * 100) for i in range(1000)]
+
+        self.assertEqual(_deserialize(_serialize(small)), small)
+        self.assertEqual(_deserialize(_serialize(large)), large)
+        self.assertLess(len(_serialize(large)), 20_000)
+        # Results cached as JSON are still read
+        self.assertEqual(_deserialize(b'[[1, "a"]]'), [(1, "a")])
+
+    def test_execute_iter(self):
+        query = "SELECT number, toString(number) FROM numbers(5)"
+
+        self.assertEqual(list(execute_iter(query)), sync_execute(query))
+        self.assertEqual(
+            list(execute_iter(query, block_size=2)), [[(0, "0"), (1, "1")], [(2, "2"), (3, "3")], [(4, "4")]]
+        )
+        self.assertEqual(
+            list(execute_iter(query, block_size=3, columnar=True)),
+            [[(0, 1, 2), ("0", "1", "2")], [(3, 4), ("3", "4")]],
+        )
+
+        rows = execute_iter(query, with_column_types=True)
+        self.assertEqual(next(rows), [("number", "UInt64"), ("toString(number)", "String")])
+        self.assertEqual(len(list(rows)), 5)
+
+    def test_execute_iter_can_be_abandoned(self):
+        rows = execute_iter("SELECT number FROM numbers(1000000)", block_size=10)
+        self.assertEqual(len(next(rows)), 10)
+        rows.close()
+
+        self.assertEqual(sync_execute("SELECT 1"), [(1,)])
+
     def test_async_query_client(self):
         query = "SELECT 1+1"
         team_id = 2
@@ -144,8 +226,7 @@ class ClickhouseClientTestCase(TestCase, ClickhouseTestMixin):
         """
         # First add in the request information that should be added to the sql.
         # We check this to make sure it is not removed by the comment stripping
-        with self.capture_select_queries() as sqls:
-            client._request_information = {"kind": "request", "id": "1"}
+        with self.capture_select_queries() as sqls, tag_queries(kind="request", id="1"):
             sync_execute(
                 query="""
                     -- this request returns 1
@@ -160,3 +241,73 @@ class ClickhouseClientTestCase(TestCase, ClickhouseTestMixin):
             # Make sure it still includes the "annotation" comment that includes
             # request routing information for debugging purposes
             self.assertIn("/* request:1 */", first_query)
+
+    def test_prepare_query_strips_comments_once_per_template(self):
+        query = """
+            -- counts events for test_prepare_query_strips_comments_once_per_template
+            SELECT count(*) FROM events WHERE team_id = %(team_id)s AND event = %(event)s /* event */
+        """
+
+        with patch("posthog.client.sqlparse.format", wraps=sqlparse.format) as format_mock:
+            first_sql, _, _ = client._prepare_query(client.ch_client, query, {"team_id": 1, "event": "a -- b"})
+            second_sql, _, _ = client._prepare_query(client.ch_client, query, {"team_id": 2, "event": "c /* d */"})
+
+        self.assertEqual(format_mock.call_count, 1)
+        # Comment-like values are substituted after stripping, so they are left alone
+        self.assertIn("\nSELECT count(*) FROM events WHERE team_id = 1 AND event = 'a -- b'\n", first_sql)
+        self.assertIn("\nSELECT count(*) FROM events WHERE team_id = 2 AND event = 'c /* d */'\n", second_sql)
+
+    def test_query_tags_and_profile_propagate_into_threads(self):
+        with self.capture_select_queries() as sqls, tag_queries(kind="request", id="threaded"), profile_queries() as p:
+            thread = threading.Thread(target=contextvars.copy_context().run, args=(sync_execute, "SELECT 2"))
+            thread.start()
+            thread.join()
+            sync_execute("SELECT 1")
+
+        self.assertEqual(len(sqls), 2)
+        self.assertTrue(all("/* request:threaded */" in sql for sql in sqls))
+        self.assertEqual(len(p.queries), 2)
+        self.assertEqual(len({query.query_id for query in p.queries}), 2)
+        self.assertTrue(p.server_timing().startswith("clickhouse;dur="))
+
+        # Nothing leaks out of the block
+        with self.capture_select_queries() as sqls:
+            sync_execute("SELECT 1")
+        self.assertNotIn("/* request:threaded */", sqls[0])
+
+    def test_queries_are_limited_by_their_deadline(self):
+        with query_deadline(30):
+            self.assertEqual(sync_execute("SELECT getSetting('max_execution_time')"), [(30,)])
+            self.assertEqual(
+                sync_execute("SELECT getSetting('max_execution_time')", settings={"max_execution_time": 5}), [(5,)]
+            )
+
+        with query_deadline(0.01):
+            time.sleep(0.02)
+            with self.assertRaises(QueryDeadlineExceeded):
+                sync_execute("SELECT 1")
+
+    def test_queries_of_disconnected_clients_are_killed(self):
+        server, client_socket = socket.socketpair()
+        errors = []
+
+        def run_slow_query():
+            try:
+                sync_execute("SELECT sleepEachRow(1) FROM numbers(30)", settings={"max_block_size": 1})
+            except Exception as err:
+                errors.append(err)
+
+        with track_queries(connection=server) as running_queries:
+            thread = threading.Thread(target=contextvars.copy_context().run, args=(run_slow_query,))
+            start = time.monotonic()
+            thread.start()
+            while not running_queries._query_ids:
+                time.sleep(0.05)
+
+            client_socket.close()
+            running_queries.check_connection()
+            thread.join()
+
+        server.close()
+        self.assertEqual(len(errors), 1)
+        self.assertLess(time.monotonic() - start, 20)
@@ -46,6 +46,9 @@ const EDITABLE_INSTANCE_SETTINGS = [
     'ENABLE_ACTOR_ON_EVENTS_TEAMS',
     'GEOIP_PROPERTY_OVERRIDES_TEAMS',
     'STRICT_CACHING_TEAMS',
+    'EVENTS_ROLLUP_TEAMS',
+    'SINGLE_PASS_BREAKDOWN_TEAMS',
+    'PROPERTY_VALUES_INDEX_TEAMS',
     'SLACK_APP_CLIENT_ID',
     'SLACK_APP_CLIENT_SECRET',
     'SLACK_APP_SIGNING_SECRET',
@@ -10,6 +10,11 @@ keepalive = 120
 timeout = 90
 grateful_timeout = 120
 
+# `web` serves the whole app, `capture` only the ingestion endpoints (see posthog/wsgi_capture.py). An app passed on
+# the command line takes precedence over this.
+PROCESS_TYPES = {"web": "posthog.wsgi:application", "capture": "posthog.wsgi_capture:application"}
+wsgi_app = PROCESS_TYPES[os.environ.get("GUNICORN_PROCESS_TYPE", "web")]
+
 
 def on_starting(server):
     print(
@@ -1,12 +1,14 @@
 import hashlib
 import json
 import re
+import time
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import structlog
 from dateutil import parser
 from django.conf import settings
+from django.core.cache import cache
 from django.http import JsonResponse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
@@ -28,16 +30,16 @@ from posthog.helpers.session_recording import (
     get_session_recording_events_for_object_storage,
     preprocess_session_recording_events_for_clickhouse,
 )
-from posthog.kafka_client.client import KafkaProducer
+from posthog.kafka_client.client import KafkaProducer, json_serializer
 from posthog.kafka_client.topics import KAFKA_DEAD_LETTER_QUEUE
 from posthog.logging.timing import timed
-from posthog.models.feature_flag import get_active_feature_flags
+from posthog.models.feature_flag import get_active_feature_flags, get_feature_flags_version
 from posthog.models.utils import UUIDT
 from posthog.settings import (
     KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC,
     KAFKA_RECORDING_EVENTS_TO_OBJECT_STORAGE_INGESTION_TOPIC,
 )
-from posthog.utils import cors_response, get_ip_address, should_write_recordings_to_object_storage
+from posthog.utils import cors_response, generate_cache_key, get_ip_address, should_write_recordings_to_object_storage
 
 logger = structlog.get_logger(__name__)
 
@@ -57,7 +59,7 @@ def parse_kafka_event_data(
         "distinct_id": safe_clickhouse_string(distinct_id),
         "ip": safe_clickhouse_string(ip) if ip else ip,
         "site_url": safe_clickhouse_string(site_url),
-        "data": json.dumps(data),
+        "data": json_serializer(data).decode("utf-8"),
         "team_id": team_id,
         "now": now.isoformat(),
         "sent_at": sent_at.isoformat() if sent_at else "",
@@ -86,7 +88,7 @@ def log_event(data: Dict, event_name: str, partition_key: str) -> None:
     if settings.DEBUG:
         print(f"Logging event {event_name} to Kafka topic {KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC}")
 
-    # TODO: Handle Kafka being unavailable with exponential backoff retries
+    # Kafka being slow or unavailable is dealt with by the producer's buffer, see `posthog/kafka_client/spillover.py`
     try:
         KafkaProducer().produce(topic=KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC, data=data, key=partition_key)
         statsd.incr("posthog_cloud_plugin_server_ingestion")
@@ -96,6 +98,21 @@ def log_event(data: Dict, event_name: str, partition_key: str) -> None:
         raise e
 
 
+def log_events_batch(records: List[Tuple[Dict, str]]) -> None:
+    if settings.DEBUG:
+        print(f"Logging {len(records)} events to Kafka topic {KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC}")
+
+    try:
+        producer = KafkaProducer()
+        for data, key in records:
+            producer.produce(topic=KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC, data=data, key=key)
+        statsd.incr("posthog_cloud_plugin_server_ingestion", len(records))
+    except Exception as e:
+        statsd.incr("capture_endpoint_log_event_error")
+        print(f"Failed to produce event batch to Kafka topic {KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC} with error:", e)
+        raise e
+
+
 def log_session_recording_event(headers: List[Tuple[str, str]], data: str, partition_key: str) -> None:
     if settings.DEBUG:
         print(f"Logging recording event to Kafka topic {KAFKA_RECORDING_EVENTS_TO_OBJECT_STORAGE_INGESTION_TOPIC}")
@@ -207,12 +224,47 @@ def get_distinct_id(data: Dict[str, Any]) -> str:
     return str(raw_value)[0:200]
 
 
+FeatureFlagsCache = Dict[Tuple[int, str], Dict[str, Union[bool, str]]]
+
+
+def _get_active_feature_flags(
+    team_id: int, distinct_id: str, feature_flags_cache: Optional[FeatureFlagsCache] = None
+) -> Dict[str, Union[bool, str]]:
+    """
+    Memoizes flag lookups in `feature_flags_cache`, which lives as long as the request does, so that a batch of
+    events from one user is only matched once. With CAPTURE_FEATURE_FLAGS_CACHE_TTL_SECONDS set, results are also
+    shared across requests for that long, or until any of the team's flags change.
+    """
+    if feature_flags_cache is not None and (team_id, distinct_id) in feature_flags_cache:
+        return feature_flags_cache[(team_id, distinct_id)]
+
+    shared_cache_key = None
+    flags = None
+    if settings.CAPTURE_FEATURE_FLAGS_CACHE_TTL_SECONDS > 0:
+        shared_cache_key = generate_cache_key(
+            f"capture_feature_flags_{team_id}_{get_feature_flags_version(team_id)}_{distinct_id}"
+        )
+        flags = cache.get(shared_cache_key)
+
+    if flags is None:
+        flags = get_active_feature_flags(team_id=team_id, distinct_id=distinct_id)
+        if shared_cache_key is not None:
+            cache.set(shared_cache_key, flags, settings.CAPTURE_FEATURE_FLAGS_CACHE_TTL_SECONDS)
+
+    if feature_flags_cache is not None:
+        feature_flags_cache[(team_id, distinct_id)] = flags
+    return flags
+
+
 def _ensure_web_feature_flags_in_properties(
-    event: Dict[str, Any], ingestion_context: EventIngestionContext, distinct_id: str
+    event: Dict[str, Any],
+    ingestion_context: EventIngestionContext,
+    distinct_id: str,
+    feature_flags_cache: Optional[FeatureFlagsCache] = None,
 ):
     """If the event comes from web, ensure that it contains property $active_feature_flags."""
     if event["properties"].get("$lib") == "web" and "$active_feature_flags" not in event["properties"]:
-        flags = get_active_feature_flags(team_id=ingestion_context.team_id, distinct_id=distinct_id)
+        flags = _get_active_feature_flags(ingestion_context.team_id, distinct_id, feature_flags_cache)
         event["properties"]["$active_feature_flags"] = list(flags.keys())
         for k, v in flags.items():
             event["properties"][f"$feature/{k}"] = v
@@ -303,6 +355,7 @@ def get_event(request):
             request, generate_exception_response("capture", f"Invalid payload: {e}", code="invalid_payload")
         )
 
+    events_to_capture: List[Tuple[Dict, UUIDT, str]] = []
     for event, event_uuid, distinct_id in processed_events:
         if send_events_to_dead_letter_queue:
             kafka_event = parse_kafka_event_data(
@@ -325,8 +378,11 @@ def get_event(request):
             )
             continue
 
+        events_to_capture.append((event, event_uuid, distinct_id))
+
+    if events_to_capture:
         try:
-            capture_internal(event, distinct_id, ip, site_url, now, sent_at, ingestion_context.team_id, event_uuid)  # type: ignore
+            capture_batch_internal(events_to_capture, ip, site_url, now, sent_at, ingestion_context.team_id)  # type: ignore
         except Exception as e:
             capture_exception(e, {"data": data})
             statsd.incr(
@@ -350,6 +406,7 @@ def get_event(request):
 
 
 def validate_events(events, ingestion_context):
+    feature_flags_cache: FeatureFlagsCache = {}
     for event in events:
         event_uuid = UUIDT()
         distinct_id = get_distinct_id(event)
@@ -361,14 +418,14 @@ def validate_events(events, ingestion_context):
                 statsd.incr("invalid_event_uuid")
                 raise ValueError('Event field "uuid" is not a valid UUID!')
 
-        event = parse_event(event, distinct_id, ingestion_context)
+        event = parse_event(event, distinct_id, ingestion_context, feature_flags_cache)
         if not event:
             continue
 
         yield event, event_uuid, distinct_id
 
 
-def parse_event(event, distinct_id, ingestion_context):
+def parse_event(event, distinct_id, ingestion_context, feature_flags_cache: Optional[FeatureFlagsCache] = None):
     if not event.get("event"):
         statsd.incr("invalid_event", tags={"error": "missing_event_name"})
         return
@@ -381,7 +438,7 @@ def parse_event(event, distinct_id, ingestion_context):
         scope.set_tag("library.version", event["properties"].get("$lib_version", "unknown"))
 
     if ingestion_context:
-        _ensure_web_feature_flags_in_properties(event, ingestion_context, distinct_id)
+        _ensure_web_feature_flags_in_properties(event, ingestion_context, distinct_id, feature_flags_cache)
 
     return event
 
@@ -397,5 +454,50 @@ def capture_internal(event, distinct_id, ip, site_url, now, sent_at, team_id, ev
         sent_at=sent_at,
         event_uuid=event_uuid,
     )
-    partition_key = hashlib.sha256(f"{team_id}:{distinct_id}".encode()).hexdigest()
-    log_event(parsed_event, event["event"], partition_key=partition_key)
+    log_event(parsed_event, event["event"], partition_key=_get_partition_key(team_id, distinct_id))
+
+
+def capture_batch_internal(
+    events: List[Tuple[Dict, UUIDT, str]],
+    ip: Optional[str],
+    site_url: str,
+    now: datetime,
+    sent_at: Optional[datetime],
+    team_id: int,
+) -> None:
+    """
+    Serialize and enqueue a whole payload in one pass.
+
+    Batches from server-side libraries usually carry a handful of distinct_ids for hundreds of events, so partition
+    keys are hashed once per distinct_id rather than once per event.
+    """
+    start_time = time.perf_counter()
+
+    partition_keys: Dict[str, str] = {}
+    records: List[Tuple[Dict, str]] = []
+    for event, event_uuid, distinct_id in events:
+        if distinct_id not in partition_keys:
+            partition_keys[distinct_id] = _get_partition_key(team_id, distinct_id)
+        parsed_event = parse_kafka_event_data(
+            distinct_id=distinct_id,
+            ip=ip,
+            site_url=site_url,
+            data=event,
+            team_id=team_id,
+            now=now,
+            sent_at=sent_at,
+            event_uuid=event_uuid,
+        )
+        records.append((parsed_event, partition_keys[distinct_id]))
+
+    serialized_time = time.perf_counter()
+    log_events_batch(records)
+    produced_time = time.perf_counter()
+
+    statsd.timing("capture_batch_serialization_ms", (serialized_time - start_time) * 1000)
+    statsd.timing("capture_batch_produce_ms", (produced_time - serialized_time) * 1000)
+    statsd.gauge("capture_batch_size", len(records))
+
+
+def _get_partition_key(team_id: Optional[int], distinct_id: str) -> str:
+    return hashlib.sha256(f"{team_id}:{distinct_id}".encode()).hexdigest()
@@ -1,4 +1,5 @@
 import json
+from functools import partial
 from typing import Any, Dict, cast
 
 from django.db.models import Prefetch, QuerySet
@@ -13,12 +14,15 @@ from posthog.api.insight import InsightSerializer, InsightViewSet
 from posthog.api.routing import StructuredViewSetMixin
 from posthog.api.shared import UserBasicSerializer
 from posthog.api.tagged_item import TaggedItemSerializerMixin, TaggedItemViewSetMixin
+from posthog.clickhouse.query_executor import query_executor
 from posthog.constants import INSIGHT_TRENDS
 from posthog.event_usage import report_user_action
 from posthog.helpers import create_dashboard_from_template
 from posthog.models import Dashboard, DashboardTile, Insight, Team
 from posthog.models.user import User
 from posthog.permissions import ProjectMembershipNecessaryPermissions, TeamMemberAccessPermission
+from posthog.tasks.update_cache import synchronously_update_insight_cache
+from posthog.utils import should_refresh
 
 
 class CanEditDashboard(BasePermission):
@@ -184,6 +188,21 @@ class DashboardSerializer(TaggedItemSerializerMixin, serializers.ModelSerializer
             .order_by("insight__order")
         )
 
+        for tile in tiles:
+            # Make sure all items have an insight set
+            if tile.insight and not tile.insight.filters.get("insight"):
+                tile.insight.filters["insight"] = INSIGHT_TRENDS
+                tile.insight.save(update_fields=["filters"])
+
+        if should_refresh(self.context["request"]):
+            # Refresh the insights all at once, rather than one after the other as they get serialized below
+            to_refresh = [tile.insight for tile in tiles if tile.insight and tile.insight.filters]
+            results = query_executor.run(
+                [partial(synchronously_update_insight_cache, insight, dashboard) for insight in to_refresh],
+                team_id=dashboard.team_id,
+            )
+            self.context.update({"refreshed_results": dict(zip((insight.pk for insight in to_refresh), results))})
+
         insights = []
         for tile in tiles:
             if tile.insight:
@@ -195,11 +214,6 @@ class DashboardSerializer(TaggedItemSerializerMixin, serializers.ModelSerializer
 
                 color = tile.color
 
-                # Make sure all items have an insight set
-                if not insight.filters.get("insight"):
-                    insight.filters["insight"] = INSIGHT_TRENDS
-                    insight.save(update_fields=["filters"])
-
                 self.context.update({"filters_hash": tile.filters_hash})
                 insight_data = InsightSerializer(insight, many=False, context=self.context).data
                 insight_data["layouts"] = layouts
@@ -178,7 +178,9 @@ class EventViewSet(StructuredViewSetMixin, mixins.RetrieveModelMixin, mixins.Lis
             events = sync_execute(GET_CUSTOM_EVENTS, {"team_id": team.pk})
             return response.Response([{"name": event[0]} for event in events])
         elif key:
-            result = get_property_values_for_key(key, team, value=request.GET.get("value"))
+            result = get_property_values_for_key(
+                key, team, value=request.GET.get("value"), prefix=request.GET.get("match") == "prefix"
+            )
             for value in result:
                 try:
                     # Try loading as json for dicts or arrays
@@ -1,7 +1,10 @@
+import hashlib
 import json
 from typing import Any, Dict, List, Optional, cast
 
+from django.core.cache import cache
 from django.db.models import QuerySet
+from django.utils.http import parse_etags
 from rest_framework import authentication, exceptions, request, serializers, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
@@ -16,11 +19,24 @@ from posthog.models import FeatureFlag
 from posthog.models.activity_logging.activity_log import Detail, changes_between, load_activity, log_activity
 from posthog.models.activity_logging.activity_page import activity_page_response
 from posthog.models.cohort import Cohort
-from posthog.models.feature_flag import FeatureFlagMatcher
+from posthog.models.feature_flag import (
+    FeatureFlagMatcher,
+    get_feature_flags_for_distinct_ids,
+    get_feature_flags_version,
+    local_evaluation_snapshot_key,
+)
 from posthog.models.group_type_mapping import GroupTypeMapping
 from posthog.models.property import Property
+from posthog.models.team import Team
 from posthog.permissions import ProjectMembershipNecessaryPermissions, TeamMemberAccessPermission
 
+# Upper bound on distinct_ids per bulk evaluation request, to keep the Postgres queries it makes reasonably sized
+BULK_EVALUATION_MAX_DISTINCT_IDS = 1000
+
+# Local evaluation snapshots are rebuilt whenever flags, cohorts or group types change, this only bounds how long idle
+# ones linger
+LOCAL_EVALUATION_SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
 
 class FeatureFlagSerializer(serializers.HyperlinkedModelSerializer):
     created_by = UserBasicSerializer(read_only=True)
@@ -229,32 +245,71 @@ class FeatureFlagViewSet(StructuredViewSetMixin, ForbidDestroyModel, viewsets.Mo
 
     @action(methods=["GET"], detail=False)
     def local_evaluation(self, request: request.Request, **kwargs):
+        """
+        Flag definitions for server-side libraries evaluating flags locally.
+
+        Send the last `ETag` back as `If-None-Match` to get an empty 304 when nothing changed, or the last `version`
+        as `since` to only receive flags changed since then, with removed flags listed under `deleted_flags`.
+        """
+        snapshot = get_local_evaluation_snapshot(self.team)
+        etag = f'"{snapshot["version"]}"'
+
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response["ETag"] = etag
+            return response
+
+        response_data: Dict[str, Any] = {
+            "version": snapshot["version"],
+            "flags": snapshot["flags"],
+            "cohorts": snapshot["cohorts"],
+            "group_type_mapping": snapshot["group_type_mapping"],
+        }
+
+        since = request.GET.get("since")
+        previous_flag_hashes = cache.get(_local_evaluation_flag_hashes_key(self.team_id, since)) if since else None
+        # Unknown or expired versions fall back to the full snapshot, which clients can always apply
+        if previous_flag_hashes is not None:
+            flag_hashes = snapshot["flag_hashes"]
+            response_data["since"] = since
+            response_data["flags"] = [
+                flag for flag in snapshot["flags"] if previous_flag_hashes.get(flag["key"]) != flag_hashes[flag["key"]]
+            ]
+            response_data["deleted_flags"] = [key for key in previous_flag_hashes if key not in flag_hashes]
+
+        response = Response(response_data)
+        response["ETag"] = etag
+        return response
+
+    @action(methods=["POST"], detail=False)
+    def bulk_evaluation(self, request: request.Request, **kwargs):
+        """
+        Evaluates all active flags for a list of distinct_ids in one go, for server-side batch jobs that
+        would otherwise call /decide once per user.
+        """
+        distinct_ids = request.data.get("distinct_ids")
+        if not isinstance(distinct_ids, list) or not distinct_ids:
+            raise exceptions.ValidationError(
+                "distinct_ids must be a non-empty list of distinct IDs.", code="invalid_input"
+            )
+        if len(distinct_ids) > BULK_EVALUATION_MAX_DISTINCT_IDS:
+            raise exceptions.ValidationError(
+                f"At most {BULK_EVALUATION_MAX_DISTINCT_IDS} distinct_ids can be evaluated per request.",
+                code="invalid_input",
+            )
 
-        feature_flags = (
-            FeatureFlag.objects.filter(team=self.team, deleted=False)
-            .prefetch_related("experiment_set")
-            .select_related("created_by")
-            .order_by("-created_at")
-        )
+        groups = request.data.get("groups") or {}
+        property_overrides = request.data.get("property_overrides") or {}
+        if not isinstance(groups, dict) or not isinstance(property_overrides, dict):
+            raise exceptions.ValidationError("groups and property_overrides must be objects.", code="invalid_input")
 
-        parsed_flags = []
-        for feature_flag in feature_flags:
-            filters = feature_flag.get_filters()
-            feature_flag.filters = filters
-            parsed_flags.append(feature_flag)
-
-        # TODO: Handle cohorts the same way as feature evaluation would, by simplifying cohort properties to
-        # person properties
-
-        return Response(
-            {
-                "flags": [FeatureFlagSerializer(feature_flag).data for feature_flag in parsed_flags],
-                "group_type_mapping": {
-                    str(row.group_type_index): row.group_type
-                    for row in GroupTypeMapping.objects.filter(team_id=self.team_id)
-                },
-            }
+        flags = get_feature_flags_for_distinct_ids(
+            self.team_id,
+            [str(distinct_id) for distinct_id in distinct_ids],
+            groups=groups,
+            property_value_overrides=property_overrides,
         )
+        return Response({"flags": flags})
 
     @action(methods=["GET"], url_path="activity", detail=False)
     def all_activity(self, request: request.Request, **kwargs):
@@ -316,3 +371,70 @@ class FeatureFlagViewSet(StructuredViewSetMixin, ForbidDestroyModel, viewsets.Mo
 
 class LegacyFeatureFlagViewSet(FeatureFlagViewSet):
     legacy_team_compatibility = True
+
+
+def _local_evaluation_flag_hashes_key(team_id: int, version: str) -> str:
+    return f"local_evaluation_flag_hashes_{team_id}_{version}"
+
+
+def _hash_payload(payload: Any) -> str:
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def get_local_evaluation_snapshot(team: Team) -> Dict[str, Any]:
+    """
+    Builds (or reads from the shared cache) everything needed to evaluate the team's flags locally.
+
+    `version` is a hash of the contents, so a snapshot rebuilt without changes (e.g. after a cohort was
+    recalculated) keeps its version and clients polling with it keep getting 304s.
+    """
+    flags_version = get_feature_flags_version(team.pk)
+    snapshot = cache.get(local_evaluation_snapshot_key(team.pk))
+    if snapshot is not None and snapshot["flags_version"] == flags_version:
+        return snapshot
+
+    feature_flags = (
+        FeatureFlag.objects.filter(team=team, deleted=False)
+        .prefetch_related("experiment_set")
+        .select_related("created_by")
+        .order_by("-created_at")
+    )
+
+    flags = []
+    cohort_ids = set()
+    for feature_flag in feature_flags:
+        feature_flag.filters = feature_flag.get_filters()
+        flags.append(FeatureFlagSerializer(feature_flag).data)
+        cohort_ids.update(feature_flag.cohort_ids)
+
+    # Only cohorts defined purely by person properties can be matched locally, flags using any other cohort
+    # still need /decide
+    cohorts = {}
+    if cohort_ids:
+        for cohort in Cohort.objects.filter(team=team, pk__in=cohort_ids, deleted=False, is_static=False):
+            cohort.team = team
+            property_group = cohort.properties
+            properties = property_group.flat
+            if properties and all(prop.type == "person" for prop in properties):
+                cohorts[str(cohort.pk)] = property_group.to_dict()
+
+    content = {
+        "flags": flags,
+        "cohorts": cohorts,
+        "group_type_mapping": {
+            str(row.group_type_index): row.group_type for row in GroupTypeMapping.objects.filter(team_id=team.pk)
+        },
+    }
+    flag_hashes = {flag["key"]: _hash_payload(flag) for flag in flags}
+    snapshot = {
+        **content,
+        "version": _hash_payload(content),
+        "flags_version": flags_version,
+        "flag_hashes": flag_hashes,
+    }
+
+    cache.set(local_evaluation_snapshot_key(team.pk), snapshot, LOCAL_EVALUATION_SNAPSHOT_TIMEOUT)
+    cache.set(
+        _local_evaluation_flag_hashes_key(team.pk, snapshot["version"]), flag_hashes, LOCAL_EVALUATION_SNAPSHOT_TIMEOUT
+    )
+    return snapshot
@@ -324,6 +324,10 @@ class InsightSerializer(InsightBasicSerializer):
         dashboard = self.context.get("dashboard", None)
 
         if should_refresh(self.context["request"]):
+            # Dashboards refresh all of their insights before serializing them
+            refreshed_results = self.context.get("refreshed_results", {})
+            if insight.pk in refreshed_results:
+                return refreshed_results[insight.pk]
             return synchronously_update_insight_cache(insight, dashboard)
 
         cache_key = insight.filters_hash
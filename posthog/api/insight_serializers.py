@@ -68,6 +68,12 @@ class GenericInsightsSerializer(serializers.Serializer):
         help_text="What date to filter the results to. Can either be a date `2021-01-01`, or a relative date, like `-7d` for last seven days, `-1m` for last month, `mStart` for start of the month or `yStart` for the start of the year.",
         default="-7d",
     )
+    sampling_factor = serializers.FloatField(
+        required=False,
+        min_value=0,
+        max_value=1,
+        help_text="Run the query over this fraction of the events, e.g. `0.1`, for a quicker result. Events are sampled by distinct ID and counts are scaled back up, each with a 95% `confidence_interval`. Counts of unique users and funnel steps count persons, and a person with several distinct IDs is more likely to be in the sample than one with a single distinct ID, so those counts are overestimated unless the project aggregates users by distinct ID.",
+    )
 
 
 @extend_schema_field(OpenApiTypes.STR)
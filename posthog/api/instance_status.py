@@ -4,6 +4,7 @@ from django.conf import settings
 from django.db import connection
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
@@ -170,6 +171,18 @@ class InstanceStatusViewSet(viewsets.ViewSet):
 
         return Response({"results": queries})
 
+    @action(methods=["GET"], detail=False)
+    def query_profile(self, request: Request) -> Response:
+        """
+        ClickHouse queries run for a request, by the profile id it reported in its `Server-Timing` header.
+        """
+        from posthog.clickhouse.system_status import get_query_profile_details
+
+        profile = get_query_profile_details(request.GET.get("id", ""))
+        if profile is None:
+            raise NotFound("Query profile not found or expired.")
+        return Response(profile)
+
     @action(
         methods=["POST"],
         detail=False,
@@ -344,7 +344,7 @@ class PersonViewSet(PKorUUIDViewSet, StructuredViewSetMixin, viewsets.ModelViewS
         value = request.GET.get("value")
         flattened = []
         if key:
-            result = self._get_person_property_values_for_key(key, value)
+            result = self._get_person_property_values_for_key(key, value, prefix=request.GET.get("match") == "prefix")
 
             for (value, count) in result:
                 try:
@@ -355,9 +355,9 @@ class PersonViewSet(PKorUUIDViewSet, StructuredViewSetMixin, viewsets.ModelViewS
         return response.Response(flattened)
 
     @timed("get_person_property_values_for_key_timer")
-    def _get_person_property_values_for_key(self, key, value):
+    def _get_person_property_values_for_key(self, key, value, prefix=False):
         try:
-            result = get_person_property_values_for_key(key, self.team, value)
+            result = get_person_property_values_for_key(key, self.team, value, prefix=prefix)
             statsd.incr(
                 "get_person_property_values_for_key_success", tags={"team_id": self.team.id},
             )
@@ -12,13 +12,14 @@ from urllib.parse import quote
 
 import lzstring
 from django.test.client import Client
+from django.test.utils import override_settings
 from django.utils import timezone
 from freezegun import freeze_time
 from rest_framework import status
 
 from posthog.api.test.mock_sentry import mock_sentry_context_for_tagging
 from posthog.models import PersonalAPIKey
-from posthog.models.feature_flag import FeatureFlag
+from posthog.models.feature_flag import FeatureFlag, get_active_feature_flags
 from posthog.settings import KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC
 from posthog.settings.data_stores import KAFKA_RECORDING_EVENTS_TO_OBJECT_STORAGE_INGESTION
 from posthog.test.base import BaseTest
@@ -345,6 +346,30 @@ class TestCapture(BaseTest):
         )
         self.assertEqual(kafka_produce.call_count, 2)
 
+    @patch("posthog.kafka_client.client._KafkaProducer.produce")
+    def test_batch_events_are_partitioned_by_distinct_id(self, kafka_produce):
+        self.client.post(
+            "/batch/",
+            data={
+                "api_key": self.team.api_token,
+                "batch": [
+                    {"type": "capture", "event": "beep", "distinct_id": "eeee"},
+                    {"type": "capture", "event": "boop", "distinct_id": "aaaa"},
+                    {"type": "capture", "event": "bop", "distinct_id": "eeee"},
+                ],
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(kafka_produce.call_count, 3)
+
+        keys = [call[1]["key"] for call in kafka_produce.call_args_list]
+        self.assertEqual(keys[0], keys[2])
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertEqual(
+            [json.loads(call[1]["data"]["data"])["event"] for call in kafka_produce.call_args_list],
+            ["beep", "boop", "bop"],
+        )
+
     @patch("posthog.kafka_client.client._KafkaProducer.produce")
     def test_emojis_in_text(self, kafka_produce):
         self.team.api_token = "xp9qT2VLY76JJg"
@@ -381,9 +406,9 @@ class TestCapture(BaseTest):
             data["properties"]["prop"], "💻 Writing code",
         )
 
-    @patch("gzip.decompress")
+    @patch("gzip.GzipFile.read")
     @patch("posthog.kafka_client.client._KafkaProducer.produce")
-    def test_invalid_js_gzip_zlib_error(self, kafka_produce, gzip_decompress):
+    def test_invalid_js_gzip_zlib_error(self, kafka_produce, gzip_read):
         """
         This was prompted by an event request that was resulting in the zlib
         error "invalid distance too far back". I couldn't easily generate such a
@@ -395,7 +420,7 @@ class TestCapture(BaseTest):
         self.team.api_token = "rnEnwNvmHphTu5rFG4gWDDs49t00Vk50tDOeDdedMb4"
         self.team.save()
 
-        gzip_decompress.side_effect = zlib.error("Error -3 while decompressing data: invalid distance too far back")
+        gzip_read.side_effect = zlib.error("Error -3 while decompressing data: invalid distance too far back")
 
         response = self.client.post(
             "/track?compression=gzip-js",
@@ -975,6 +1000,48 @@ class TestCapture(BaseTest):
         arguments = self._to_arguments(kafka_produce)
         self.assertEqual(arguments["data"]["properties"]["$active_feature_flags"], ["test-ff"])
 
+    @patch("posthog.kafka_client.client._KafkaProducer.produce")
+    def test_feature_flags_are_matched_once_per_distinct_id_in_a_batch(self, kafka_produce) -> None:
+        FeatureFlag.objects.create(team=self.team, created_by=self.user, key="test-ff", rollout_percentage=100)
+        events = [
+            {"event": "$pageview", "properties": {"distinct_id": distinct_id, "$lib": "web"}}
+            for distinct_id in ["xxx", "yyy", "xxx", "xxx", "yyy"]
+        ]
+
+        with patch(
+            "posthog.api.capture.get_active_feature_flags", wraps=get_active_feature_flags
+        ) as patched_get_active_feature_flags:
+            self.client.post("/track/", data={"data": json.dumps(events), "api_key": self.team.api_token})
+
+        self.assertEqual(patched_get_active_feature_flags.call_count, 2)
+        self.assertEqual(kafka_produce.call_count, 5)
+        for produce_call in kafka_produce.call_args_list:
+            self.assertEqual(json.loads(produce_call[1]["data"]["data"])["properties"]["$feature/test-ff"], True)
+
+    @override_settings(CAPTURE_FEATURE_FLAGS_CACHE_TTL_SECONDS=60)
+    @patch("posthog.kafka_client.client._KafkaProducer.produce")
+    def test_feature_flags_can_be_cached_across_requests(self, kafka_produce) -> None:
+        flag = FeatureFlag.objects.create(team=self.team, created_by=self.user, key="test-ff", rollout_percentage=100)
+        data = {
+            "data": json.dumps([{"event": "$pageview", "properties": {"distinct_id": "xxx", "$lib": "web"}}]),
+            "api_key": self.team.api_token,
+        }
+
+        with patch(
+            "posthog.api.capture.get_active_feature_flags", wraps=get_active_feature_flags
+        ) as patched_get_active_feature_flags:
+            self.client.post("/track/", data=data)
+            self.client.post("/track/", data=data)
+            self.assertEqual(patched_get_active_feature_flags.call_count, 1)
+
+            # Changing any flag invalidates cached results
+            flag.active = False
+            flag.save()
+            self.client.post("/track/", data=data)
+            self.assertEqual(patched_get_active_feature_flags.call_count, 2)
+
+        self.assertEqual(self._to_arguments(kafka_produce)["data"]["properties"]["$active_feature_flags"], [])
+
     def test_handle_lacking_event_name_field(self):
         response = self.client.post(
             "/e/",
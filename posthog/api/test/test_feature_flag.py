@@ -3,10 +3,12 @@ import json
 from typing import Dict, List, Optional
 from unittest.mock import patch
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from freezegun.api import freeze_time
 from rest_framework import status
 
-from posthog.models import FeatureFlag, GroupTypeMapping, User
+from posthog.models import FeatureFlag, GroupTypeMapping, Person, User
 from posthog.models.cohort import Cohort
 from posthog.models.personal_api_key import PersonalAPIKey
 from posthog.test.base import APIBaseTest
@@ -943,6 +945,65 @@ class TestFeatureFlag(APIBaseTest):
         self.assertEqual(groups_flag["feature_flag"]["key"], "groups-flag")
         self.assertEqual(groups_flag["value"], True)
 
+    def test_bulk_evaluation(self):
+        FeatureFlag.objects.create(
+            team=self.team,
+            created_by=self.user,
+            key="email-flag",
+            filters={"groups": [{"properties": [{"key": "email", "value": "tim@posthog.com", "type": "person"}]}]},
+        )
+        Person.objects.create(team=self.team, distinct_ids=["tim", "tim_2"], properties={"email": "tim@posthog.com"})
+        Person.objects.create(team=self.team, distinct_ids=["jane"], properties={"email": "jane@posthog.com"})
+
+        response = self.client.post(
+            f"/api/projects/{self.team.id}/feature_flags/bulk_evaluation",
+            {"distinct_ids": ["tim", "tim_2", "jane", "unknown"]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.json()["flags"],
+            {
+                "tim": {"red_button": True, "email-flag": True},
+                "tim_2": {"red_button": True, "email-flag": True},
+                "jane": {"red_button": True},
+                "unknown": {"red_button": True},
+            },
+        )
+
+        response = self.client.post(
+            f"/api/projects/{self.team.id}/feature_flags/bulk_evaluation",
+            {"distinct_ids": ["unknown"], "property_overrides": {"email": "tim@posthog.com"}},
+            format="json",
+        )
+        self.assertEqual(response.json()["flags"], {"unknown": {"red_button": True, "email-flag": True}})
+
+        # The number of queries doesn't depend on the number of distinct_ids
+        with CaptureQueriesContext(connection) as single_distinct_id_queries:
+            self.client.post(
+                f"/api/projects/{self.team.id}/feature_flags/bulk_evaluation", {"distinct_ids": ["tim"]}, format="json",
+            )
+        with CaptureQueriesContext(connection) as many_distinct_ids_queries:
+            self.client.post(
+                f"/api/projects/{self.team.id}/feature_flags/bulk_evaluation",
+                {"distinct_ids": ["tim", "tim_2", "jane", "unknown"]},
+                format="json",
+            )
+        self.assertEqual(len(single_distinct_id_queries), len(many_distinct_ids_queries))
+
+    def test_bulk_evaluation_validates_distinct_ids(self):
+        response = self.client.post(
+            f"/api/projects/{self.team.id}/feature_flags/bulk_evaluation", {"distinct_ids": []}, format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(
+            f"/api/projects/{self.team.id}/feature_flags/bulk_evaluation",
+            {"distinct_ids": [str(i) for i in range(1001)]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     @patch("posthog.api.feature_flag.report_user_action")
     def test_local_evaluation(self, mock_capture):
         FeatureFlag.objects.all().delete()
@@ -1095,6 +1156,109 @@ class TestFeatureFlag(APIBaseTest):
 
         self.assertEqual(response_data["group_type_mapping"], {"0": "organization", "1": "company",})
 
+    def test_local_evaluation_etag_and_deltas(self):
+        FeatureFlag.objects.all().delete()
+        cohort = Cohort.objects.create(
+            team=self.team,
+            name="Beta users",
+            groups=[
+                {"properties": [{"key": "email", "value": "@posthog.com", "type": "person", "operator": "icontains"}]}
+            ],
+        )
+        behavioral_cohort = Cohort.objects.create(
+            team=self.team, name="Pageviewers", groups=[{"event_id": "$pageview", "days": 7}],
+        )
+        FeatureFlag.objects.create(
+            team=self.team,
+            key="cohort-flag",
+            created_by=self.user,
+            filters={"groups": [{"properties": [{"key": "id", "type": "cohort", "value": cohort.pk}]}]},
+        )
+        FeatureFlag.objects.create(
+            team=self.team,
+            key="behavioral-flag",
+            created_by=self.user,
+            filters={"groups": [{"properties": [{"key": "id", "type": "cohort", "value": behavioral_cohort.pk}]}]},
+        )
+        other_flag = FeatureFlag.objects.create(
+            team=self.team, key="simple-flag", created_by=self.user, filters={"groups": [{"rollout_percentage": 50}]},
+        )
+
+        key = PersonalAPIKey(label="Test", user=self.user)
+        key.save()
+        self.client.logout()
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {key.value}"}
+
+        response = self.client.get(f"/api/feature_flag/local_evaluation?token={self.team.api_token}", **auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response_data = response.json()
+        version = response_data["version"]
+        self.assertEqual(response["ETag"], f'"{version}"')
+        self.assertEqual(len(response_data["flags"]), 3)
+        # Only the cohort made of person properties can be evaluated locally
+        self.assertEqual(list(response_data["cohorts"].keys()), [str(cohort.pk)])
+        self.assertDictContainsSubset(
+            {"key": "email", "value": "@posthog.com", "type": "person", "operator": "icontains"},
+            response_data["cohorts"][str(cohort.pk)]["values"][0]["values"][0],
+        )
+
+        response = self.client.get(
+            f"/api/feature_flag/local_evaluation?token={self.team.api_token}", HTTP_IF_NONE_MATCH=f'"{version}"', **auth
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Recalculating a cohort doesn't change its definition, so the version stays the same
+        cohort.is_calculating = True
+        cohort.save()
+        response = self.client.get(
+            f"/api/feature_flag/local_evaluation?token={self.team.api_token}", HTTP_IF_NONE_MATCH=f'"{version}"', **auth
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        other_flag.filters = {"groups": [{"rollout_percentage": 75}]}
+        other_flag.save()
+        FeatureFlag.objects.filter(key="behavioral-flag").update(deleted=True)
+        FeatureFlag.objects.get(key="behavioral-flag").save()
+
+        response = self.client.get(
+            f"/api/feature_flag/local_evaluation?token={self.team.api_token}&since={version}",
+            HTTP_IF_NONE_MATCH=f'"{version}"',
+            **auth,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response_data = response.json()
+        self.assertNotEqual(response_data["version"], version)
+        self.assertEqual(response_data["since"], version)
+        self.assertEqual([flag["key"] for flag in response_data["flags"]], ["simple-flag"])
+        self.assertEqual(response_data["flags"][0]["rollout_percentage"], 75)
+        self.assertEqual(response_data["deleted_flags"], ["behavioral-flag"])
+        self.assertEqual(list(response_data["cohorts"].keys()), [str(cohort.pk)])
+
+        # Unknown versions get the full snapshot
+        response = self.client.get(
+            f"/api/feature_flag/local_evaluation?token={self.team.api_token}&since=unknown", **auth
+        )
+        response_data = response.json()
+        self.assertNotIn("deleted_flags", response_data)
+        self.assertEqual(sorted(flag["key"] for flag in response_data["flags"]), ["cohort-flag", "simple-flag"])
+
+    def test_local_evaluation_snapshot_changes_with_group_types(self):
+        key = PersonalAPIKey(label="Test", user=self.user)
+        key.save()
+        self.client.logout()
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {key.value}"}
+
+        response = self.client.get(f"/api/feature_flag/local_evaluation?token={self.team.api_token}", **auth)
+        version = response.json()["version"]
+
+        GroupTypeMapping.objects.create(team=self.team, group_type="organization", group_type_index=0)
+
+        response = self.client.get(
+            f"/api/feature_flag/local_evaluation?token={self.team.api_token}", HTTP_IF_NONE_MATCH=f'"{version}"', **auth
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["group_type_mapping"], {"0": "organization"})
+
     def test_validation_person_properties(self):
         person_request = self._create_flag_with_properties(
             "person-flag", [{"key": "email", "type": "person", "value": "@posthog.com", "operator": "icontains",},]
@@ -1,4 +1,5 @@
 import json
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional, Tuple
 from unittest.case import skip
@@ -790,6 +791,28 @@ class TestInsight(ClickhouseTestMixin, LicensedTestMixin, APIBaseTest, QueryMatc
         self.assertEqual(response["result"][0]["action"]["name"], "$pageview")
         self.assertEqual(response["timezone"], "UTC")
 
+    def test_insight_refresh_returns_stale_result_while_another_refresh_is_running(self):
+        _create_event(team=self.team, event="$pageview", distinct_id="1")
+        url = f"/api/projects/{self.team.id}/insights/trend/?events={json.dumps([{'id': '$pageview'}])}"
+
+        first_response = self.client.get(url).json()
+        self.assertFalse(first_response["is_cached"])
+
+        @contextmanager
+        def refreshing_elsewhere(*args, **kwargs):
+            yield False
+
+        with patch("posthog.decorators.single_flight", refreshing_elsewhere):
+            response = self.client.get(url + "&refresh=true").json()
+
+        self.assertTrue(response["is_cached"])
+        self.assertTrue(response["is_stale"])
+        self.assertEqual(response["last_refresh"], first_response["last_refresh"])
+
+        response = self.client.get(url + "&refresh=true").json()
+        self.assertFalse(response["is_cached"])
+        self.assertNotIn("is_stale", response)
+
     def test_nonexistent_cohort_is_handled(self):
         response_nonexistent_property = self.client.get(
             f"/api/projects/{self.team.id}/insights/trend/?events={json.dumps([{'id': '$pageview'}])}&properties={json.dumps([{'type':'event','key':'foo','value':'barabarab'}])}"
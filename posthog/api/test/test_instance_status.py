@@ -1,3 +1,5 @@
+import json
+import re
 from unittest.mock import patch
 
 import pytest
@@ -23,6 +25,25 @@ class TestInstanceStatus(APIBaseTest):
         )
         timing_mock.assert_called_with("bar", 15.2, {"team_id": 1})
 
+    def test_query_profile(self):
+        self.user.is_staff = True
+        self.user.save()
+
+        response = self.client.get(
+            f"/api/projects/{self.team.id}/insights/trend/", {"events": json.dumps([{"id": "$pageview"}])}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(response["Server-Timing"], r'^clickhouse;dur=[\d.]+;desc="\d+ queries"')
+        profile_id = re.search(r'clickhouse-profile;desc="([^"]+)"', response["Server-Timing"]).group(1)  # type: ignore
+
+        response = self.client.get("/api/instance_status/query_profile", {"id": profile_id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(response.json()["query_count"], 0)
+        self.assertEqual(response.json()["query_count"], len(response.json()["queries"]))
+
+        response = self.client.get("/api/instance_status/query_profile", {"id": "unknown"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_object_storage_when_disabled(self):
         with self.settings(OBJECT_STORAGE_ENABLED=False,):
             response = self.client.get("/api/instance_status")
@@ -15,7 +15,9 @@ from posthog.api.utils import (
     format_paginated_url,
     get_data,
     get_event_ingestion_context,
+    get_event_ingestion_context_for_token,
     get_target_entity,
+    ingestion_context_cache,
     safe_clickhouse_string,
 )
 from posthog.models.filters.filter import Filter
@@ -73,6 +75,32 @@ class TestUtils(BaseTest):
 
         get_team_from_token_patcher.stop()
 
+    @patch.object(ingestion_context_cache, "ttl", 60)
+    @patch.object(ingestion_context_cache, "negative_ttl", 60)
+    def test_get_event_ingestion_context_for_token_is_cached(self):
+        ingestion_context_cache.clear()
+        expected_context = EventIngestionContext(team_id=self.team.pk, anonymize_ips=False)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(get_event_ingestion_context_for_token(self.team.api_token), expected_context)
+            self.assertEqual(get_event_ingestion_context_for_token("invalid-token"), None)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_event_ingestion_context_for_token(self.team.api_token), expected_context)
+            self.assertEqual(get_event_ingestion_context_for_token("invalid-token"), None)
+
+        # Saving the team evicts it from the cache
+        self.team.anonymize_ips = True
+        self.team.save()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                get_event_ingestion_context_for_token(self.team.api_token),
+                EventIngestionContext(team_id=self.team.pk, anonymize_ips=True),
+            )
+
+        ingestion_context_cache.clear()
+
     def test_get_data(self):
         # No data in request
         data, error_response = get_data(HttpRequest())
@@ -6,11 +6,13 @@ from typing import Any, List, Optional, Tuple, Union, cast
 from uuid import UUID
 
 import structlog
+from django.conf import settings
 from django.db.models import QuerySet
 from rest_framework import request, status
 from sentry_sdk import capture_exception
 from statshog.defaults.django import statsd
 
+from posthog.cache_utils import TTLCache
 from posthog.constants import CombinedEventType
 from posthog.exceptions import RequestParsingError, generate_exception_response
 from posthog.models import Action, Entity, EventDefinition
@@ -271,20 +273,39 @@ def get_event_ingestion_context(
     return ingestion_context, db_error, error_response
 
 
+# Invalid tokens are cached too (as `None`), for a shorter time
+ingestion_context_cache: TTLCache[EventIngestionContext] = TTLCache(
+    maxsize=settings.TEAM_TOKEN_CACHE_MAX_SIZE,
+    ttl=settings.TEAM_TOKEN_CACHE_TTL_SECONDS,
+    negative_ttl=settings.TEAM_TOKEN_CACHE_NEGATIVE_TTL_SECONDS,
+    invalidation_channel=settings.TEAM_CACHE_INVALIDATION_PUBSUB_CHANNEL,
+)
+
+
 def get_event_ingestion_context_for_token(token: str) -> Optional[EventIngestionContext]:
     """
     Based on a token associated with a Team, retrieve the context that is
     required to ingest events.
+
+    Lookups are cached per process and evicted whenever the Team is saved,
+    see `posthog.models.team.team.invalidate_team_token_caches`.
     """
+    hit, ingestion_context = ingestion_context_cache.get(token)
+    if hit:
+        return ingestion_context
+
     try:
         team_id, anonymize_ips = Team.objects.values_list("id", "anonymize_ips").get(api_token=token)
         # NOTE: Not sure why, but I needed to do this cast otherwise I got
         # `Optional[bool]` instead of `bool` from mypy, even though
         # anonymize_ips is non-null in the model
         anonymize_ips = cast(bool, anonymize_ips)
-        return EventIngestionContext(team_id=team_id, anonymize_ips=anonymize_ips)
+        ingestion_context = EventIngestionContext(team_id=team_id, anonymize_ips=anonymize_ips)
     except Team.DoesNotExist:
-        return None
+        ingestion_context = None
+
+    ingestion_context_cache.set(token, ingestion_context)
+    return ingestion_context
 
 
 def get_event_ingestion_context_for_personal_api_key(
@@ -59,21 +59,19 @@ def execute_op_clickhouse(
     per_shard=False,
 ):
     from posthog import client
+    from posthog.clickhouse.query_tagging import tag_queries
 
-    client._request_information = {"kind": "async_migration", "id": query_id}
     settings = settings if settings else {"max_execution_time": timeout_seconds}
 
     try:
-        if per_shard:
-            execute_on_each_shard(sql, args, settings=settings)
-        else:
-            client.sync_execute(sql, args, settings=settings)
+        with tag_queries(kind="async_migration", id=query_id):
+            if per_shard:
+                execute_on_each_shard(sql, args, settings=settings)
+            else:
+                client.sync_execute(sql, args, settings=settings)
     except Exception as e:
-        client._request_information = None
         raise Exception(f"Failed to execute ClickHouse op: sql={sql},\nquery_id={query_id},\nexception={str(e)}")
 
-    client._request_information = None
-
 
 def execute_on_each_shard(sql: str, args=None, settings=None) -> None:
     """
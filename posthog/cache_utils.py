@@ -0,0 +1,217 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Dict,
+    Generic,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+import redis
+import structlog
+from django.conf import settings
+
+from posthog.redis import get_client
+
+logger = structlog.get_logger(__name__)
+
+V = TypeVar("V")
+
+_invalidation_listeners: Dict[str, List["TTLCache"]] = {}
+_invalidation_listeners_lock = threading.Lock()
+_subscribed_channels: Set[str] = set()
+
+
+class TTLCache(Generic[V]):
+    """
+    A bounded, thread-safe, per-process LRU cache whose entries expire after `ttl` seconds.
+
+    `None` is a valid value and is cached for `negative_ttl` seconds instead, which allows callers to remember
+    lookups that found nothing (e.g. an invalid token) without keeping them around for as long as real results.
+
+    With `invalidation_channel` set, keys published on that Redis pub/sub channel (see `publish_invalidation`)
+    are evicted from the cache in every process.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        negative_ttl: Optional[float] = None,
+        invalidation_channel: Optional[str] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.invalidation_channel = invalidation_channel
+        self._data: "OrderedDict[Hashable, Tuple[float, Optional[V]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        if invalidation_channel:
+            with _invalidation_listeners_lock:
+                _invalidation_listeners.setdefault(invalidation_channel, []).append(self)
+
+    def get(self, key: Hashable) -> Tuple[bool, Optional[V]]:
+        "Returns a `(hit, value)` tuple, as `None` on its own could be a cached negative result."
+        if self.invalidation_channel:
+            _ensure_subscribed(self.invalidation_channel)
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key: Hashable, value: Optional[V], ttl: Optional[float] = None) -> None:
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def _ensure_subscribed(channel: str) -> None:
+    """
+    Starts a daemon thread subscribed to `channel` the first time a cache listening on it is read in this process.
+
+    If Redis is unreachable we log and carry on, entries then simply live until their TTL runs out.
+    """
+    if channel in _subscribed_channels:
+        return
+
+    with _invalidation_listeners_lock:
+        if channel in _subscribed_channels:
+            return
+        _subscribed_channels.add(channel)
+
+    if settings.TEST:
+        # Tests publish and invalidate within the same process, see `publish_invalidation`
+        return
+
+    def handle_message(message: Dict[str, Any]) -> None:
+        key = message["data"].decode("utf-8") if isinstance(message["data"], bytes) else message["data"]
+        for listening_cache in _invalidation_listeners[channel]:
+            listening_cache.invalidate(key)
+
+    try:
+        pubsub = get_client().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{channel: handle_message})
+        pubsub.run_in_thread(sleep_time=1, daemon=True)
+    except Exception:
+        logger.exception("cache_invalidation_listener_failed", channel=channel)
+
+
+def publish_invalidation(channel: str, key: str) -> None:
+    "Evicts `key` from every cache listening on `channel`, in this process and in all others."
+    for cache in _invalidation_listeners.get(channel, []):
+        cache.invalidate(key)
+
+    try:
+        get_client().publish(channel, key)
+    except Exception:
+        logger.exception("cache_invalidation_publish_failed", channel=channel)
+
+
+_in_flight: Dict[str, threading.Event] = {}
+_in_flight_lock = threading.Lock()
+
+
+@contextmanager
+def single_flight(
+    key: str,
+    timeout: float,
+    redis_client: Optional[redis.Redis] = None,
+    poll_interval: float = 0.05,
+    wait: bool = True,
+) -> Iterator[bool]:
+    """
+    Lets a single caller at a time compute the value for `key`, so that identical expensive work isn't done
+    concurrently. Threads of this process queue up in memory, and with `redis_client` set, processes take turns
+    through a lock in Redis as well.
+
+    Yields `True` to the caller that got to go first. The others wait for it to be done, or for `timeout` seconds,
+    then get `False`, and should look for the value it cached before computing it themselves. Without `wait`, they
+    get `False` right away instead, e.g. to make do with a stale value in the meantime.
+    """
+    with _in_flight_lock:
+        event = _in_flight.get(key)
+        leader = event is None
+        if leader:
+            event = _in_flight[key] = threading.Event()
+
+    if not leader:
+        if wait:
+            event.wait(timeout)  # type: ignore
+        yield False
+        return
+
+    try:
+        if redis_client is None:
+            yield True
+        else:
+            with _redis_lock(redis_client, f"single_flight:{key}", timeout, poll_interval, wait) as acquired:
+                yield acquired
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+        event.set()  # type: ignore
+
+
+@contextmanager
+def _redis_lock(
+    redis_client: redis.Redis, name: str, timeout: float, poll_interval: float, wait: bool
+) -> Iterator[bool]:
+    "Yields whether the lock was taken, or `False` once whoever held it released it or `timeout` seconds passed."
+    token = uuid.uuid4().hex
+    try:
+        acquired = bool(redis_client.set(name, token, nx=True, px=int(timeout * 1000)))
+    except redis.RedisError:
+        logger.exception("single_flight_lock_failed", name=name)
+        yield True
+        return
+
+    if not acquired:
+        deadline = time.monotonic() + timeout
+        while wait and time.monotonic() < deadline and redis_client.exists(name):
+            time.sleep(poll_interval)
+        yield False
+        return
+
+    try:
+        yield True
+    finally:
+        try:
+            # Not atomic, but only risks releasing a lock that expired and was taken over in the meantime
+            if redis_client.get(name) == token.encode("utf-8"):
+                redis_client.delete(name)
+        except redis.RedisError:
+            logger.exception("single_flight_unlock_failed", name=name)
@@ -106,6 +106,9 @@ def setup_periodic_tasks(sender: Celery, **kwargs):
 
     sender.add_periodic_task(crontab(minute=0, hour="*"), calculate_cohort_ids_in_feature_flags_task.s())
 
+    # Events of the hour before are mostly in by ten past
+    sender.add_periodic_task(crontab(minute=10, hour="*"), update_property_values.s(), name="update property values")
+
     sender.add_periodic_task(120, calculate_cohort.s(), name="recalculate cohorts")
 
     if settings.ASYNC_EVENT_PROPERTY_USAGE:
@@ -160,16 +163,16 @@ def setup_periodic_tasks(sender: Celery, **kwargs):
 # Set up clickhouse query instrumentation
 @task_prerun.connect
 def set_up_instrumentation(task_id, task, **kwargs):
-    from posthog import client
+    from posthog.clickhouse.query_tagging import set_request_information
 
-    client._request_information = {"kind": "celery", "id": task.name}
+    set_request_information({"kind": "celery", "id": task.name})
 
 
 @task_postrun.connect
 def teardown_instrumentation(task_id, task, **kwargs):
-    from posthog import client
+    from posthog.clickhouse.query_tagging import set_request_information
 
-    client._request_information = None
+    set_request_information(None)
 
 
 @app.task(ignore_result=True)
@@ -447,6 +450,13 @@ def calculate_cohort_ids_in_feature_flags_task():
     calculate_cohort_ids_in_feature_flags()
 
 
+@app.task(ignore_result=True)
+def update_property_values():
+    from posthog.tasks.property_values import update_property_values
+
+    update_property_values()
+
+
 @app.task(ignore_result=True, bind=True)
 def debug_task(self):
     print(f"Request: {self.request!r}")
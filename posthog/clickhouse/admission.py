@@ -0,0 +1,143 @@
+"""
+Admission control in front of ClickHouse, so that no single team, nor background work, can take up all of it.
+
+Queries of the kinds in `KIND_WEIGHTS` take a slot before they're sent to ClickHouse, out of a number of slots per
+process and per team. Once they're all taken, queries queue up and are let in by weighted fair queueing: every team
+and kind of query gets its own flow, and flows are served in proportion to the weight of their kind, so interactive
+requests keep getting through while a team's dashboards are refreshing in the background, and one team's backlog
+doesn't hold up everyone else's queries.
+
+Queries that can't be let in before `CLICKHOUSE_ADMISSION_TIMEOUT_SECONDS`, or the deadline they're run within,
+fail with `ClickHouseTooBusy` rather than piling onto the cluster.
+"""
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from statshog.defaults.django import statsd
+
+from posthog.clickhouse.query_executor import remaining_time
+from posthog.exceptions import ClickHouseTooBusy
+from posthog.settings import (
+    CLICKHOUSE_ADMISSION_MAX_CONCURRENT,
+    CLICKHOUSE_ADMISSION_MAX_CONCURRENT_PER_TEAM,
+    CLICKHOUSE_ADMISSION_TIMEOUT_SECONDS,
+)
+
+# Share of the slots each kind of query gets while they are contended, by the `kind` queries are tagged with
+KIND_WEIGHTS: Dict[str, float] = {"request": 4, "celery": 1}
+
+Flow = Tuple[Optional[int], str]
+
+
+@dataclass
+class _Waiter:
+    flow: Flow
+    start_tag: float
+    finish_tag: float
+    sequence: int
+    granted: bool = False
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int, max_concurrent_per_team: int, weights: Dict[str, float]):
+        self.max_concurrent = max_concurrent
+        self.max_concurrent_per_team = max_concurrent_per_team
+        self.weights = weights
+        self._condition = threading.Condition()
+        self._running = 0
+        self._running_per_team: Dict[Optional[int], int] = {}
+        self._waiters: List[_Waiter] = []
+        self._sequence = itertools.count()
+        # Fair queueing keeps time in terms of the service flows got rather than wall-clock time
+        self._virtual_time = 0.0
+        self._finish_tags: Dict[Flow, float] = {}
+
+    @contextmanager
+    def admit(self, team_id: Optional[int], kind: Optional[str], timeout: Optional[float] = None) -> Iterator[None]:
+        "Holds a slot for the block, waiting for one for up to `timeout` seconds. Other kinds of queries pass through."
+        if not self.max_concurrent or kind not in self.weights:
+            yield
+            return
+
+        if timeout is None:
+            timeout = CLICKHOUSE_ADMISSION_TIMEOUT_SECONDS
+        remaining = remaining_time()
+        if remaining is not None:
+            timeout = min(timeout, remaining)
+
+        start = time.monotonic()
+        with self._condition:
+            waiter = self._enqueue((team_id, kind))
+            self._dispatch()
+            while not waiter.granted:
+                left = start + timeout - time.monotonic()
+                if left <= 0:
+                    self._waiters.remove(waiter)
+                    break
+                self._condition.wait(left)
+            queued = len(self._waiters)
+
+        statsd.timing("clickhouse_admission_queue_time", (time.monotonic() - start) * 1000, tags={"kind": kind})
+        statsd.gauge("clickhouse_admission_queued", queued)
+        if not waiter.granted:
+            statsd.incr("clickhouse_admission_rejected", tags={"kind": kind})
+            raise ClickHouseTooBusy()
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._running -= 1
+                if team_id is not None:
+                    self._running_per_team[team_id] -= 1
+                    if not self._running_per_team[team_id]:
+                        del self._running_per_team[team_id]
+                self._dispatch()
+
+    def _enqueue(self, flow: Flow) -> _Waiter:
+        start_tag = max(self._virtual_time, self._finish_tags.get(flow, 0.0))
+        finish_tag = start_tag + 1 / self.weights[flow[1]]
+        self._finish_tags[flow] = finish_tag
+        waiter = _Waiter(flow=flow, start_tag=start_tag, finish_tag=finish_tag, sequence=next(self._sequence))
+        self._waiters.append(waiter)
+        return waiter
+
+    def _dispatch(self) -> None:
+        "Lets waiters in while there are slots for them, those that would be done first in virtual time first."
+        granted = False
+        while self._running < self.max_concurrent and self._waiters:
+            eligible = [waiter for waiter in self._waiters if self._has_team_slot(waiter.flow[0])]
+            if not eligible:
+                break
+            waiter = min(eligible, key=lambda waiter: (waiter.finish_tag, waiter.sequence))
+            self._waiters.remove(waiter)
+            self._virtual_time = max(self._virtual_time, waiter.start_tag)
+            self._running += 1
+            team_id = waiter.flow[0]
+            if team_id is not None:
+                self._running_per_team[team_id] = self._running_per_team.get(team_id, 0) + 1
+            waiter.granted = True
+            granted = True
+
+        if not self._waiters:
+            # Flows that are idle are caught up with the virtual time anyway
+            self._finish_tags = {
+                flow: finish_tag for flow, finish_tag in self._finish_tags.items() if finish_tag > self._virtual_time
+            }
+        if granted:
+            self._condition.notify_all()
+
+    def _has_team_slot(self, team_id: Optional[int]) -> bool:
+        # Queries that aren't for any team in particular are only limited by the slots of the process
+        return team_id is None or self._running_per_team.get(team_id, 0) < self.max_concurrent_per_team
+
+
+admission_controller = AdmissionController(
+    max_concurrent=CLICKHOUSE_ADMISSION_MAX_CONCURRENT,
+    max_concurrent_per_team=CLICKHOUSE_ADMISSION_MAX_CONCURRENT_PER_TEAM,
+    weights=KIND_WEIGHTS,
+)
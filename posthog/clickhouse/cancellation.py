@@ -0,0 +1,152 @@
+"""
+Kills ClickHouse queries nobody is waiting for anymore, which would otherwise keep running on the cluster for minutes.
+
+Queries run within a `track_queries` block, which every request is run in, are registered against it by their query
+id. While any of them are running, the connection to the client is checked every `DISCONNECT_POLL_INTERVAL_MS`, and
+once the client is gone, e.g. because the insight was closed or the load balancer timed out, they're killed, and no
+new ones are started. Queries running past their deadline are killed by `sync_execute` itself.
+
+Kills are only scheduled on timer threads, and run on threads of their own, so that a slow `KILL QUERY` doesn't hold up
+every other check and deadline.
+"""
+import select
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Set
+
+import structlog
+from statshog.defaults.django import statsd
+
+from posthog.exceptions import ClientDisconnected
+from posthog.settings import CLICKHOUSE_CLUSTER
+from posthog.timer import get_timer_thread
+
+logger = structlog.get_logger(__name__)
+
+DISCONNECT_POLL_INTERVAL_MS = 1000
+KILL_QUERY_WORKERS = 4
+
+_disconnect_timer = get_timer_thread("posthog.clickhouse.cancellation", DISCONNECT_POLL_INTERVAL_MS)
+
+_kill_executor: Optional[ThreadPoolExecutor] = None
+_kill_executor_lock = threading.Lock()
+
+_running_queries: ContextVar[Optional["RunningQueries"]] = ContextVar("running_queries", default=None)
+
+
+class RunningQueries:
+    "Queries running for a request, including from threads it was copied into."
+
+    def __init__(self, connection: Optional[socket.socket]):
+        self.connection = connection
+        self.disconnected = False
+        self._query_ids: Set[str] = set()
+        self._lock = threading.Lock()
+        self._watching = False
+
+    def add(self, query_id: str) -> None:
+        with self._lock:
+            if self.disconnected:
+                raise ClientDisconnected()
+            self._query_ids.add(query_id)
+            start_watching = self.connection is not None and not self._watching
+            if start_watching:
+                self._watching = True
+        if start_watching:
+            _disconnect_timer.schedule(self.check_connection)
+
+    def discard(self, query_id: str) -> None:
+        with self._lock:
+            self._query_ids.discard(query_id)
+
+    def check_connection(self) -> None:
+        "Kills the running queries if the client disconnected, or checks again in a bit for as long as any are left."
+        with self._lock:
+            query_ids = list(self._query_ids)
+            if not query_ids:
+                self._watching = False
+                return
+
+        if not is_disconnected(self.connection):
+            _disconnect_timer.schedule(self.check_connection)
+            return
+
+        with self._lock:
+            self.disconnected = True
+            self._watching = False
+        statsd.incr("clickhouse_queries_killed", len(query_ids), tags={"reason": "client_disconnected"})
+        kill_queries_in_background(query_ids)
+
+
+@contextmanager
+def track_queries(connection: Optional[socket.socket] = None) -> Iterator[RunningQueries]:
+    "Registers queries run within the block, to be killed once `connection` to the client is closed."
+    running_queries = RunningQueries(connection)
+    token = _running_queries.set(running_queries)
+    try:
+        yield running_queries
+    finally:
+        _running_queries.reset(token)
+
+
+@contextmanager
+def running_query(query_id: str) -> Iterator[None]:
+    "Registers the query against the block it's run within, if any. Raises `ClientDisconnected` if nobody's waiting."
+    running_queries = _running_queries.get()
+    if running_queries is None:
+        yield
+        return
+
+    running_queries.add(query_id)
+    try:
+        yield
+    finally:
+        running_queries.discard(query_id)
+
+
+def is_disconnected(connection: Optional[socket.socket]) -> bool:
+    "Whether the client closed `connection`, which is readable with nothing left to read once it did."
+    if connection is None:
+        return False
+    try:
+        readable, _, _ = select.select([connection], [], [], 0)
+        return bool(readable) and connection.recv(1, socket.MSG_PEEK) == b""
+    except (BlockingIOError, ValueError):
+        # Nothing to read after all, or a socket that can't be peeked into (e.g. TLS) or that was already closed
+        return False
+    except OSError:
+        return True
+
+
+def kill_queries_in_background(query_ids: List[str]) -> None:
+    _get_kill_executor().submit(kill_queries, query_ids)
+
+
+def _get_kill_executor() -> ThreadPoolExecutor:
+    "Created on first use, so that each forked web worker gets its own threads."
+    global _kill_executor
+    if _kill_executor is None:
+        with _kill_executor_lock:
+            if _kill_executor is None:
+                _kill_executor = ThreadPoolExecutor(
+                    max_workers=KILL_QUERY_WORKERS, thread_name_prefix="clickhouse-kill"
+                )
+    return _kill_executor
+
+
+def kill_queries(query_ids: List[str]) -> None:
+    from posthog.client import sync_execute
+
+    try:
+        sync_execute(
+            f"KILL QUERY ON CLUSTER '{CLICKHOUSE_CLUSTER}' WHERE query_id IN %(query_ids)s ASYNC",
+            {"query_ids": query_ids},
+            # Don't wait on every host of the cluster to have gone through the queue of distributed queries
+            settings={"distributed_ddl_task_timeout": 0},
+            flush=False,
+        )
+    except Exception as err:
+        logger.exception("clickhouse_kill_queries_failed", query_ids=query_ids, error=err)
@@ -0,0 +1,17 @@
+from datetime import datetime, timedelta
+
+from infi.clickhouse_orm import migrations
+
+from posthog.models.event.sql import DISTRIBUTED_EVENTS_ROLLUP_TABLE_SQL, EVENTS_ROLLUP_MV_SQL, EVENTS_ROLLUP_TABLE_SQL
+from posthog.settings.data_stores import CLICKHOUSE_REPLICATION
+
+# A whole hour at least an hour from now, so that the view exists before any event it should roll up is produced.
+# Events produced before are rolled up with `./manage.py backfill_events_rollup` once this has passed
+EVENTS_ROLLUP_SINCE = datetime.utcnow().replace(minute=0, second=0, microsecond=0) + timedelta(hours=2)
+
+operations = [migrations.RunSQL(EVENTS_ROLLUP_TABLE_SQL())]
+
+if CLICKHOUSE_REPLICATION:
+    operations.append(migrations.RunSQL(DISTRIBUTED_EVENTS_ROLLUP_TABLE_SQL()))
+
+operations.append(migrations.RunSQL(EVENTS_ROLLUP_MV_SQL(since=EVENTS_ROLLUP_SINCE.strftime("%Y-%m-%d %H:%M:%S"))))
@@ -0,0 +1,9 @@
+from infi.clickhouse_orm import migrations
+
+from posthog.models.property.sql import DISTRIBUTED_PROPERTY_VALUES_TABLE_SQL, PROPERTY_VALUES_TABLE_SQL
+from posthog.settings.data_stores import CLICKHOUSE_REPLICATION
+
+operations = [migrations.RunSQL(PROPERTY_VALUES_TABLE_SQL())]
+
+if CLICKHOUSE_REPLICATION:
+    operations.append(migrations.RunSQL(DISTRIBUTED_PROPERTY_VALUES_TABLE_SQL()))
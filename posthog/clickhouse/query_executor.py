@@ -0,0 +1,180 @@
+"""
+Thread pool shared by everything in a process that fans out into several ClickHouse queries for a single request, such
+as the series of a trend, both periods being compared or the insights of a dashboard being refreshed.
+
+Spawning threads for each of these lets a few large dashboards open hundreds of connections to ClickHouse at once.
+The pool is bounded instead, and so is the number of its threads a single team can take up. Tasks that can't get a
+thread are run by the caller itself, which keeps nested fan-out from deadlocking on the pool, and keeps every request
+making progress, only less in parallel while the pool is busy.
+
+Deadlines are kept in a context variable so that they carry over into the tasks, and `sync_execute` doesn't let
+ClickHouse spend longer on a query than there is left until the deadline it's run within.
+"""
+import os
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import Context, ContextVar, copy_context
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TypeVar,
+)
+
+from django.db import close_old_connections
+from statshog.defaults.django import statsd
+
+from posthog.exceptions import QueryDeadlineExceeded
+from posthog.settings import CLICKHOUSE_QUERY_EXECUTOR_WORKERS, CLICKHOUSE_QUERY_EXECUTOR_WORKERS_PER_TEAM
+
+T = TypeVar("T")
+
+# As a `time.monotonic()` timestamp
+_deadline: ContextVar[Optional[float]] = ContextVar("query_deadline", default=None)
+
+
+def get_query_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+def remaining_time() -> Optional[float]:
+    "Seconds left until the deadline queries are run within, if any. Raises `QueryDeadlineExceeded` once it passed."
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise QueryDeadlineExceeded()
+    return remaining
+
+
+@contextmanager
+def query_deadline(timeout: Optional[float]) -> Iterator[None]:
+    "Has queries run within the block be done in `timeout` seconds, unless they already have to be done sooner."
+    deadline = _deadline.get()
+    if timeout is not None:
+        candidate = time.monotonic() + timeout
+        deadline = candidate if deadline is None else min(deadline, candidate)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+class QueryExecutor:
+    def __init__(self, max_workers: int, max_workers_per_team: int):
+        self.max_workers = max_workers
+        self.max_workers_per_team = max_workers_per_team
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pid = os.getpid()
+        self._busy = 0
+        self._busy_per_team: Dict[Optional[int], int] = {}
+
+    def run(
+        self, tasks: Sequence[Callable[[], T]], team_id: Optional[int] = None, timeout: Optional[float] = None
+    ) -> List[T]:
+        """
+        Runs `tasks` in parallel as far as the pool lets it, and returns their results in order.
+
+        As soon as a task raises, the tasks that haven't started yet are cancelled and the exception is raised again.
+        With `timeout`, or within an earlier deadline, the same goes for `QueryDeadlineExceeded` once it passes.
+        Tasks already running are left to finish in the background, as their queries can't be interrupted from here.
+        """
+        with query_deadline(timeout):
+            futures: List[Optional[Future]] = [None] * len(tasks)
+            results: List[Any] = [None] * len(tasks)
+            try:
+                for index, task in enumerate(tasks):
+                    remaining_time()
+                    # The last task is always left to the caller, as it would otherwise sit idle waiting on the pool
+                    if index < len(tasks) - 1 and self._reserve(team_id):
+                        futures[index] = self._submit(task, team_id)
+                    else:
+                        results[index] = task()
+
+                submitted = [future for future in futures if future is not None]
+                if submitted:
+                    done, not_done = wait(submitted, timeout=remaining_time(), return_when=FIRST_EXCEPTION)
+                    for future in done:
+                        future.result()
+                    if not_done:
+                        raise QueryDeadlineExceeded()
+                    for index, future in enumerate(futures):
+                        if future is not None:
+                            results[index] = future.result()
+            except BaseException:
+                for future in futures:
+                    if future is not None:
+                        future.cancel()
+                raise
+            return results
+
+    def _reserve(self, team_id: Optional[int]) -> bool:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked processes don't inherit the threads of the pool, nor the tasks that were running on them
+                self._pool = None
+                self._pid = os.getpid()
+                self._busy = 0
+                self._busy_per_team = {}
+
+            limit = None
+            if self._busy >= self.max_workers:
+                limit = "workers"
+            elif self._busy_per_team.get(team_id, 0) >= self.max_workers_per_team:
+                limit = "workers_per_team"
+            else:
+                self._busy += 1
+                self._busy_per_team[team_id] = self._busy_per_team.get(team_id, 0) + 1
+            busy = self._busy
+
+        statsd.gauge("clickhouse_query_executor_busy_workers", busy)
+        if limit is not None:
+            statsd.incr("clickhouse_query_executor_ran_inline", tags={"limit": limit})
+            return False
+        return True
+
+    def _release(self, team_id: Optional[int]) -> None:
+        with self._lock:
+            self._busy -= 1
+            self._busy_per_team[team_id] -= 1
+            if not self._busy_per_team[team_id]:
+                del self._busy_per_team[team_id]
+
+    def _submit(self, task: Callable[[], T], team_id: Optional[int]) -> Future:
+        try:
+            # Threads start out with an empty context, copy ours over so that queries are tagged and the deadline holds
+            future = self._get_pool().submit(_run_task, copy_context(), task)
+        except BaseException:
+            self._release(team_id)
+            raise
+        # Also called when the task gets cancelled before it started
+        future.add_done_callback(lambda _: self._release(team_id))
+        return future
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="clickhouse-query")
+            return self._pool
+
+
+def _run_task(context: Context, task: Callable[[], T]) -> T:
+    try:
+        return context.run(task)
+    finally:
+        # Like Django does at the end of every request, as these threads outlive them
+        close_old_connections()
+
+
+query_executor = QueryExecutor(
+    max_workers=CLICKHOUSE_QUERY_EXECUTOR_WORKERS, max_workers_per_team=CLICKHOUSE_QUERY_EXECUTOR_WORKERS_PER_TEAM
+)
@@ -0,0 +1,75 @@
+"""
+Context that ClickHouse queries are tagged with, e.g. the request or celery task they're run for.
+
+It lives in context variables rather than globals, so that concurrent requests and tasks don't see each other's tags.
+Threads start out with an empty context, so work handed off to them should be run with `copy_context().run`.
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+_request_information: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_information", default=None)
+_query_profile: ContextVar[Optional["QueryProfile"]] = ContextVar("query_profile", default=None)
+
+
+def get_request_information() -> Optional[Dict[str, Any]]:
+    return _request_information.get()
+
+
+def set_request_information(information: Optional[Dict[str, Any]]) -> None:
+    _request_information.set(information)
+
+
+@contextmanager
+def tag_queries(**information: Any) -> Iterator[None]:
+    "Tags queries run within the block with `information`, which is expected to have at least `kind` and `id`."
+    token = _request_information.set(information)
+    try:
+        yield
+    finally:
+        _request_information.reset(token)
+
+
+@dataclass
+class ProfiledQuery:
+    query_id: str
+    duration_ms: float
+    # As reported by the driver, `system.query_log` has the final numbers
+    read_rows: int
+    read_bytes: int
+
+
+@dataclass
+class QueryProfile:
+    "ClickHouse queries run within a `profile_queries` block, including from threads it was copied into."
+
+    queries: List[ProfiledQuery] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, query: ProfiledQuery) -> None:
+        with self._lock:
+            self.queries.append(query)
+
+    @property
+    def duration_ms(self) -> float:
+        return sum(query.duration_ms for query in self.queries)
+
+    def server_timing(self) -> str:
+        "Summary for a `Server-Timing` header, which browsers show alongside the request in their dev tools."
+        return f'clickhouse;dur={self.duration_ms:.1f};desc="{len(self.queries)} queries"'
+
+
+def get_query_profile() -> Optional[QueryProfile]:
+    return _query_profile.get()
+
+
+@contextmanager
+def profile_queries() -> Iterator[QueryProfile]:
+    profile = QueryProfile()
+    token = _query_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _query_profile.reset(token)
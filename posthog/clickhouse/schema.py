@@ -7,6 +7,7 @@ from posthog.models.cohort.sql import *
 from posthog.models.event.sql import *
 from posthog.models.group.sql import *
 from posthog.models.person.sql import *
+from posthog.models.property.sql import *
 from posthog.models.session_recording_event.sql import *
 
 CREATE_MERGETREE_TABLE_QUERIES = (
@@ -14,16 +15,20 @@ CREATE_MERGETREE_TABLE_QUERIES = (
     PERSON_STATIC_COHORT_TABLE_SQL,
     DEAD_LETTER_QUEUE_TABLE_SQL,
     EVENTS_TABLE_SQL,
+    EVENTS_ROLLUP_TABLE_SQL,
     GROUPS_TABLE_SQL,
     PERSONS_TABLE_SQL,
     PERSONS_DISTINCT_ID_TABLE_SQL,
     PERSON_DISTINCT_ID2_TABLE_SQL,
     PLUGIN_LOG_ENTRIES_TABLE_SQL,
+    PROPERTY_VALUES_TABLE_SQL,
     SESSION_RECORDING_EVENTS_TABLE_SQL,
 )
 CREATE_DISTRIBUTED_TABLE_QUERIES = (
     WRITABLE_EVENTS_TABLE_SQL,
     DISTRIBUTED_EVENTS_TABLE_SQL,
+    DISTRIBUTED_EVENTS_ROLLUP_TABLE_SQL,
+    DISTRIBUTED_PROPERTY_VALUES_TABLE_SQL,
     WRITABLE_SESSION_RECORDING_EVENTS_TABLE_SQL,
     DISTRIBUTED_SESSION_RECORDING_EVENTS_TABLE_SQL,
 )
@@ -40,6 +45,7 @@ CREATE_KAFKA_TABLE_QUERIES = (
 CREATE_MV_TABLE_QUERIES = (
     DEAD_LETTER_QUEUE_TABLE_MV_SQL,
     EVENTS_TABLE_JSON_MV_SQL,
+    EVENTS_ROLLUP_MV_SQL,
     GROUPS_TABLE_MV_SQL,
     PERSONS_TABLE_MV_SQL,
     PERSONS_DISTINCT_ID_TABLE_MV_SQL,
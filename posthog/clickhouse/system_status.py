@@ -2,16 +2,19 @@ import glob
 import subprocess
 import tempfile
 import uuid
+from dataclasses import asdict
 from os.path import abspath, basename, dirname, join
-from typing import Dict, Generator, List, Tuple
+from typing import Any, Dict, Generator, List, Optional, Tuple
 
 import sqlparse
 from clickhouse_driver import Client
 from dateutil.relativedelta import relativedelta
+from django.core.cache import cache
 from django.utils import timezone
 from sentry_sdk.api import capture_exception
 
 from posthog.api.dead_letter_queue import get_dead_letter_queue_events_last_24h, get_dead_letter_queue_size
+from posthog.clickhouse.query_tagging import QueryProfile
 from posthog.client import make_ch_pool, query_with_columns, sync_execute
 from posthog.models.event.util import get_event_count, get_event_count_for_last_month, get_event_count_month_to_date
 from posthog.settings import CLICKHOUSE_PASSWORD, CLICKHOUSE_STABLE_HOST, CLICKHOUSE_USER
@@ -19,6 +22,8 @@ from posthog.settings import CLICKHOUSE_PASSWORD, CLICKHOUSE_STABLE_HOST, CLICKH
 SLOW_THRESHOLD_MS = 10000
 SLOW_AFTER = relativedelta(hours=6)
 
+QUERY_PROFILE_TTL = 60 * 60  # 1 hour
+
 CLICKHOUSE_FLAMEGRAPH_EXECUTABLE = abspath(join(dirname(__file__), "bin", "clickhouse-flamegraph"))
 FLAMEGRAPH_PL = abspath(join(dirname(__file__), "bin", "flamegraph.pl"))
 
@@ -168,6 +173,47 @@ def get_clickhouse_slow_log() -> List[Dict]:
     )
 
 
+def save_query_profile(profile: QueryProfile) -> str:
+    "Keeps the queries of a request around, for `get_query_profile_details` to look up once they're in the query log."
+    profile_id = str(uuid.uuid4())
+    cache.set(
+        f"query_profile_{profile_id}", [asdict(query) for query in profile.queries], timeout=QUERY_PROFILE_TTL,
+    )
+    return profile_id
+
+
+def get_query_profile_details(profile_id: str) -> Optional[Dict[str, Any]]:
+    queries = cache.get(f"query_profile_{profile_id}")
+    if queries is None:
+        return None
+
+    # Queries only show up in the log once it's flushed, which ClickHouse does every few seconds. Until then, we fall
+    # back to the numbers the driver reported.
+    logged_queries = {
+        row["query_id"]: row
+        for row in query_with_columns(
+            """
+                SELECT query_id, query_duration_ms AS duration_ms, read_rows, read_bytes, memory_usage
+                FROM system.query_log
+                WHERE type = 'QueryFinish'
+                  AND event_date >= yesterday()
+                  AND query_id IN %(query_ids)s
+            """,
+            {"query_ids": [query["query_id"] for query in queries]},
+        )
+    }
+    queries = [{"memory_usage": None, **query, **logged_queries.get(query["query_id"], {})} for query in queries]
+
+    return {
+        "query_count": len(queries),
+        "duration_ms": sum(query["duration_ms"] for query in queries),
+        "read_rows": sum(query["read_rows"] for query in queries),
+        "read_bytes": sum(query["read_bytes"] for query in queries),
+        "peak_memory_usage": max((query["memory_usage"] or 0 for query in queries), default=0),
+        "queries": queries,
+    }
+
+
 def analyze_query(query: str):
     random_id = str(uuid.uuid4())
 
@@ -0,0 +1,95 @@
+import threading
+import time
+from typing import Callable, List, Optional
+
+from django.test import SimpleTestCase
+
+from posthog.clickhouse.admission import AdmissionController
+from posthog.exceptions import ClickHouseTooBusy
+
+
+def wait_for(condition: Callable[[], bool], timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for condition")
+        time.sleep(0.01)
+
+
+class TestAdmissionController(SimpleTestCase):
+    def _controller(self, max_concurrent=1, max_concurrent_per_team=1) -> AdmissionController:
+        return AdmissionController(
+            max_concurrent=max_concurrent,
+            max_concurrent_per_team=max_concurrent_per_team,
+            weights={"request": 4, "celery": 1},
+        )
+
+    def _queue_up(self, controller: AdmissionController, admitted: List[str], team_id: Optional[int], kind: str):
+        "Starts a thread that waits for a slot, records being let in and gives the slot right back."
+
+        def run():
+            with controller.admit(team_id=team_id, kind=kind, timeout=5):
+                admitted.append(f"{kind}:{team_id}")
+
+        queued = len(controller._waiters)
+        thread = threading.Thread(target=run)
+        thread.start()
+        wait_for(lambda: len(controller._waiters) == queued + 1)
+        return thread
+
+    def test_other_kinds_of_queries_pass_through(self):
+        controller = self._controller(max_concurrent=1)
+
+        with controller.admit(team_id=1, kind="request"):
+            with controller.admit(team_id=1, kind="async_migration"), controller.admit(team_id=1, kind=None):
+                pass
+
+    def test_limits_queries_per_team(self):
+        controller = self._controller(max_concurrent=2, max_concurrent_per_team=1)
+        admitted: List[str] = []
+
+        with controller.admit(team_id=1, kind="request"):
+            thread = self._queue_up(controller, admitted, team_id=1, kind="request")
+            # Other teams still get in
+            with controller.admit(team_id=2, kind="request", timeout=0.1):
+                pass
+            self.assertEqual(admitted, [])
+
+        thread.join()
+        self.assertEqual(admitted, ["request:1"])
+
+    def test_interactive_queries_get_ahead_of_background_ones(self):
+        controller = self._controller()
+        admitted: List[str] = []
+
+        with controller.admit(team_id=3, kind="request"):
+            threads = [self._queue_up(controller, admitted, team_id=1, kind="celery") for _ in range(4)]
+            threads += [self._queue_up(controller, admitted, team_id=2, kind="request") for _ in range(2)]
+
+        for thread in threads:
+            thread.join()
+        self.assertEqual(admitted, ["request:2"] * 2 + ["celery:1"] * 4)
+
+    def test_teams_take_turns(self):
+        controller = self._controller(max_concurrent_per_team=2)
+        admitted: List[str] = []
+
+        with controller.admit(team_id=3, kind="celery"):
+            threads = [self._queue_up(controller, admitted, team_id=1, kind="celery") for _ in range(3)]
+            threads.append(self._queue_up(controller, admitted, team_id=2, kind="celery"))
+
+        for thread in threads:
+            thread.join()
+        self.assertEqual(admitted, ["celery:1", "celery:2", "celery:1", "celery:1"])
+
+    def test_gives_up_once_too_busy(self):
+        controller = self._controller()
+
+        with controller.admit(team_id=1, kind="request"):
+            with self.assertRaises(ClickHouseTooBusy):
+                with controller.admit(team_id=2, kind="request", timeout=0.05):
+                    pass
+            self.assertEqual(controller._waiters, [])
+
+        with controller.admit(team_id=2, kind="request", timeout=0.05):
+            pass
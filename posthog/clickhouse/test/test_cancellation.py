@@ -0,0 +1,66 @@
+import socket
+import threading
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from posthog.clickhouse.cancellation import is_disconnected, kill_queries_in_background, running_query, track_queries
+from posthog.exceptions import ClientDisconnected
+
+
+class TestCancellation(SimpleTestCase):
+    def setUp(self):
+        self.server, self.client = socket.socketpair()
+        self.addCleanup(self.server.close)
+        self.addCleanup(self.client.close)
+
+    def test_is_disconnected(self):
+        self.assertFalse(is_disconnected(None))
+        self.assertFalse(is_disconnected(self.server))
+
+        # Pipelined data doesn't count, and is left to be read
+        self.client.sendall(b"GET")
+        self.assertFalse(is_disconnected(self.server))
+        self.assertEqual(self.server.recv(3), b"GET")
+
+        self.client.close()
+        self.assertTrue(is_disconnected(self.server))
+
+    @patch("posthog.clickhouse.cancellation.kill_queries_in_background")
+    def test_kills_running_queries_once_client_disconnected(self, kill_queries):
+        with track_queries(connection=self.server) as running_queries:
+            with running_query("finished"):
+                pass
+            with running_query("running"):
+                running_queries.check_connection()
+                kill_queries.assert_not_called()
+
+                self.client.close()
+                running_queries.check_connection()
+                kill_queries.assert_called_once_with(["running"])
+
+            with self.assertRaises(ClientDisconnected):
+                with running_query("next"):
+                    pass
+
+    @patch("posthog.clickhouse.cancellation.kill_queries_in_background")
+    def test_queries_outside_of_requests_are_not_tracked(self, kill_queries):
+        with running_query("untracked"):
+            pass
+
+        with track_queries() as running_queries:
+            with running_query("no connection"):
+                running_queries.check_connection()
+
+        kill_queries.assert_not_called()
+
+    @patch("posthog.clickhouse.cancellation.kill_queries")
+    def test_kills_dont_hold_up_the_caller(self, kill_queries):
+        started, finish = threading.Event(), threading.Event()
+        kill_queries.side_effect = lambda query_ids: started.set() or finish.wait(5)
+
+        kill_queries_in_background(["slow"])
+
+        self.assertTrue(started.wait(5))
+        finish.set()
+        kill_queries.assert_called_once_with(["slow"])
@@ -0,0 +1,107 @@
+import threading
+import time
+from functools import partial
+
+from django.test import SimpleTestCase
+
+from posthog.clickhouse.query_executor import QueryExecutor, get_query_deadline, query_deadline
+from posthog.clickhouse.query_tagging import get_request_information, tag_queries
+from posthog.exceptions import QueryDeadlineExceeded
+
+
+class ConcurrencyTracker:
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def task(self, value, duration=0.05):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(duration)
+        with self._lock:
+            self.running -= 1
+        return value
+
+
+class TestQueryExecutor(SimpleTestCase):
+    def test_runs_tasks_in_parallel_and_returns_results_in_order(self):
+        tracker = ConcurrencyTracker()
+        executor = QueryExecutor(max_workers=4, max_workers_per_team=4)
+
+        results = executor.run([partial(tracker.task, i) for i in range(10)], team_id=1)
+
+        self.assertEqual(results, list(range(10)))
+        self.assertGreater(tracker.max_running, 1)
+        # The pool's threads, and the caller
+        self.assertLessEqual(tracker.max_running, 5)
+
+    def test_caps_threads_per_team(self):
+        tracker = ConcurrencyTracker()
+        executor = QueryExecutor(max_workers=8, max_workers_per_team=1)
+
+        results = executor.run([partial(tracker.task, i) for i in range(6)], team_id=1)
+
+        self.assertEqual(results, list(range(6)))
+        self.assertEqual(tracker.max_running, 2)
+
+    def test_runs_everything_inline_without_workers(self):
+        executor = QueryExecutor(max_workers=0, max_workers_per_team=4)
+
+        results = executor.run([threading.get_ident, threading.get_ident])
+
+        self.assertEqual(results, [threading.get_ident()] * 2)
+
+    def test_nested_fan_out_does_not_deadlock(self):
+        executor = QueryExecutor(max_workers=1, max_workers_per_team=1)
+
+        def outer(i):
+            return executor.run([partial(lambda j: i * 10 + j, j) for j in range(3)], team_id=1)
+
+        results = executor.run([partial(outer, i) for i in range(3)], team_id=1)
+
+        self.assertEqual(results, [[0, 1, 2], [10, 11, 12], [20, 21, 22]])
+
+    def test_raises_first_error_without_starting_remaining_tasks(self):
+        executor = QueryExecutor(max_workers=1, max_workers_per_team=1)
+        started = []
+
+        def failing():
+            raise ValueError("boom")
+
+        def slow(i):
+            started.append(i)
+            time.sleep(0.1)
+            return i
+
+        with self.assertRaises(ValueError):
+            executor.run([partial(slow, 0), failing, partial(slow, 2)])
+
+        self.assertNotIn(2, started)
+        # The thread is given back once the task still running on it is done
+        time.sleep(0.2)
+        tracker = ConcurrencyTracker()
+        executor.run([partial(tracker.task, 0), partial(tracker.task, 1)])
+        self.assertEqual(tracker.max_running, 2)
+
+    def test_deadline(self):
+        executor = QueryExecutor(max_workers=2, max_workers_per_team=2)
+
+        with self.assertRaises(QueryDeadlineExceeded):
+            executor.run([partial(time.sleep, 0.5), partial(time.sleep, 0.5), partial(time.sleep, 0.01)], timeout=0.1)
+
+        # Tasks get the deadline they were run within, or an earlier one of their own
+        with query_deadline(10):
+            deadline = get_query_deadline()
+            self.assertEqual(executor.run([get_query_deadline, get_query_deadline]), [deadline, deadline])
+            self.assertLess(executor.run([get_query_deadline, get_query_deadline], timeout=1)[0], deadline)
+        self.assertIsNone(get_query_deadline())
+
+    def test_tasks_keep_query_tags(self):
+        executor = QueryExecutor(max_workers=2, max_workers_per_team=2)
+
+        with tag_queries(kind="request", id="fan-out"):
+            results = executor.run([get_request_information] * 3)
+
+        self.assertEqual(results, [{"kind": "request", "id": "fan-out"}] * 3)
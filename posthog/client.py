@@ -1,33 +1,46 @@
 import hashlib
+import itertools
 import json
+import math
+import pickle
 import time
 import types
+import uuid
 from dataclasses import dataclass
 from time import perf_counter
 from typing import (
     Any,
     Dict,
+    Iterator,
     List,
     Optional,
     Sequence,
-    Tuple,
     Union,
     cast,
 )
 
 import sqlparse
+import zstandard
 from celery.task.control import revoke
 from clickhouse_driver import Client as SyncClient
+from clickhouse_driver.errors import ServerException
 from clickhouse_pool import ChPool
 from dataclasses_json import dataclass_json
 from django.conf import settings as app_settings
 from django.core.cache import cache
 from django.utils.timezone import now
 from sentry_sdk.api import capture_exception
+from statshog.defaults.django import statsd
 
 from posthog import redis
+from posthog.cache_utils import TTLCache, single_flight
 from posthog.celery import enqueue_clickhouse_execute_with_progress
+from posthog.clickhouse.admission import admission_controller
+from posthog.clickhouse.cancellation import kill_queries_in_background, running_query
+from posthog.clickhouse.query_executor import get_query_deadline, remaining_time
+from posthog.clickhouse.query_tagging import ProfiledQuery, get_query_profile, get_request_information
 from posthog.errors import wrap_query_error
+from posthog.exceptions import QueryDeadlineExceeded
 from posthog.internal_metrics import incr, timing
 from posthog.settings import (
     CLICKHOUSE_CA,
@@ -36,12 +49,18 @@ from posthog.settings import (
     CLICKHOUSE_DATABASE,
     CLICKHOUSE_HOST,
     CLICKHOUSE_PASSWORD,
+    CLICKHOUSE_PREPARED_QUERY_CACHE_SIZE,
+    CLICKHOUSE_RESULT_CACHE_COMPRESSION_THRESHOLD,
+    CLICKHOUSE_RESULT_CACHE_LOCAL_MAX_BYTES,
+    CLICKHOUSE_RESULT_CACHE_LOCAL_SIZE,
+    CLICKHOUSE_RESULT_CACHE_LOCAL_TTL,
+    CLICKHOUSE_RESULT_CACHE_LOCK_TIMEOUT,
     CLICKHOUSE_SECURE,
     CLICKHOUSE_USER,
     CLICKHOUSE_VERIFY,
     TEST,
 )
-from posthog.timer import get_timer_thread
+from posthog.timer import TimerTask, get_timer_thread
 from posthog.utils import get_safe_cache
 
 InsertParams = Union[list, tuple, types.GeneratorType]
@@ -52,7 +71,18 @@ CACHE_TTL = 60  # seconds
 SLOW_QUERY_THRESHOLD_MS = 15000
 QUERY_TIMEOUT_THREAD = get_timer_thread("posthog.client", SLOW_QUERY_THRESHOLD_MS)
 
-_request_information: Optional[Dict] = None
+# Query templates with their comments stripped, keyed by a hash of the template. Templates come from code, so entries
+# never go stale and are only evicted once the cache is full.
+_prepared_query_cache: TTLCache[str] = TTLCache(maxsize=CLICKHOUSE_PREPARED_QUERY_CACHE_SIZE, ttl=math.inf)
+
+# Encoded results of `cache_sync_execute`, kept in front of Redis
+_result_cache: TTLCache[bytes] = TTLCache(
+    maxsize=CLICKHOUSE_RESULT_CACHE_LOCAL_SIZE, ttl=CLICKHOUSE_RESULT_CACHE_LOCAL_TTL
+)
+
+# First byte of encoded results
+_RESULT_PICKLE = b"\x00"
+_RESULT_PICKLE_ZSTD = b"\x01"
 
 
 # Optimize_move_to_prewhere setting is set because of this regression test
@@ -122,18 +152,53 @@ def async_execute(query, args=None, settings=None, with_column_types=False):
 
 
 def cache_sync_execute(query, args=None, redis_client=None, ttl=CACHE_TTL, settings=None, with_column_types=False):
+    """
+    Runs the query, caching its result in Redis for `ttl` seconds, and for a few seconds in this process as well.
+    Identical queries that come in while it runs wait for its result instead of running again.
+    """
     if not redis_client:
         redis_client = redis.get_client()
     key = _key_hash(query, args)
-    if redis_client.exists(key):
-        result = _deserialize(redis_client.get(key))
+
+    result = _get_cached_result(redis_client, key)
+    if result is not None:
         return result
-    else:
+
+    with single_flight(key.hex(), timeout=CLICKHOUSE_RESULT_CACHE_LOCK_TIMEOUT, redis_client=redis_client) as leader:
+        if not leader:
+            result = _get_cached_result(redis_client, key)
+            if result is not None:
+                return result
+
+        statsd.incr("clickhouse_result_cache_miss")
         result = sync_execute(query, args, settings=settings, with_column_types=with_column_types)
-        redis_client.set(key, _serialize(result), ex=ttl)
+        result_bytes = _serialize(result)
+        redis_client.set(key, result_bytes, ex=ttl)
+        statsd.incr("clickhouse_result_cache_bytes_written", len(result_bytes))
+        _cache_result_locally(key, result_bytes, ttl)
         return result
 
 
+def _get_cached_result(redis_client, key: bytes) -> Optional[Any]:
+    hit, result_bytes = _result_cache.get(key)
+    if hit:
+        statsd.incr("clickhouse_result_cache_hit", tags={"tier": "memory"})
+    else:
+        result_bytes = redis_client.get(key)
+        if result_bytes is None:
+            return None
+        statsd.incr("clickhouse_result_cache_hit", tags={"tier": "redis"})
+        statsd.incr("clickhouse_result_cache_bytes_read", len(result_bytes))
+        _cache_result_locally(key, result_bytes, CLICKHOUSE_RESULT_CACHE_LOCAL_TTL)
+    # Results are decoded on every hit, so that callers never share (and mutate) the same rows
+    return _deserialize(cast(bytes, result_bytes))
+
+
+def _cache_result_locally(key: bytes, result_bytes: bytes, ttl: int) -> None:
+    if len(result_bytes) <= CLICKHOUSE_RESULT_CACHE_LOCAL_MAX_BYTES:
+        _result_cache.set(key, result_bytes, ttl=min(ttl, CLICKHOUSE_RESULT_CACHE_LOCAL_TTL))
+
+
 def sync_execute(query, args=None, settings=None, with_column_types=False, flush=True):
     if TEST and flush:
         try:
@@ -143,21 +208,26 @@ def sync_execute(query, args=None, settings=None, with_column_types=False, flush
         except ModuleNotFoundError:  # when we run plugin server tests it tries to run above, ignore
             pass
 
-    with ch_pool.get_client() as client:
+    settings = _apply_deadline({**settings_override, **(settings or {})})
+    query_id = str(uuid.uuid4())
+
+    with _admit(args), ch_pool.get_client() as client, running_query(query_id):
         start_time = perf_counter()
 
         prepared_sql, prepared_args, tags = _prepare_query(client=client, query=query, args=args)
 
-        timeout_task = QUERY_TIMEOUT_THREAD.schedule(_notify_of_slow_query_failure, tags)
-
-        settings = {**settings_override, **(settings or {})}
+        timeout_tasks = _schedule_timeouts(query_id, tags)
 
         try:
             result = client.execute(
-                prepared_sql, params=prepared_args, settings=settings, with_column_types=with_column_types,
+                prepared_sql,
+                params=prepared_args,
+                settings=settings,
+                with_column_types=with_column_types,
+                query_id=query_id,
             )
         except Exception as err:
-            err = wrap_query_error(err)
+            err = _wrap_query_error(err)
             tags["failed"] = True
             tags["reason"] = type(err).__name__
             incr("clickhouse_sync_execution_failure", tags=tags)
@@ -166,16 +236,155 @@ def sync_execute(query, args=None, settings=None, with_column_types=False, flush
         finally:
             execution_time = perf_counter() - start_time
 
-            QUERY_TIMEOUT_THREAD.cancel(timeout_task)
+            for timeout_task in timeout_tasks:
+                QUERY_TIMEOUT_THREAD.cancel(timeout_task)
             timing("clickhouse_sync_execution_time", execution_time * 1000.0, tags=tags)
+            _profile_query(client, query_id, execution_time)
 
             if app_settings.SHELL_PLUS_PRINT_SQL:
                 print("Execution time: %.6fs" % (execution_time,))
-            if _request_information is not None and _request_information.get("save", False):
+            if (get_request_information() or {}).get("save", False):
                 save_query(prepared_sql, execution_time)
     return result
 
 
+def execute_iter(
+    query, args=None, settings=None, with_column_types=False, block_size: Optional[int] = None, columnar=False
+) -> Iterator[Any]:
+    """
+    Streaming counterpart of `sync_execute`, yielding rows as ClickHouse sends them rather than collecting them all
+    first, so that memory use is bounded by the size of the blocks ClickHouse sends instead of the size of the result.
+
+    With `block_size` set, ClickHouse is asked for blocks of that many rows, which are yielded as lists of rows, or
+    with `columnar` as lists of columns. With `with_column_types`, the column names and types are yielded first.
+
+    The connection is held until the iterator is exhausted or closed, so consume it promptly.
+    """
+    if TEST:
+        try:
+            from posthog.test.base import flush_persons_and_events
+
+            flush_persons_and_events()
+        except ModuleNotFoundError:  # when we run plugin server tests it tries to run above, ignore
+            pass
+
+    settings = _apply_deadline({**settings_override, **(settings or {})})
+    if block_size:
+        settings["max_block_size"] = block_size
+    query_id = str(uuid.uuid4())
+
+    with _admit(args), ch_pool.get_client() as client, running_query(query_id):
+        start_time = perf_counter()
+
+        prepared_sql, prepared_args, tags = _prepare_query(client=client, query=query, args=args)
+
+        timeout_tasks = _schedule_timeouts(query_id, tags)
+
+        finished = False
+        try:
+            rows = client.execute_iter(
+                prepared_sql,
+                params=prepared_args,
+                settings=settings,
+                with_column_types=with_column_types,
+                query_id=query_id,
+            )
+            if with_column_types:
+                yield next(rows)
+            if block_size:
+                yield from _iter_blocks(rows, block_size, columnar)
+            else:
+                yield from rows
+            finished = True
+        except Exception as err:
+            err = _wrap_query_error(err)
+            tags["failed"] = True
+            tags["reason"] = type(err).__name__
+            incr("clickhouse_sync_execution_failure", tags=tags)
+
+            raise err
+        finally:
+            execution_time = perf_counter() - start_time
+
+            for timeout_task in timeout_tasks:
+                QUERY_TIMEOUT_THREAD.cancel(timeout_task)
+            timing("clickhouse_sync_execution_time", execution_time * 1000.0, tags=tags)
+            _profile_query(client, query_id, execution_time)
+
+            if not finished:
+                # The rest of the result is still on its way, and would be read by whoever gets this connection next
+                client.disconnect()
+
+            if app_settings.SHELL_PLUS_PRINT_SQL:
+                print("Execution time: %.6fs" % (execution_time,))
+            if (get_request_information() or {}).get("save", False):
+                save_query(prepared_sql, execution_time)
+
+
+def _schedule_timeouts(query_id: str, tags: Dict[str, Any]) -> List[TimerTask]:
+    "Reports the query once it's slow, and kills it once it's still running past the deadline it's run within."
+    timeout_tasks = [QUERY_TIMEOUT_THREAD.schedule(_notify_of_slow_query_failure, tags)]
+    deadline = get_query_deadline()
+    if deadline is not None:
+        timeout_tasks.append(
+            QUERY_TIMEOUT_THREAD.schedule_in((deadline - time.monotonic()) * 1000, _kill_query_past_deadline, query_id)
+        )
+    return timeout_tasks
+
+
+def _kill_query_past_deadline(query_id: str) -> None:
+    statsd.incr("clickhouse_queries_killed", tags={"reason": "deadline"})
+    kill_queries_in_background([query_id])
+
+
+def _wrap_query_error(err: Exception) -> Exception:
+    deadline = get_query_deadline()
+    if isinstance(err, ServerException) and deadline is not None and time.monotonic() >= deadline:
+        # Stopped by ClickHouse for going over `max_execution_time`, or killed by `_kill_query_past_deadline`
+        return QueryDeadlineExceeded()
+    return wrap_query_error(err)
+
+
+def _admit(args: QueryArgs):
+    "Waits for the query to be let through to ClickHouse, see `posthog.clickhouse.admission`."
+    team_id = args.get("team_id") if isinstance(args, dict) else None
+    return admission_controller.admit(team_id=team_id, kind=(get_request_information() or {}).get("kind"))
+
+
+def _apply_deadline(settings: Dict[str, Any]) -> Dict[str, Any]:
+    "Keeps ClickHouse from spending longer on the query than is left until the deadline it's run within, if any."
+    remaining = remaining_time()
+    if remaining is not None:
+        limit = math.ceil(remaining)
+        # 0 stands for no limit
+        if not settings.get("max_execution_time") or settings["max_execution_time"] > limit:
+            settings["max_execution_time"] = limit
+    return settings
+
+
+def _profile_query(client: SyncClient, query_id: str, execution_time: float) -> None:
+    profile = get_query_profile()
+    if profile is None:
+        return
+    progress = client.last_query.progress if client.last_query is not None else None
+    profile.record(
+        ProfiledQuery(
+            query_id=query_id,
+            duration_ms=execution_time * 1000.0,
+            read_rows=progress.rows if progress is not None else 0,
+            read_bytes=progress.bytes if progress is not None else 0,
+        )
+    )
+
+
+def _iter_blocks(rows: Iterator[Any], block_size: int, columnar: bool) -> Iterator[List[Any]]:
+    while True:
+        block = list(itertools.islice(rows, block_size))
+        if not block:
+            return
+        yield list(zip(*block)) if columnar else block
+
+
 def query_with_columns(
     query: str,
     args: Optional[QueryArgs] = None,
@@ -186,7 +395,9 @@ def query_with_columns(
         columns_to_remove = []
     if columns_to_rename is None:
         columns_to_rename = {}
-    metrics, types = sync_execute(query, args, with_column_types=True)
+    # Streamed, so that the raw rows don't have to be held on to alongside the dicts built from them
+    metrics = execute_iter(query, args, with_column_types=True)
+    types = next(metrics)
     type_names = [key for key, _type in types]
 
     rows = []
@@ -322,7 +533,7 @@ def execute_with_progress(
 
         if app_settings.SHELL_PLUS_PRINT_SQL:
             print("Execution time: %.6fs" % (execution_time,))
-        if _request_information is not None and _request_information.get("save", False):
+        if (get_request_information() or {}).get("save", False):
             save_query(prepared_sql, execution_time)
 
 
@@ -425,29 +636,31 @@ def _prepare_query(client: SyncClient, query: str, args: QueryArgs):
     a working query without exporting to csv or similar), we need to
     do it manually.
 
+    Comments are stripped from the template rather than the rendered
+    query, so that it only has to be tokenized once per template, see
+    `_strip_comments`.
+
     We only want to try to substitue for SELECT queries, which
     clickhouse_driver at this moment in time decides based on the
     below predicate.
     """
     prepared_args: Any = QueryArgs
+    formatted_sql = _strip_comments(query)
     if isinstance(args, (list, tuple, types.GeneratorType)):
         # If we get one of these it means we have an insert, let the clickhouse
         # client handle substitution here.
-        rendered_sql = query
         prepared_args = args
     elif not args:
         # If `args` is not truthy then make prepared_args `None`, which the
         # clickhouse client uses to signal no substitution is desired. Expected
         # args balue are `None` or `{}` for instance
-        rendered_sql = query
         prepared_args = None
     else:
         # Else perform the substitution so we can perform operations on the raw
         # non-templated SQL
-        rendered_sql = client.substitute_params(query, args)
+        formatted_sql = client.substitute_params(formatted_sql, args)
         prepared_args = None
 
-    formatted_sql = sqlparse.format(rendered_sql, strip_comments=True)
     annotated_sql, tags = _annotate_tagged_query(formatted_sql, args)
 
     if app_settings.SHELL_PLUS_PRINT_SQL:
@@ -457,15 +670,38 @@ def _prepare_query(client: SyncClient, query: str, args: QueryArgs):
     return annotated_sql, prepared_args, tags
 
 
-def _deserialize(result_bytes: bytes) -> List[Tuple]:
-    results = []
-    for x in json.loads(result_bytes):
-        results.append(tuple(x))
-    return results
+def _strip_comments(query: str) -> str:
+    """
+    Strips comments from a query template. sqlparse tokenizes in pure Python, which adds up for funnel and breakdown
+    queries that run to many kilobytes, so the result is kept in a bounded LRU cache.
+    """
+    key = hashlib.md5(query.encode("utf-8")).digest()
+    hit, stripped_query = _prepared_query_cache.get(key)
+    if hit:
+        statsd.incr("clickhouse_prepared_query_cache_hit")
+        return cast(str, stripped_query)
+
+    statsd.incr("clickhouse_prepared_query_cache_miss")
+    stripped_query = sqlparse.format(query, strip_comments=True)
+    _prepared_query_cache.set(key, stripped_query)
+    return stripped_query
+
+
+def _deserialize(result_bytes: bytes) -> Any:
+    encoding, data = result_bytes[:1], result_bytes[1:]
+    if encoding == _RESULT_PICKLE_ZSTD:
+        return pickle.loads(zstandard.ZstdDecompressor().decompress(data))
+    if encoding == _RESULT_PICKLE:
+        return pickle.loads(data)
+    # Cached as JSON before results were pickled
+    return [tuple(row) for row in json.loads(result_bytes)]
 
 
 def _serialize(result: Any) -> bytes:
-    return json.dumps(result).encode("utf-8")
+    data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) > CLICKHOUSE_RESULT_CACHE_COMPRESSION_THRESHOLD:
+        return _RESULT_PICKLE_ZSTD + zstandard.ZstdCompressor().compress(data)
+    return _RESULT_PICKLE + data
 
 
 def _query_hash(query: str, team_id: int, args: Any) -> str:
@@ -492,12 +728,13 @@ def _annotate_tagged_query(query, args):
     Adds in a /* */ so we can look in clickhouses `system.query_log`
     to easily marry up to the generating code.
     """
-    tags = {"kind": (_request_information or {}).get("kind"), "id": (_request_information or {}).get("id")}
+    request_information = get_request_information()
+    tags = {"kind": (request_information or {}).get("kind"), "id": (request_information or {}).get("id")}
     if isinstance(args, dict) and "team_id" in args:
         tags["team_id"] = args["team_id"]
     # Annotate the query with information on the request/task
-    if _request_information is not None:
-        query = f"/* {_request_information['kind']}:{_request_information['id'].replace('/', '_')} */ {query}"
+    if request_information is not None:
+        query = f"/* {request_information['kind']}:{request_information['id'].replace('/', '_')} */ {query}"
 
     return query, tags
 
@@ -528,11 +765,12 @@ def save_query(sql: str, execution_time: float) -> None:
     """
     Save query for debugging purposes
     """
-    if _request_information is None:
+    request_information = get_request_information()
+    if request_information is None:
         return
 
     try:
-        key = "save_query_{}".format(_request_information["user_id"])
+        key = "save_query_{}".format(request_information["user_id"])
         queries = json.loads(get_safe_cache(key) or "[]")
 
         queries.insert(
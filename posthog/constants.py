@@ -103,6 +103,7 @@ PROPERTY_GROUPS = "property_groups"
 SELECTOR = "selector"
 INTERVAL = "interval"
 SMOOTHING_INTERVALS = "smoothing_intervals"
+SAMPLING_FACTOR = "sampling_factor"
 DISPLAY = "display"
 SHOWN_AS = "shown_as"
 FILTER_TEST_ACCOUNTS = "filter_test_accounts"
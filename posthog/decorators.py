@@ -7,10 +7,13 @@ from django.core.cache import cache
 from django.utils.timezone import now
 from rest_framework.request import Request
 from rest_framework.viewsets import GenericViewSet
+from statshog.defaults.django import statsd
 
+from posthog.cache_utils import single_flight
 from posthog.models import DashboardTile, User
 from posthog.models.filters.utils import get_filter
 from posthog.models.insight import Insight
+from posthog.redis import get_client
 from posthog.utils import should_refresh
 
 from .utils import generate_cache_key, get_safe_cache
@@ -31,6 +34,12 @@ U = TypeVar("U", bound=GenericViewSet)
 
 
 def cached_function(f: Callable[[U, Request], T]) -> Callable[[U, Request], T]:
+    """
+    Caches results by the filter they were computed for, and only computes them once at a time for any filter, so that
+    everyone opening the same dashboard at once doesn't start the same queries. Whoever comes second waits for the
+    result, or when refreshing a result that is cached already, gets that one right away, marked as stale.
+    """
+
     @wraps(f)
     def wrapper(self, request) -> T:
         # prepare caching params
@@ -42,30 +51,58 @@ def cached_function(f: Callable[[U, Request], T]) -> Callable[[U, Request], T]:
         cache_key = generate_cache_key(f"{filter.toJSON()}_{team.pk}")
 
         # return cached result when possible
-        if not should_refresh(request):
-            cached_result_package = get_safe_cache(cache_key)
-            if cached_result_package and cached_result_package.get("result"):
-                cached_result_package["is_cached"] = True
-                return cached_result_package
-
-        # call function being wrapped
-        fresh_result_package = cast(T, f(self, request))
-        # cache new data
-        if isinstance(fresh_result_package, dict):
-            result = fresh_result_package.get("result")
-            if not isinstance(result, dict) or not result.get("loading"):
-                fresh_result_package["last_refresh"] = now()
-                fresh_result_package["is_cached"] = False
-                cache.set(
-                    cache_key, fresh_result_package, settings.CACHED_RESULTS_TTL,
-                )
-                if filter:
-                    Insight.objects.filter(team_id=team.pk, filters_hash=cache_key).update(last_refresh=now())
+        cached_result_package = get_safe_cache(cache_key)
+        if not cached_result_package or not cached_result_package.get("result"):
+            cached_result_package = None
+        elif not should_refresh(request):
+            cached_result_package["is_cached"] = True
+            return cached_result_package
+
+        with single_flight(
+            cache_key,
+            timeout=settings.CLICKHOUSE_REQUEST_TIMEOUT_SECONDS,
+            redis_client=get_client(),
+            wait=cached_result_package is None,
+        ) as leader:
+            if not leader:
+                if cached_result_package is not None:
+                    statsd.incr("cached_function_single_flight", tags={"outcome": "stale"})
+                    cached_result_package["is_cached"] = True
+                    cached_result_package["is_stale"] = True
+                    return cached_result_package
+
+                cached_result_package = get_safe_cache(cache_key)
+                if cached_result_package and cached_result_package.get("result"):
+                    statsd.incr("cached_function_single_flight", tags={"outcome": "waited"})
+                    cached_result_package["is_cached"] = True
+                    return cached_result_package
+                # Whoever went first failed or took too long
+                statsd.incr("cached_function_single_flight", tags={"outcome": "gave_up"})
+
+            return _compute_and_cache(f, self, request, filter, cache_key, team.pk)
+
+    return wrapper
 
-                    DashboardTile.objects.filter(insight__team_id=team.pk, filters_hash=cache_key).update(
-                        last_refresh=now()
-                    )
 
-        return fresh_result_package
+def _compute_and_cache(
+    f: Callable[[U, Request], T], viewset: U, request: Request, filter: Any, cache_key: str, team_id: int
+) -> T:
+    # call function being wrapped
+    fresh_result_package = cast(T, f(viewset, request))
+    # cache new data
+    if isinstance(fresh_result_package, dict):
+        result = fresh_result_package.get("result")
+        if not isinstance(result, dict) or not result.get("loading"):
+            fresh_result_package["last_refresh"] = now()
+            fresh_result_package["is_cached"] = False
+            cache.set(
+                cache_key, fresh_result_package, settings.CACHED_RESULTS_TTL,
+            )
+            if filter:
+                Insight.objects.filter(team_id=team_id, filters_hash=cache_key).update(last_refresh=now())
+
+                DashboardTile.objects.filter(insight__team_id=team_id, filters_hash=cache_key).update(
+                    last_refresh=now()
+                )
 
-    return wrapper
+    return fresh_result_package
@@ -37,6 +37,24 @@ class EstimatedQueryExecutionTimeTooLong(APIException):
     default_detail = "Estimated query execution time is too long"
 
 
+class QueryDeadlineExceeded(APIException):
+    status_code = status.HTTP_504_GATEWAY_TIMEOUT
+    default_detail = "Queries did not finish in the time they were given"
+    default_code = "query_deadline_exceeded"
+
+
+class ClickHouseTooBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many queries are running right now, please try again in a bit"
+    default_code = "clickhouse_too_busy"
+
+
+class ClientDisconnected(APIException):
+    status_code = 499  # Client Closed Request, as nginx calls it
+    default_detail = "The client disconnected before the response was ready"
+    default_code = "client_disconnected"
+
+
 class ExceptionContext(TypedDict):
     request: HttpRequest
 
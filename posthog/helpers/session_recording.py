@@ -2,16 +2,24 @@ import base64
 import dataclasses
 import gzip
 import json
+import threading
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import DefaultDict, Dict, Generator, List, Optional
+from typing import Callable, DefaultDict, Dict, Generator, List, Optional
 
+import zstandard
+from django.conf import settings
 from sentry_sdk.api import capture_exception, capture_message
 
 from posthog.models import utils
 
 FULL_SNAPSHOT = 2
 
+ZSTD_COMPRESSION_LEVEL = 3
+# zstd only splits inputs into jobs for its worker threads past a few MB, below that threads are pure overhead
+ZSTD_MULTITHREADING_THRESHOLD = 4 * 1024 * 1024
+
 Event = Dict
 SnapshotData = Dict
 WindowId = Optional[str]
@@ -68,19 +76,48 @@ def preprocess_session_recording_events_for_clickhouse(events: List[Event]) -> L
         else:
             result.append(event)
 
-    for _, snapshots in snapshots_by_session_and_window_id.items():
-        result.extend(list(compress_and_chunk_snapshots(snapshots)))
+    snapshot_groups = list(snapshots_by_session_and_window_id.values())
+    if len(snapshot_groups) > 1 and settings.SESSION_RECORDING_COMPRESSION_WORKERS > 1:
+        # Both zlib and zstd release the GIL while compressing, so sessions in a batch compress in parallel
+        chunked_groups = _get_compression_executor().map(
+            lambda snapshots: list(compress_and_chunk_snapshots(snapshots)), snapshot_groups
+        )
+    else:
+        chunked_groups = map(lambda snapshots: list(compress_and_chunk_snapshots(snapshots)), snapshot_groups)
+
+    for chunked_events in chunked_groups:
+        result.extend(chunked_events)
 
     return result
 
 
-def compress_and_chunk_snapshots(events: List[Event], chunk_size=512 * 1024) -> Generator[Event, None, None]:
+_compression_executor: Optional[ThreadPoolExecutor] = None
+_compression_executor_lock = threading.Lock()
+
+
+def _get_compression_executor() -> ThreadPoolExecutor:
+    "Created on first use, so that each forked web worker gets its own threads."
+    global _compression_executor
+    if _compression_executor is None:
+        with _compression_executor_lock:
+            if _compression_executor is None:
+                _compression_executor = ThreadPoolExecutor(
+                    max_workers=settings.SESSION_RECORDING_COMPRESSION_WORKERS,
+                    thread_name_prefix="snapshot-compression",
+                )
+    return _compression_executor
+
+
+def compress_and_chunk_snapshots(
+    events: List[Event], chunk_size=512 * 1024, compression: Optional[str] = None
+) -> Generator[Event, None, None]:
+    compression = compression or settings.SESSION_RECORDING_SNAPSHOT_COMPRESSION
     data_list = [event["properties"]["$snapshot_data"] for event in events]
     session_id = events[0]["properties"]["$session_id"]
     has_full_snapshot = any(snapshot_data["type"] == FULL_SNAPSHOT for snapshot_data in data_list)
     window_id = events[0]["properties"].get("$window_id")
 
-    compressed_data = compress_to_string(json.dumps(data_list))
+    compressed_data = SNAPSHOT_CODECS[compression].compress(json.dumps(data_list))
 
     id = str(utils.UUIDT())
     chunks = chunk_string(compressed_data, chunk_size)
@@ -96,7 +133,7 @@ def compress_and_chunk_snapshots(events: List[Event], chunk_size=512 * 1024) ->
                     "chunk_index": index,
                     "chunk_count": len(chunks),
                     "data": chunk,
-                    "compression": "gzip-base64",
+                    "compression": compression,
                     "has_full_snapshot": has_full_snapshot,
                 },
             },
@@ -130,6 +167,32 @@ def decompress(base64data: str) -> str:
     return gzip.decompress(compressed_bytes).decode("utf-16", "surrogatepass")
 
 
+def compress_to_string_zstd(json_string: str) -> str:
+    encoded = json_string.encode("utf-8", "surrogatepass")
+    threads = settings.SESSION_RECORDING_COMPRESSION_WORKERS if len(encoded) >= ZSTD_MULTITHREADING_THRESHOLD else 0
+    compressed_data = zstandard.ZstdCompressor(level=ZSTD_COMPRESSION_LEVEL, threads=threads).compress(encoded)
+    return base64.b64encode(compressed_data).decode("utf-8")
+
+
+def decompress_zstd(base64data: str) -> str:
+    compressed_bytes = base64.b64decode(base64data)
+    return zstandard.ZstdDecompressor().decompress(compressed_bytes).decode("utf-8", "surrogatepass")
+
+
+@dataclasses.dataclass(frozen=True)
+class SnapshotCodec:
+    compress: Callable[[str], str]
+    decompress: Callable[[str], str]
+
+
+# Keyed by the `compression` field of chunked `$snapshot_data`
+SNAPSHOT_CODECS: Dict[str, SnapshotCodec] = {
+    # gzip over UTF-16 is what recordings were always stored as, kept so that they can still be played back
+    "gzip-base64": SnapshotCodec(compress=compress_to_string, decompress=decompress),
+    "zstd-base64": SnapshotCodec(compress=compress_to_string_zstd, decompress=decompress_zstd),
+}
+
+
 def decompress_chunked_snapshot_data(
     team_id: int,
     session_recording_id: str,
@@ -189,10 +252,22 @@ def decompress_chunked_snapshot_data(
             )
             continue
 
+        codec = SNAPSHOT_CODECS.get(chunks[0].snapshot_data.get("compression", "gzip-base64"))
+        if codec is None:
+            capture_message(
+                "Unknown session recording compression! Team: {}, Session: {}, Chunk-id: {}, Compression: {}".format(
+                    team_id,
+                    session_recording_id,
+                    chunks[0].snapshot_data["chunk_id"],
+                    chunks[0].snapshot_data.get("compression"),
+                )
+            )
+            continue
+
         b64_compressed_data = "".join(
             chunk.snapshot_data["data"] for chunk in sorted(chunks, key=lambda c: c.snapshot_data["chunk_index"])
         )
-        decompressed_data = json.loads(decompress(b64_compressed_data))
+        decompressed_data = json.loads(codec.decompress(b64_compressed_data))
 
         # Decompressed data can be large, and in metadata calculations, we only care if the event is "active"
         # This pares down the data returned, so we're not passing around a massive object
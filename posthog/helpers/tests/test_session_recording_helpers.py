@@ -107,6 +107,54 @@ def test_decompression_results_in_same_data(raw_snapshot_events):
     ]
 
 
+def test_zstd_compression_results_in_same_data(raw_snapshot_events):
+    raw_snapshot_data = [event["properties"]["$snapshot_data"] for event in raw_snapshot_events]
+    gzip_chunks = list(compress_and_chunk_snapshots(raw_snapshot_events, 100, compression="gzip-base64"))
+    zstd_chunks = list(compress_and_chunk_snapshots(raw_snapshot_events, 100, compression="zstd-base64"))
+
+    assert all(chunk["properties"]["$snapshot_data"]["compression"] == "zstd-base64" for chunk in zstd_chunks)
+    assert len("".join(chunk["properties"]["$snapshot_data"]["data"] for chunk in zstd_chunks)) < len(
+        "".join(chunk["properties"]["$snapshot_data"]["data"] for chunk in gzip_chunks)
+    )
+
+    # Recordings can contain chunks written with different codecs
+    snapshot_list = [
+        SnapshotDataTaggedWithWindowId(window_id="1", snapshot_data=chunk["properties"]["$snapshot_data"])
+        for chunk in gzip_chunks + zstd_chunks
+    ]
+    assert (
+        decompress_chunked_snapshot_data(2, "someid", snapshot_list).snapshot_data_by_window_id["1"]
+        == raw_snapshot_data + raw_snapshot_data
+    )
+
+
+def test_preprocess_uses_configured_codec(settings):
+    settings.SESSION_RECORDING_SNAPSHOT_COMPRESSION = "zstd-base64"
+    events = [
+        {
+            "event": "$snapshot",
+            "properties": {
+                "$session_id": str(session_id),
+                "$snapshot_data": {"type": 2, "foo": "bar"},
+                "distinct_id": "abc123",
+            },
+        }
+        for session_id in range(10)
+    ]
+
+    preprocessed = preprocess_session_recording_events_for_clickhouse(events)
+
+    assert [event["properties"]["$session_id"] for event in preprocessed] == [str(i) for i in range(10)]
+    for event in preprocessed:
+        assert event["properties"]["$snapshot_data"]["compression"] == "zstd-base64"
+        snapshot_list = [
+            SnapshotDataTaggedWithWindowId(window_id=None, snapshot_data=event["properties"]["$snapshot_data"])
+        ]
+        assert decompress_chunked_snapshot_data(2, "someid", snapshot_list).snapshot_data_by_window_id[None] == [
+            {"type": 2, "foo": "bar"}
+        ]
+
+
 def test_has_full_snapshot_property(raw_snapshot_events):
     compressed = list(compress_and_chunk_snapshots(raw_snapshot_events))
     assert len(compressed) == 1
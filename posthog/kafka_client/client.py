@@ -3,8 +3,10 @@ from enum import Enum
 from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import kafka.errors
+import orjson
 from kafka import KafkaConsumer as KC
 from kafka import KafkaProducer as KP
+from kafka.future import Future
 from kafka.producer.future import FutureProduceResult, RecordMetadata
 from kafka.structs import TopicPartition
 from statshog.defaults.django import statsd
@@ -12,9 +14,14 @@ from structlog import get_logger
 
 from posthog.client import async_execute, sync_execute
 from posthog.kafka_client import helper
+from posthog.kafka_client.spillover import PendingRecord, ProduceBuffer, SpilloverLog
 from posthog.settings import (
     KAFKA_BASE64_KEYS,
     KAFKA_HOSTS,
+    KAFKA_PRODUCER_BUFFER_SIZE,
+    KAFKA_PRODUCER_MAX_BACKOFF_SECONDS,
+    KAFKA_PRODUCER_SPILLOVER_DIR,
+    KAFKA_PRODUCER_SPILLOVER_SEGMENT_BYTES,
     KAFKA_SASL_MECHANISM,
     KAFKA_SASL_PASSWORD,
     KAFKA_SASL_USER,
@@ -82,8 +89,18 @@ def _sasl_params():
     return {}
 
 
+def json_serializer(d: Any) -> bytes:
+    try:
+        return orjson.dumps(d, option=orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        # orjson refuses integers wider than 64 bits, which the stdlib encoder handles fine
+        return json.dumps(d).encode("utf-8")
+
+
 class _KafkaProducer:
-    def __init__(self, test=TEST):
+    buffer: Optional[ProduceBuffer]
+
+    def __init__(self, test=TEST, buffer_size=KAFKA_PRODUCER_BUFFER_SIZE, spillover_dir=KAFKA_PRODUCER_SPILLOVER_DIR):
         if test:
             self.producer = TestKafkaProducer()
         elif KAFKA_BASE64_KEYS:
@@ -96,10 +113,18 @@ class _KafkaProducer:
                 **_sasl_params(),
             )
 
-    @staticmethod
-    def json_serializer(d):
-        b = json.dumps(d).encode("utf-8")
-        return b
+        # With a buffer, `produce` only enqueues and a background thread deals with Kafka being slow or unavailable
+        self.buffer = None
+        if buffer_size > 0 and spillover_dir and not test:
+            self.buffer = ProduceBuffer(
+                send=self._send,
+                flush=self.producer.flush,
+                spillover_log=SpilloverLog(spillover_dir, KAFKA_PRODUCER_SPILLOVER_SEGMENT_BYTES),
+                maxsize=buffer_size,
+                max_backoff_seconds=KAFKA_PRODUCER_MAX_BACKOFF_SECONDS,
+            )
+
+    json_serializer = staticmethod(json_serializer)
 
     def on_send_success(self, record_metadata: RecordMetadata):
         statsd.incr(
@@ -125,11 +150,23 @@ class _KafkaProducer:
         encoded_headers = (
             [(header[0], header[1].encode("utf-8")) for header in headers] if headers is not None else None
         )
-        future = self.producer.send(topic, value=b, key=key, headers=encoded_headers)
+        record = PendingRecord(topic=topic, value=b, key=key, headers=encoded_headers)
+        if self.buffer is not None:
+            self.buffer.put(record)
+        else:
+            self._send(record)
+
+    def _send(self, record: PendingRecord) -> Future:
+        future = self.producer.send(record.topic, value=record.value, key=record.key, headers=record.headers)
         # Record if the send request was successful or not
-        future.add_callback(self.on_send_success).add_errback(lambda exc: self.on_send_failure(topic=topic, exc=exc))
+        future.add_callback(self.on_send_success).add_errback(
+            lambda exc: self.on_send_failure(topic=record.topic, exc=exc)
+        )
+        return future
 
     def close(self):
+        if self.buffer is not None:
+            self.buffer.close()
         self.producer.flush()
 
 
@@ -146,7 +183,7 @@ def can_connect():
     every 10 seconds.
     """
     try:
-        _KafkaProducer(test=TEST)
+        _KafkaProducer(test=TEST, buffer_size=0)
     except kafka.errors.KafkaError:
         logger.debug("kafka_connection_failure", exc_info=True)
         return False
@@ -0,0 +1,369 @@
+import atexit
+import fcntl
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+import zlib
+from typing import (
+    IO,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+import orjson
+from kafka.future import Future
+from statshog.defaults.django import statsd
+from structlog import get_logger
+
+logger = get_logger(__name__)
+
+# Payload length and CRC32 of the payload, followed by the payload itself
+_FRAME_HEADER = struct.Struct(">II")
+# Lengths of the topic, key, value and headers making up the payload, -1 standing in for a missing key or headers
+_RECORD_HEADER = struct.Struct(">HiIi")
+
+_SEGMENT_SUFFIX = ".log"
+_LOCK_FILE = ".lock"
+
+
+class PendingRecord(NamedTuple):
+    topic: str
+    value: bytes
+    key: Optional[bytes] = None
+    headers: Optional[List[Tuple[str, bytes]]] = None
+
+
+def encode_record(record: PendingRecord) -> bytes:
+    topic = record.topic.encode("utf-8")
+    key = record.key if record.key is not None else b""
+    # latin-1 maps every byte to a code point, so any header value survives the round trip through JSON
+    headers = (
+        orjson.dumps([(name, value.decode("latin-1")) for name, value in record.headers])
+        if record.headers is not None
+        else b""
+    )
+    payload = b"".join(
+        (
+            _RECORD_HEADER.pack(
+                len(topic),
+                len(key) if record.key is not None else -1,
+                len(record.value),
+                len(headers) if record.headers is not None else -1,
+            ),
+            topic,
+            key,
+            record.value,
+            headers,
+        )
+    )
+    return _FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_records(data: bytes) -> Iterator[PendingRecord]:
+    "Yields records until the end of `data`, or until a frame that was only partially written before a crash."
+    offset = 0
+    while offset + _FRAME_HEADER.size <= len(data):
+        length, crc = _FRAME_HEADER.unpack_from(data, offset)
+        payload = data[offset + _FRAME_HEADER.size : offset + _FRAME_HEADER.size + length]
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            logger.warning("kafka_spillover_truncated_segment", offset=offset)
+            return
+        offset += _FRAME_HEADER.size + length
+
+        topic_length, key_length, value_length, headers_length = _RECORD_HEADER.unpack_from(payload)
+        position = _RECORD_HEADER.size
+        topic = payload[position : position + topic_length].decode("utf-8")
+        position += topic_length
+        key = None
+        if key_length >= 0:
+            key = payload[position : position + key_length]
+            position += key_length
+        value = payload[position : position + value_length]
+        position += value_length
+        headers = None
+        if headers_length >= 0:
+            headers = [
+                (name, value.encode("latin-1"))
+                for name, value in orjson.loads(payload[position : position + headers_length])
+            ]
+        yield PendingRecord(topic=topic, value=value, key=key, headers=headers)
+
+
+class SpilloverLog:
+    """
+    Append-only segment files holding records that could not be handed to Kafka yet.
+
+    Every process writes to its own directory under `root`, which it keeps locked with `flock`. Directories whose lock
+    can be taken belong to processes that are gone, and their segments are adopted so that nothing is left behind.
+    """
+
+    def __init__(self, root: str, segment_max_bytes: int):
+        self.root = root
+        self.segment_max_bytes = segment_max_bytes
+        self.directory = os.path.join(root, f"{socket.gethostname()}-{os.getpid()}")
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock_file = open(os.path.join(self.directory, _LOCK_FILE), "w")
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        self._lock = threading.Lock()
+        self._active: Optional[IO[bytes]] = None
+        self._active_path: Optional[str] = None
+        segments = self._segments()
+        self._next_sequence = int(os.path.basename(segments[-1])[: -len(_SEGMENT_SUFFIX)]) + 1 if segments else 0
+
+    def append(self, records: List[PendingRecord]) -> None:
+        if not records:
+            return
+        data = b"".join(encode_record(record) for record in records)
+        with self._lock:
+            if self._active is None:
+                self._active_path = self._new_segment_path()
+                self._active = open(self._active_path, "ab")
+            self._active.write(data)
+            self._active.flush()
+            if self._active.tell() >= self.segment_max_bytes:
+                self._roll()
+
+    def oldest_segment(self) -> Optional[str]:
+        "Returns the oldest segment to replay, closing the one being appended to if it's the only one left."
+        with self._lock:
+            segments = self._segments()
+            if not segments:
+                self._adopt_orphaned_segments()
+                segments = self._segments()
+            if not segments:
+                return None
+            if segments[0] == self._active_path:
+                self._roll()
+            return segments[0]
+
+    def read(self, path: str) -> List[PendingRecord]:
+        with open(path, "rb") as segment:
+            return list(decode_records(segment.read()))
+
+    def remove(self, path: str) -> None:
+        os.remove(path)
+
+    def segment_count(self) -> int:
+        with self._lock:
+            return len(self._segments())
+
+    def close(self) -> None:
+        with self._lock:
+            self._roll()
+
+    def _segments(self) -> List[str]:
+        return sorted(
+            os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(_SEGMENT_SUFFIX)
+        )
+
+    def _new_segment_path(self) -> str:
+        path = os.path.join(self.directory, f"{self._next_sequence:020d}{_SEGMENT_SUFFIX}")
+        self._next_sequence += 1
+        return path
+
+    def _roll(self) -> None:
+        if self._active is not None:
+            self._active.close()
+        self._active = None
+        self._active_path = None
+
+    def _adopt_orphaned_segments(self) -> None:
+        for name in os.listdir(self.root):
+            directory = os.path.join(self.root, name)
+            if directory == self.directory or not os.path.isdir(directory):
+                continue
+            try:
+                with open(os.path.join(directory, _LOCK_FILE), "a") as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    for segment in sorted(os.listdir(directory)):
+                        if segment.endswith(_SEGMENT_SUFFIX):
+                            os.rename(os.path.join(directory, segment), self._new_segment_path())
+                    os.remove(os.path.join(directory, _LOCK_FILE))
+                    os.rmdir(directory)
+            except OSError:
+                # Still locked by a live process, or adopted by another one in the meantime
+                continue
+
+
+class ProduceBuffer:
+    """
+    Hands records to Kafka from a background thread, so that producing never blocks the caller on the broker.
+
+    Records go through a bounded in-memory queue. Whenever it is full, a send fails, or a delivery is not acknowledged,
+    records are appended to a `SpilloverLog` instead, which the same thread replays oldest segment first, backing off
+    exponentially while Kafka keeps failing. Segments are only removed once their records were acknowledged or
+    spilled again, and records that aren't acknowledged by the time the buffer is closed are spilled too, so records
+    can be delivered twice but are not dropped, as long as the spillover log's directory outlives the process.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[PendingRecord], Future],
+        flush: Callable[..., None],
+        spillover_log: SpilloverLog,
+        maxsize: int,
+        max_backoff_seconds: float = 30,
+        poll_interval_seconds: float = 1,
+    ):
+        self._send = send
+        self._flush = flush
+        self.spillover_log = spillover_log
+        self.max_backoff_seconds = max_backoff_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self._queue: "queue.Queue[PendingRecord]" = queue.Queue(maxsize)
+        self._consecutive_failures = 0
+        # Records sent but not acknowledged yet, by the id of their future
+        self._in_flight: Dict[int, Tuple[PendingRecord, Future]] = {}
+        self._in_flight_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="kafka-produce-buffer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, record: PendingRecord) -> None:
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            statsd.incr("kafka_produce_buffer_spilled", tags={"reason": "queue_full"})
+            self.spillover_log.append([record])
+
+    def close(self, timeout: float = 10) -> None:
+        """
+        Stops the drain thread and hands whatever is still queued to Kafka, waiting up to `timeout` for it to be
+        acknowledged. Records that weren't by then are written to disk, to be replayed by the next process.
+        """
+        if self._stopped.is_set():
+            return
+        deadline = time.monotonic() + timeout
+        self._stopped.set()
+        self._thread.join(timeout)
+        # While Kafka is failing, sends would only block on metadata until the deadline
+        if not self._consecutive_failures and not self._thread.is_alive():
+            self._send_queue(deadline)
+            try:
+                self._flush(timeout=max(0.0, deadline - time.monotonic()))
+            except Exception as e:
+                logger.warning("kafka_produce_buffer_flush_failed", error=e)
+        self._spill_queue("shutdown")
+        self._spill_in_flight()
+        self.spillover_log.close()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                if self._consecutive_failures:
+                    self._spill_queue("backoff")
+                    self._stopped.wait(self._backoff_seconds())
+                    if self._stopped.is_set():
+                        return
+                self._replay_spillover()
+                self._drain_queue()
+            except Exception as e:
+                logger.exception("kafka_produce_buffer_error", error=e)
+                self._consecutive_failures += 1
+
+    def _backoff_seconds(self) -> float:
+        return min(self.max_backoff_seconds, 0.1 * 2 ** min(self._consecutive_failures, 16))
+
+    def _drain_queue(self) -> None:
+        try:
+            record: Optional[PendingRecord] = self._queue.get(timeout=self.poll_interval_seconds)
+        except queue.Empty:
+            return
+        # Bounded, so that spilled records get replayed even while the queue never runs empty
+        remaining = self._queue.maxsize
+        while record is not None and not self._consecutive_failures and remaining > 0:
+            if not self._send_or_spill([record]):
+                return
+            remaining -= 1
+            try:
+                record = self._queue.get_nowait()
+            except queue.Empty:
+                record = None
+        if record is not None:
+            if self._consecutive_failures:
+                self.spillover_log.append([record])
+            else:
+                self._send_or_spill([record])
+        statsd.gauge("kafka_produce_buffer_queue_size", self._queue.qsize())
+
+    def _send_queue(self, deadline: float) -> None:
+        while time.monotonic() < deadline:
+            try:
+                record = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if not self._send_or_spill([record]):
+                return
+
+    def _replay_spillover(self) -> None:
+        segment = self.spillover_log.oldest_segment()
+        if segment is None:
+            return
+
+        records = self.spillover_log.read(segment)
+        if self._send_or_spill(records):
+            # Anything that fails to be delivered is spilled to a new segment by the errback
+            self._flush()
+        self.spillover_log.remove(segment)
+        statsd.incr("kafka_produce_buffer_replayed", len(records))
+        statsd.gauge("kafka_produce_buffer_spillover_segments", self.spillover_log.segment_count())
+
+    def _send_or_spill(self, records: List[PendingRecord]) -> bool:
+        "Sends records in order, spilling the rest of them as soon as one can't be sent. Returns whether all were sent."
+        for index, record in enumerate(records):
+            try:
+                future = self._send(record)
+            except Exception as e:
+                logger.warning("kafka_produce_buffer_send_failed", error=e)
+                statsd.incr("kafka_produce_buffer_spilled", len(records) - index, tags={"reason": "send_failed"})
+                self.spillover_log.append(records[index:])
+                self._consecutive_failures += 1
+                return False
+            with self._in_flight_lock:
+                self._in_flight[id(future)] = (record, future)
+            future.add_both(self._on_settled, id(future))
+            future.add_callback(self._on_delivered).add_errback(self._on_delivery_failed, record)
+        return True
+
+    def _on_settled(self, future_id: int, _) -> None:
+        with self._in_flight_lock:
+            self._in_flight.pop(future_id, None)
+
+    def _on_delivered(self, _) -> None:
+        self._consecutive_failures = 0
+
+    def _on_delivery_failed(self, record: PendingRecord, exc: Exception) -> None:
+        statsd.incr("kafka_produce_buffer_spilled", tags={"reason": "delivery_failed"})
+        self.spillover_log.append([record])
+        self._consecutive_failures += 1
+
+    def _spill_in_flight(self) -> None:
+        "Spills the records that were sent but not acknowledged, which are lost along with the producer otherwise."
+        with self._in_flight_lock:
+            records = [record for record, future in self._in_flight.values() if not future.is_done]
+            self._in_flight.clear()
+        if records:
+            statsd.incr("kafka_produce_buffer_spilled", len(records), tags={"reason": "unacknowledged"})
+            self.spillover_log.append(records)
+
+    def _spill_queue(self, reason: str) -> None:
+        records = []
+        while True:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if records:
+            statsd.incr("kafka_produce_buffer_spilled", len(records), tags={"reason": reason})
+            self.spillover_log.append(records)
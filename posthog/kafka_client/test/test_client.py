@@ -1,9 +1,10 @@
+import json
 from unittest.mock import patch
 
 import kafka
 from django.test import TestCase
 
-from posthog.kafka_client.client import _KafkaProducer, build_kafka_consumer
+from posthog.kafka_client.client import _KafkaProducer, build_kafka_consumer, json_serializer
 
 
 class KafkaClientTestCase(TestCase):
@@ -20,6 +21,10 @@ class KafkaClientTestCase(TestCase):
         msg = next(consumer)
         self.assertEqual(msg, "message 1 from test_topic topic")
 
+    def test_json_serializer_handles_wide_integers(self):
+        self.assertEqual(json_serializer({"foo": "bar", 1: 2}), b'{"foo":"bar","1":2}')
+        self.assertEqual(json.loads(json_serializer({"big": 2 ** 70})), {"big": 2 ** 70})
+
     def test_kafka_produce(self):
         producer = _KafkaProducer(test=False)
         producer.produce(topic=self.topic, data=self.payload)
@@ -0,0 +1,184 @@
+import os
+import tempfile
+import time
+from typing import Callable, List
+
+from django.test import SimpleTestCase
+from kafka.errors import KafkaError, KafkaTimeoutError
+from kafka.future import Future
+
+from posthog.kafka_client.spillover import PendingRecord, ProduceBuffer, SpilloverLog, decode_records, encode_record
+
+
+class FakeBroker:
+    "Stands in for the Kafka producer: sends fail while it's unavailable, and deliveries fail while it's flaky."
+
+    def __init__(self):
+        self.available = True
+        self.flaky = False
+        # Sends are never acknowledged while stalled
+        self.stalled = False
+        self.delivered: List[PendingRecord] = []
+
+    def send(self, record: PendingRecord) -> Future:
+        if not self.available:
+            raise KafkaTimeoutError("Failed to update metadata after 60.0 secs.")
+        future = Future()
+        if self.stalled:
+            return future
+        if self.flaky:
+            future.failure(KafkaError("NotLeaderForPartitionError"))
+        else:
+            self.delivered.append(record)
+            future.success(None)
+        return future
+
+    def flush(self, timeout=None):
+        if self.stalled:
+            raise KafkaTimeoutError("Timeout waiting for future")
+
+
+def wait_for(condition: Callable[[], bool], timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for condition")
+        time.sleep(0.01)
+
+
+class TestSpillover(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.broker = FakeBroker()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _buffer(self, maxsize=100) -> ProduceBuffer:
+        buffer = ProduceBuffer(
+            send=self.broker.send,
+            flush=self.broker.flush,
+            spillover_log=SpilloverLog(self.directory.name, segment_max_bytes=1024),
+            maxsize=maxsize,
+            max_backoff_seconds=0.05,
+            poll_interval_seconds=0.01,
+        )
+        self.addCleanup(buffer.close)
+        return buffer
+
+    def _records(self, count: int) -> List[PendingRecord]:
+        return [
+            PendingRecord(topic="events", value=f'{{"i": {i}}}'.encode(), key=str(i).encode()) for i in range(count)
+        ]
+
+    def _read_spilled(self, spillover_log: SpilloverLog) -> List[PendingRecord]:
+        spilled = []
+        segment = spillover_log.oldest_segment()
+        while segment is not None:
+            spilled.extend(spillover_log.read(segment))
+            spillover_log.remove(segment)
+            segment = spillover_log.oldest_segment()
+        return spilled
+
+    def test_records_round_trip_through_segments(self):
+        records = [
+            PendingRecord(topic="events", value=b'{"a": 1}', key=b"key"),
+            PendingRecord(
+                topic="recordings", value=b"\x00\xff", key=None, headers=[("teamId", b"2"), ("raw", b"\xff")]
+            ),
+            PendingRecord(topic="events", value=b"", key=b"", headers=[]),
+        ]
+        encoded = b"".join(encode_record(record) for record in records)
+
+        self.assertEqual(list(decode_records(encoded)), records)
+        # A frame cut short by a crash is ignored, along with anything after it
+        self.assertEqual(list(decode_records(encoded[:-3])), records[:2])
+
+    def test_produces_through_queue(self):
+        buffer = self._buffer()
+        records = self._records(10)
+
+        for record in records:
+            buffer.put(record)
+
+        wait_for(lambda: len(self.broker.delivered) == 10)
+        self.assertEqual(self.broker.delivered, records)
+        self.assertEqual(buffer.spillover_log.segment_count(), 0)
+
+    def test_spills_to_disk_while_broker_is_unavailable_and_replays_once_back(self):
+        self.broker.available = False
+        buffer = self._buffer(maxsize=5)
+        records = self._records(200)
+
+        for record in records:
+            start = time.monotonic()
+            buffer.put(record)
+            self.assertLess(time.monotonic() - start, 0.5)
+
+        wait_for(lambda: buffer.spillover_log.segment_count() > 0)
+        self.assertEqual(self.broker.delivered, [])
+
+        self.broker.available = True
+        wait_for(lambda: len(self.broker.delivered) == 200)
+        self.assertCountEqual(self.broker.delivered, records)
+        wait_for(lambda: buffer.spillover_log.segment_count() == 0)
+
+    def test_failed_deliveries_are_retried(self):
+        self.broker.flaky = True
+        buffer = self._buffer()
+        records = self._records(20)
+
+        for record in records:
+            buffer.put(record)
+
+        wait_for(lambda: buffer.spillover_log.segment_count() > 0)
+        self.broker.flaky = False
+        wait_for(lambda: len(self.broker.delivered) == 20)
+        self.assertCountEqual(self.broker.delivered, records)
+
+    def test_close_writes_queued_records_to_disk(self):
+        self.broker.available = False
+        buffer = self._buffer()
+        records = self._records(20)
+        for record in records:
+            buffer.put(record)
+
+        buffer.close()
+
+        self.assertCountEqual(self._read_spilled(buffer.spillover_log), records)
+
+    def test_close_sends_queued_records_to_kafka(self):
+        buffer = self._buffer()
+        records = self._records(20)
+        for record in records:
+            buffer.put(record)
+
+        buffer.close()
+
+        self.assertCountEqual(self.broker.delivered, records)
+        self.assertEqual(buffer.spillover_log.segment_count(), 0)
+
+    def test_close_writes_unacknowledged_records_to_disk(self):
+        self.broker.stalled = True
+        buffer = self._buffer()
+        records = self._records(20)
+        for record in records:
+            buffer.put(record)
+
+        buffer.close(timeout=0.2)
+
+        self.assertEqual(self.broker.delivered, [])
+        self.assertCountEqual(self._read_spilled(buffer.spillover_log), records)
+
+    def test_adopts_segments_left_behind_by_other_processes(self):
+        records = self._records(3)
+        orphaned_directory = os.path.join(self.directory.name, "some-host-12345")
+        os.makedirs(orphaned_directory)
+        with open(os.path.join(orphaned_directory, "00000000000000000000.log"), "wb") as segment:
+            segment.write(b"".join(encode_record(record) for record in records))
+
+        self._buffer()
+
+        wait_for(lambda: len(self.broker.delivered) == 3)
+        self.assertEqual(self.broker.delivered, records)
+        self.assertFalse(os.path.exists(orphaned_directory))
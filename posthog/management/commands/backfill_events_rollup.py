@@ -0,0 +1,127 @@
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import structlog
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posthog.clickhouse.query_tagging import tag_queries
+from posthog.client import sync_execute
+from posthog.models.event.sql import EVENTS_DATA_TABLE
+from posthog.settings import CLICKHOUSE_CLUSTER, CLICKHOUSE_DATABASE
+
+"""
+Backfills `events_rollup` with the events produced to Kafka before the cutoff the `events_rollup_mv` materialized view
+was created with, which rolls up every event produced since. Both sides split on `_timestamp`, so each event is rolled up
+exactly once, whenever it was consumed.
+
+Events produced before the cutoff keep being inserted until consumers have caught up past it, so the backfill can only
+be run once they have, e.g. once the `ingestion_lag` task reports a lag shorter than the time since the cutoff.
+
+The backfill is not idempotent: rows of the rollup are summed up, so running it twice over the same events counts them
+twice.
+
+Partitions of the events table are backfilled one after another, so that a backfill that failed can be resumed with
+`--from-partition`. Rows of the partition it failed at may have been inserted already though.
+"""
+
+logger = structlog.get_logger(__name__)
+
+GET_MV_CREATE_QUERY_SQL = """
+SELECT create_table_query FROM system.tables WHERE database = %(database)s AND name = 'events_rollup_mv'
+"""
+
+GET_PARTITIONS_SQL = f"""
+SELECT DISTINCT partition
+FROM clusterAllReplicas('{CLICKHOUSE_CLUSTER}', system, parts)
+WHERE database = %(database)s AND table = %(table)s AND active
+ORDER BY partition
+"""
+
+BACKFILL_SQL = """
+INSERT INTO events_rollup (team_id, event, hour, event_count, distinct_ids)
+SELECT team_id, event, toStartOfHour(timestamp) AS hour, count() AS event_count, uniqState(distinct_id) AS distinct_ids
+FROM events
+WHERE toYYYYMM(timestamp) = %(partition)s AND _timestamp < %(cutoff)s {team_filter}
+GROUP BY team_id, event, hour
+"""
+
+
+def print_and_execute_query(sql: str, name: str, dry_run: bool, timeout=180, query_args={}) -> Any:
+    if not settings.TEST:
+        print(f"> {name}", end="\n\n")
+        print(sql, query_args, end="\n")
+        print("---------------------------------", end="\n\n")
+
+    if not dry_run:
+        return sync_execute(sql, query_args, settings={"max_execution_time": timeout})
+
+    return None
+
+
+def get_rollup_cutoff() -> Optional[datetime]:
+    "When the events rolled up by `events_rollup_mv` start, as it was created with by migration 0032."
+    rows = sync_execute(GET_MV_CREATE_QUERY_SQL, {"database": CLICKHOUSE_DATABASE})
+    match = re.search(r"_timestamp >= '([^']+)'", rows[0][0]) if rows else None
+    return datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S") if match else None
+
+
+def get_partitions() -> List[int]:
+    rows = sync_execute(GET_PARTITIONS_SQL, {"database": CLICKHOUSE_DATABASE, "table": EVENTS_DATA_TABLE()})
+    return [int(partition) for partition, in rows]
+
+
+def run_backfill(options: Dict[str, Any]) -> None:
+    dry_run = not options["live_run"]
+
+    cutoff = get_rollup_cutoff()
+    if cutoff is None:
+        logger.error("events_rollup_mv doesn't exist yet, run ClickHouse migrations first")
+        exit(1)
+    if cutoff > datetime.utcnow():
+        logger.error("Events up to the cutoff of events_rollup_mv are still being produced", cutoff=cutoff)
+        exit(1)
+
+    if dry_run:
+        print("Dry run. Queries to run:", end="\n\n")
+
+    query_args: Dict[str, Any] = {"cutoff": cutoff.strftime("%Y-%m-%d %H:%M:%S")}
+    team_filter = ""
+    if options["team_id"]:
+        query_args["team_id"] = options["team_id"]
+        team_filter = "AND team_id = %(team_id)s"
+
+    partitions = [
+        partition
+        for partition in get_partitions()
+        if not options["from_partition"] or partition >= int(options["from_partition"])
+    ]
+    for partition in partitions:
+        with tag_queries(kind="backfill", id=f"events_rollup_{partition}"):
+            print_and_execute_query(
+                BACKFILL_SQL.format(team_filter=team_filter),
+                f"BACKFILL_SQL ({partition})",
+                dry_run,
+                0,
+                {**query_args, "partition": partition},
+            )
+
+
+class Command(BaseCommand):
+    help = "Backfill the hourly rollup of events with events produced before its cutoff"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--team-id", default=None, type=str, help="Specify a team to backfill data for.")
+        parser.add_argument(
+            "--from-partition",
+            default=None,
+            type=str,
+            help="Skip partitions of the events table before this one, e.g. 202204, to resume a backfill.",
+        )
+        parser.add_argument(
+            "--live-run", action="store_true", help="Opts out of default 'dry run' mode and actually runs the queries."
+        )
+
+    def handle(self, *args, **options):
+        run_backfill(options)
@@ -11,6 +11,9 @@ from django.utils.cache import add_never_cache_headers
 from loginas.utils import is_impersonated_session
 
 from posthog.api.decide import get_decide
+from posthog.clickhouse.cancellation import track_queries
+from posthog.clickhouse.query_executor import query_deadline
+from posthog.clickhouse.query_tagging import profile_queries, tag_queries
 from posthog.internal_metrics import incr
 from posthog.models import Action, Cohort, Dashboard, FeatureFlag, Insight, Team, User
 
@@ -156,27 +159,31 @@ class CHQueries(object):
         self.get_response = get_response
 
     def __call__(self, request: HttpRequest):
-        """ Install monkey-patch on demand.
-        If monkey-patch has not been run in for this process (assuming multiple preforked processes),
-        then do it now.
         """
-        from posthog import client
+        Tags ClickHouse queries run for this request with its route, and reports how long they took in a
+        `Server-Timing` header. For staff the profile is kept around, see `InstanceStatusViewSet.query_profile`.
 
+        Queries still running once the request timed out or the client disconnected are killed.
+        """
         route = resolve(request.path)
         route_id = f"{route.route} ({route.func.__name__})"
-        client._request_information = {
-            "save": (request.user.pk and (request.user.is_staff or is_impersonated_session(request) or settings.DEBUG)),
-            "user_id": request.user.pk,
-            "kind": "request",
-            "id": route_id,
-        }
+        save = request.user.pk and (request.user.is_staff or is_impersonated_session(request) or settings.DEBUG)
 
-        response: HttpResponse = self.get_response(request)
+        with tag_queries(save=save, user_id=request.user.pk, kind="request", id=route_id):
+            with profile_queries() as profile, query_deadline(settings.CLICKHOUSE_REQUEST_TIMEOUT_SECONDS or None):
+                with track_queries(connection=request.META.get("gunicorn.socket")):
+                    response: HttpResponse = self.get_response(request)
 
         if "api/" in route_id and "capture" not in route_id:
             incr("http_api_request_response", tags={"id": route_id, "status_code": response.status_code})
 
-        client._request_information = None
+        if profile.queries:
+            server_timing = [profile.server_timing()]
+            if save:
+                from posthog.clickhouse.system_status import save_query_profile
+
+                server_timing.append(f'clickhouse-profile;desc="{save_query_profile(profile)}"')
+            response["Server-Timing"] = ", ".join(server_timing)
 
         return response
 
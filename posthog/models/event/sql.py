@@ -7,7 +7,7 @@ from posthog.clickhouse.kafka_engine import (
     kafka_engine,
     trim_quotes_expr,
 )
-from posthog.clickhouse.table_engines import Distributed, ReplacingMergeTree, ReplicationScheme
+from posthog.clickhouse.table_engines import AggregatingMergeTree, Distributed, ReplacingMergeTree, ReplicationScheme
 from posthog.kafka_client.topics import KAFKA_EVENTS_JSON
 
 EVENTS_DATA_TABLE = lambda: "sharded_events" if settings.CLICKHOUSE_REPLICATION else "events"
@@ -158,6 +158,76 @@ DISTRIBUTED_EVENTS_TABLE_SQL = lambda: EVENTS_TABLE_BASE_SQL.format(
     materialized_columns=EVENTS_TABLE_PROXY_MATERIALIZED_COLUMNS,
 )
 
+# Hourly rollups of events, for queries that only count them, or their unique distinct ids, by event.
+# Rows are aggregated as events are inserted into the events table, including from backfills of the events table, but
+# don't reflect events that are deleted or deduplicated afterwards.
+
+EVENTS_ROLLUP_DATA_TABLE = lambda: "sharded_events_rollup" if settings.CLICKHOUSE_REPLICATION else "events_rollup"
+
+TRUNCATE_EVENTS_ROLLUP_TABLE_SQL = (
+    lambda: f"TRUNCATE TABLE IF EXISTS {EVENTS_ROLLUP_DATA_TABLE()} ON CLUSTER '{settings.CLICKHOUSE_CLUSTER}'"
+)
+
+EVENTS_ROLLUP_TABLE_BASE_SQL = """
+CREATE TABLE IF NOT EXISTS {table_name} ON CLUSTER '{cluster}'
+(
+    team_id Int64,
+    event VARCHAR,
+    hour DateTime('UTC'),
+    event_count SimpleAggregateFunction(sum, UInt64),
+    distinct_ids AggregateFunction(uniq, VARCHAR)
+) ENGINE = {engine}
+"""
+
+EVENTS_ROLLUP_DATA_TABLE_ENGINE = lambda: AggregatingMergeTree(
+    "events_rollup", replication_scheme=ReplicationScheme.SHARDED
+)
+EVENTS_ROLLUP_TABLE_SQL = lambda: (
+    EVENTS_ROLLUP_TABLE_BASE_SQL
+    + """PARTITION BY toYYYYMM(hour)
+ORDER BY (team_id, event, hour)
+{storage_policy}
+"""
+).format(
+    table_name=EVENTS_ROLLUP_DATA_TABLE(),
+    cluster=settings.CLICKHOUSE_CLUSTER,
+    engine=EVENTS_ROLLUP_DATA_TABLE_ENGINE(),
+    storage_policy=STORAGE_POLICY(),
+)
+
+# This table is responsible for reading from events_rollup on a cluster setting. Rows of any shard merge with those of
+# any other, so that backfills can write to it as well.
+DISTRIBUTED_EVENTS_ROLLUP_TABLE_SQL = lambda: EVENTS_ROLLUP_TABLE_BASE_SQL.format(
+    table_name="events_rollup",
+    cluster=settings.CLICKHOUSE_CLUSTER,
+    engine=Distributed(data_table=EVENTS_ROLLUP_DATA_TABLE(), sharding_key="rand()"),
+)
+
+# Only rolls up events produced to Kafka since `since`, those produced before are backfilled by
+# `./manage.py backfill_events_rollup`. Splitting on `_timestamp` rather than on when the view was created keeps events
+# that were produced before but only consumed after out of the view, however far behind consumers are.
+EVENTS_ROLLUP_MV_SQL = lambda since="1970-01-01 00:00:00": """
+CREATE MATERIALIZED VIEW events_rollup_mv ON CLUSTER '{cluster}'
+TO {database}.{target_table}
+AS SELECT
+team_id,
+event,
+toStartOfHour(timestamp) AS hour,
+count() AS event_count,
+uniqState(distinct_id) AS distinct_ids
+FROM {database}.{source_table}
+WHERE _timestamp >= '{since}'
+GROUP BY team_id, event, hour
+""".format(
+    target_table=EVENTS_ROLLUP_DATA_TABLE(),
+    source_table=EVENTS_DATA_TABLE(),
+    cluster=settings.CLICKHOUSE_CLUSTER,
+    database=settings.CLICKHOUSE_DATABASE,
+    since=since,
+)
+
+DROP_EVENTS_ROLLUP_MV_SQL = lambda: f"DROP TABLE IF EXISTS events_rollup_mv ON CLUSTER '{settings.CLICKHOUSE_CLUSTER}'"
+
 INSERT_EVENT_SQL = (
     lambda: f"""
 INSERT INTO {EVENTS_DATA_TABLE()} (uuid, event, properties, timestamp, team_id, distinct_id, elements_chain, created_at, _timestamp, _offset)
@@ -1,16 +1,19 @@
 import hashlib
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from uuid import uuid4
 
+from django.conf import settings
 from django.core.cache import cache
-from django.db import models
+from django.db import models, transaction
 from django.db.models.expressions import ExpressionWrapper, RawSQL
 from django.db.models.fields import BooleanField
 from django.db.models.query import QuerySet
-from django.db.models.signals import pre_delete
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.utils import timezone
 from sentry_sdk.api import capture_exception
 
+from posthog.cache_utils import TTLCache
 from posthog.models.cohort import Cohort
 from posthog.models.experiment import Experiment
 from posthog.models.filters.mixins.utils import cached_property
@@ -32,6 +35,14 @@ class FeatureFlagMatch:
     variant: Optional[str] = None
 
 
+@dataclass(frozen=True)
+class FeatureFlagCondition:
+    "A condition group of a flag, with its properties already parsed."
+
+    properties: List[Property]
+    rollout_percentage: Optional[float]
+
+
 class FeatureFlag(models.Model):
     class Meta:
         constraints = [models.UniqueConstraint(fields=["team", "key"], name="unique key for team")]
@@ -99,6 +110,31 @@ class FeatureFlag(models.Model):
                 ],
             }
 
+    @cached_property
+    def parsed_conditions(self) -> List[FeatureFlagCondition]:
+        "The conditions of the flag, with their properties parsed."
+        return [
+            FeatureFlagCondition(
+                properties=Filter(data=condition).property_groups.flat if condition.get("properties") else [],
+                rollout_percentage=condition.get("rollout_percentage"),
+            )
+            for condition in self.conditions
+        ]
+
+    # Define contiguous sub-domains within [0, 1].
+    # By looking up a random hash value, you can find the associated variant key.
+    # e.g. the first of two variants with 50% rollout percentage will have value_max: 0.5
+    # and the second will have value_min: 0.5 and value_max: 1.0
+    @cached_property
+    def variant_lookup_table(self) -> List[Dict[str, Any]]:
+        lookup_table = []
+        value_min = 0
+        for variant in self.variants:
+            value_max = value_min + variant["rollout_percentage"] / 100
+            lookup_table.append({"value_min": value_min, "value_max": value_max, "key": variant["key"]})
+            value_min = value_max
+        return lookup_table
+
     @property
     def cohort_ids(self) -> List[int]:
         cohort_ids = []
@@ -127,6 +163,88 @@ class FeatureFlag(models.Model):
 @mutable_receiver(pre_delete, sender=Experiment)
 def delete_experiment_flags(sender, instance, **kwargs):
     FeatureFlag.objects.filter(experiment=instance).update(deleted=True)
+    invalidate_feature_flags_for_team(instance.team_id)
+
+
+@mutable_receiver([post_save, post_delete], sender=FeatureFlag)
+def feature_flag_changed(sender, instance, **kwargs):
+    invalidate_feature_flags_for_team(instance.team_id)
+
+
+# Snapshots are checked against the flags version when read, but they also include the team's cohorts and group types
+@mutable_receiver([post_save, post_delete], sender=Cohort)
+def cohort_changed(sender, instance, **kwargs):
+    invalidate_local_evaluation_snapshot(instance.team_id)
+
+
+@mutable_receiver([post_save, post_delete], sender=GroupTypeMapping)
+def group_type_mapping_changed(sender, instance, **kwargs):
+    invalidate_local_evaluation_snapshot(instance.team_id)
+
+
+def local_evaluation_snapshot_key(team_id: int) -> str:
+    "Key of the team's snapshot for local evaluation in the shared cache, see `get_local_evaluation_snapshot`."
+    return f"local_evaluation_snapshot_{team_id}"
+
+
+def invalidate_local_evaluation_snapshot(team_id: int) -> None:
+    cache.delete(local_evaluation_snapshot_key(team_id))
+    # A snapshot rebuilt from the old rows before the change is committed would otherwise be kept
+    transaction.on_commit(lambda: cache.delete(local_evaluation_snapshot_key(team_id)))
+
+
+# Active flags per team, along with the version they were loaded at, see `get_feature_flags_for_team`
+team_feature_flags_cache: TTLCache[Tuple[str, List[FeatureFlag]]] = TTLCache(
+    maxsize=settings.FEATURE_FLAGS_CACHE_MAX_SIZE, ttl=settings.FEATURE_FLAGS_CACHE_TTL_SECONDS
+)
+
+
+def _feature_flags_version_key(team_id: int) -> str:
+    return f"feature_flags_version_{team_id}"
+
+
+def invalidate_feature_flags_for_team(team_id: int) -> None:
+    _bump_feature_flags_version(team_id)
+    # Until the change is committed, other processes still read the old flags and would cache them under the new
+    # version, so it's bumped once more after
+    transaction.on_commit(lambda: _bump_feature_flags_version(team_id))
+
+
+def _bump_feature_flags_version(team_id: int) -> None:
+    cache.set(_feature_flags_version_key(team_id), uuid4().hex, None)
+
+
+def get_feature_flags_version(team_id: int) -> str:
+    "Opaque token that changes whenever any of the team's flags is saved or deleted."
+    version_key = _feature_flags_version_key(team_id)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, uuid4().hex, None)
+        version = cache.get(version_key)
+    return version
+
+
+def get_feature_flags_for_team(team_id: int) -> List[FeatureFlag]:
+    """
+    Returns the team's active flags, cached per process with their conditions and variants already parsed.
+
+    Every flag save bumps a per-team version in the shared cache, so checking for changes costs
+    a single Redis read instead of a Postgres query and re-parsing every flag.
+    """
+    version = get_feature_flags_version(team_id)
+
+    hit, cached = team_feature_flags_cache.get(team_id)
+    if hit and cached is not None and cached[0] == version:
+        return cached[1]
+
+    feature_flags = list(
+        FeatureFlag.objects.filter(team_id=team_id, active=True, deleted=False).only(
+            "id", "team_id", "filters", "key", "rollout_percentage", "ensure_experience_continuity"
+        )
+    )
+
+    team_feature_flags_cache.set(team_id, (version, feature_flags))
+    return feature_flags
 
 
 class FeatureFlagHashKeyOverride(models.Model):
@@ -171,6 +289,7 @@ class FeatureFlagMatcher:
         cache: Optional[FlagsMatcherCache] = None,
         hash_key_overrides: Dict[str, str] = {},
         property_value_overrides: Dict[str, str] = {},
+        precomputed_query_conditions: Optional[Dict[str, bool]] = None,
     ):
         self.feature_flags = feature_flags
         self.distinct_id = distinct_id
@@ -178,6 +297,8 @@ class FeatureFlagMatcher:
         self.cache = cache or FlagsMatcherCache(self.feature_flags[0].team_id)
         self.hash_key_overrides = hash_key_overrides
         self.property_value_overrides = property_value_overrides
+        # Condition matches fetched in bulk for many distinct_ids, see `get_feature_flags_for_distinct_ids`
+        self.precomputed_query_conditions = precomputed_query_conditions
 
     def get_match(self, feature_flag: FeatureFlag) -> Optional[FeatureFlagMatch]:
         # If aggregating flag by groups and relevant group type is not passed - flag is off!
@@ -186,7 +307,7 @@ class FeatureFlagMatcher:
 
         is_match = any(
             self.is_condition_match(feature_flag, condition, index)
-            for index, condition in enumerate(feature_flag.conditions)
+            for index, condition in enumerate(feature_flag.parsed_conditions)
         )
         if is_match:
             return FeatureFlagMatch(variant=self.get_matching_variant(feature_flag))
@@ -205,18 +326,16 @@ class FeatureFlagMatcher:
         return flags_enabled
 
     def get_matching_variant(self, feature_flag: FeatureFlag) -> Optional[str]:
+        variant_hash = self.get_hash(feature_flag, salt="variant")
         for variant in self.variant_lookup_table(feature_flag):
-            if (
-                self.get_hash(feature_flag, salt="variant") >= variant["value_min"]
-                and self.get_hash(feature_flag, salt="variant") < variant["value_max"]
-            ):
+            if variant_hash >= variant["value_min"] and variant_hash < variant["value_max"]:
                 return variant["key"]
         return None
 
-    def is_condition_match(self, feature_flag: FeatureFlag, condition: Dict, condition_index: int):
-        rollout_percentage = condition.get("rollout_percentage")
-        if len(condition.get("properties", [])) > 0:
-            properties = Filter(data=condition).property_groups.flat
+    def is_condition_match(self, feature_flag: FeatureFlag, condition: FeatureFlagCondition, condition_index: int):
+        rollout_percentage = condition.rollout_percentage
+        if len(condition.properties) > 0:
+            properties = condition.properties
             if self.can_compute_locally(properties):
                 # :TRICKY: If overrides are enough to determine if a condition is a match,
                 # we can skip checking the query.
@@ -238,20 +357,15 @@ class FeatureFlagMatcher:
         return True
 
     def _condition_matches(self, feature_flag: FeatureFlag, condition_index: int) -> bool:
-        return self.query_conditions.get(f"flag_{feature_flag.pk}_condition_{condition_index}", False)
+        query_conditions = (
+            self.precomputed_query_conditions
+            if self.precomputed_query_conditions is not None
+            else self.query_conditions
+        )
+        return query_conditions.get(f"flag_{feature_flag.pk}_condition_{condition_index}", False)
 
-    # Define contiguous sub-domains within [0, 1].
-    # By looking up a random hash value, you can find the associated variant key.
-    # e.g. the first of two variants with 50% rollout percentage will have value_max: 0.5
-    # and the second will have value_min: 0.5 and value_max: 1.0
     def variant_lookup_table(self, feature_flag: FeatureFlag):
-        lookup_table = []
-        value_min = 0
-        for variant in feature_flag.variants:
-            value_max = value_min + variant["rollout_percentage"] / 100
-            lookup_table.append({"value_min": value_min, "value_max": value_max, "key": variant["key"]})
-            value_min = value_max
-        return lookup_table
+        return feature_flag.variant_lookup_table
 
     @cached_property
     def query_conditions(self) -> Dict[str, bool]:
@@ -259,6 +373,19 @@ class FeatureFlagMatcher:
         person_query: QuerySet = Person.objects.filter(
             team_id=team_id, persondistinctid__distinct_id=self.distinct_id, persondistinctid__team_id=team_id,
         )
+        person_rows, group_conditions = self.get_query_conditions(person_query)
+        return {**(person_rows[0] if person_rows else {}), **group_conditions}
+
+    def get_query_conditions(
+        self, person_query: QuerySet, extra_person_fields: List[str] = []
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, bool]]:
+        """
+        Evaluates every flag condition that needs Postgres, for all persons matched by `person_query` at once.
+
+        Returns a row of condition matches (plus `extra_person_fields`) per person, and the matches of
+        group-aggregated conditions for the groups passed in, which are the same for every person.
+        """
+        team_id = self.feature_flags[0].team_id
         basic_group_query: QuerySet = Group.objects.filter(team_id=team_id,)
         group_query_per_group_type_mapping: Dict[GroupTypeIndex, Tuple[QuerySet, List[str]]] = {}
         # :TRICKY: Create a queryset for each group type that uniquely identifies a group, based on the groups passed in.
@@ -276,13 +403,13 @@ class FeatureFlagMatcher:
         person_fields = []
 
         for feature_flag in self.feature_flags:
-            for index, condition in enumerate(feature_flag.conditions):
+            for index, condition in enumerate(feature_flag.parsed_conditions):
                 key = f"flag_{feature_flag.pk}_condition_{index}"
                 expr: Any = None
-                if len(condition.get("properties", {})) > 0:
+                if len(condition.properties) > 0:
                     # Feature Flags don't support OR filtering yet
                     expr = properties_to_Q(
-                        Filter(data=condition).property_groups.flat,
+                        condition.properties,
                         team_id=team_id,
                         is_direct_query=True,
                         override_property_values=self.property_value_overrides,
@@ -309,19 +436,18 @@ class FeatureFlagMatcher:
                         group_fields,
                     )
 
-        all_conditions = {}
+        person_rows: List[Dict[str, Any]] = []
         if len(person_fields) > 0:
-            person_query = person_query.values(*person_fields)
-            if len(person_query) > 0:
-                all_conditions = {**person_query[0]}
+            person_rows = list(person_query.values(*extra_person_fields, *person_fields))
 
+        group_conditions: Dict[str, bool] = {}
         for group_query, group_fields in group_query_per_group_type_mapping.values():
             group_query = group_query.values(*group_fields)
             if len(group_query) > 0:
                 assert len(group_query) == 1, f"Expected 1 group query result, got {len(group_query)}"
-                all_conditions = {**all_conditions, **group_query[0]}
+                group_conditions = {**group_conditions, **group_query[0]}
 
-        return all_conditions
+        return person_rows, group_conditions
 
     def hashed_identifier(self, feature_flag: FeatureFlag) -> Optional[str]:
         """
@@ -404,9 +530,7 @@ def get_active_feature_flags(
     property_value_overrides: Dict[str, str] = {},
 ) -> Dict[str, Union[bool, str]]:
 
-    all_feature_flags = FeatureFlag.objects.filter(team_id=team_id, active=True, deleted=False).only(
-        "id", "team_id", "filters", "key", "rollout_percentage", "ensure_experience_continuity"
-    )
+    all_feature_flags = get_feature_flags_for_team(team_id)
 
     flags_have_experience_continuity_enabled = any(
         feature_flag.ensure_experience_continuity for feature_flag in all_feature_flags
@@ -414,11 +538,7 @@ def get_active_feature_flags(
 
     if not flags_have_experience_continuity_enabled:
         return _get_active_feature_flags(
-            list(all_feature_flags),
-            team_id,
-            distinct_id,
-            groups=groups,
-            property_value_overrides=property_value_overrides,
+            all_feature_flags, team_id, distinct_id, groups=groups, property_value_overrides=property_value_overrides,
         )
 
     person_id = (
@@ -454,7 +574,7 @@ def get_active_feature_flags(
     # We can optimise by not going down this path when person_id doesn't exist, or
     # no flags have experience continuity enabled
     return _get_active_feature_flags(
-        list(all_feature_flags),
+        all_feature_flags,
         team_id,
         distinct_id,
         person_id,
@@ -463,8 +583,67 @@ def get_active_feature_flags(
     )
 
 
+def get_feature_flags_for_distinct_ids(
+    team_id: int,
+    distinct_ids: List[str],
+    groups: Dict[GroupTypeName, str] = {},
+    property_value_overrides: Dict[str, str] = {},
+) -> Dict[str, Dict[str, Union[bool, str]]]:
+    """
+    Evaluates the team's active flags for many distinct_ids at once, e.g. for server-side batch jobs.
+
+    Instead of one flag query per distinct_id as with `get_active_feature_flags`, persons are resolved and their
+    flag conditions evaluated with a fixed number of set-based queries, independent of the number of distinct_ids.
+    Unlike /decide, this never writes hash key overrides for experience continuity, it only reads existing ones.
+    """
+    feature_flags = get_feature_flags_for_team(team_id)
+    if not feature_flags:
+        return {distinct_id: {} for distinct_id in distinct_ids}
+
+    person_ids_by_distinct_id: Dict[str, int] = dict(
+        PersonDistinctId.objects.filter(team_id=team_id, distinct_id__in=distinct_ids).values_list(
+            "distinct_id", "person_id"
+        )
+    )
+    person_ids = set(person_ids_by_distinct_id.values())
+
+    cache = FlagsMatcherCache(team_id)
+    bulk_matcher = FeatureFlagMatcher(
+        feature_flags, "", groups, cache, property_value_overrides=property_value_overrides
+    )
+    person_rows, group_conditions = bulk_matcher.get_query_conditions(
+        Person.objects.filter(team_id=team_id, id__in=person_ids), extra_person_fields=["id"]
+    )
+    conditions_by_person_id = {row.pop("id"): row for row in person_rows}
+
+    overrides_by_person_id: Dict[int, Dict[str, str]] = {}
+    if person_ids and any(feature_flag.ensure_experience_continuity for feature_flag in feature_flags):
+        for person_id, feature_flag_key, hash_key in FeatureFlagHashKeyOverride.objects.filter(
+            team_id=team_id, person_id__in=person_ids
+        ).values_list("person_id", "feature_flag_key", "hash_key"):
+            overrides_by_person_id.setdefault(person_id, {})[feature_flag_key] = hash_key
+
+    flags_by_distinct_id: Dict[str, Dict[str, Union[bool, str]]] = {}
+    for distinct_id in distinct_ids:
+        person_id = person_ids_by_distinct_id.get(distinct_id)
+        flags_by_distinct_id[distinct_id] = FeatureFlagMatcher(
+            feature_flags,
+            distinct_id,
+            groups,
+            cache,
+            overrides_by_person_id.get(person_id, {}) if person_id is not None else {},
+            property_value_overrides,
+            precomputed_query_conditions={
+                **(conditions_by_person_id.get(person_id, {}) if person_id is not None else {}),
+                **group_conditions,
+            },
+        ).get_matches()
+
+    return flags_by_distinct_id
+
+
 def set_feature_flag_hash_key_overrides(
-    feature_flags: QuerySet, team_id: int, person_id: int, hash_key_override: str
+    feature_flags: Iterable[FeatureFlag], team_id: int, person_id: int, hash_key_override: str
 ) -> None:
 
     existing_flag_overrides = set(
@@ -25,6 +25,7 @@ from posthog.models.filters.mixins.common import (
     InsightMixin,
     LimitMixin,
     OffsetMixin,
+    SamplingMixin,
     SearchMixin,
     SelectorMixin,
     ShownAsMixin,
@@ -53,6 +54,7 @@ class Filter(
     PropertyMixin,
     IntervalMixin,
     SmoothingIntervalsMixin,
+    SamplingMixin,
     EntitiesMixin,
     EntityIdMixin,
     EntityTypeMixin,
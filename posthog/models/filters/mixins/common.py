@@ -35,6 +35,7 @@ from posthog.constants import (
     INSIGHT_TRENDS,
     LIMIT,
     OFFSET,
+    SAMPLING_FACTOR,
     SELECTOR,
     SHOWN_AS,
     SMOOTHING_INTERVALS,
@@ -72,6 +73,26 @@ class SmoothingIntervalsMixin(BaseParamMixin):
         return {SMOOTHING_INTERVALS: self.smoothing_intervals}
 
 
+class SamplingMixin(BaseParamMixin):
+    @cached_property
+    def sampling_factor(self) -> Optional[float]:
+        sampling_factor = self._data.get(SAMPLING_FACTOR)
+        if sampling_factor is None or sampling_factor == "":
+            return None
+        try:
+            sampling_factor = float(sampling_factor)
+        except (TypeError, ValueError):
+            raise ValidationError(f"{SAMPLING_FACTOR} must be a number")
+        if not 0 < sampling_factor <= 1:
+            raise ValidationError(f"{SAMPLING_FACTOR} must be greater than 0 and at most 1")
+        # Sampling every user is not sampling
+        return sampling_factor if sampling_factor < 1 else None
+
+    @include_dict
+    def sampling_factor_to_dict(self):
+        return {SAMPLING_FACTOR: self.sampling_factor} if self.sampling_factor else {}
+
+
 class SelectorMixin(BaseParamMixin):
     @cached_property
     def selector(self) -> Optional[str]:
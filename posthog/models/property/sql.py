@@ -0,0 +1,84 @@
+from django.conf import settings
+
+from posthog.clickhouse.kafka_engine import STORAGE_POLICY, trim_quotes_expr, ttl_period
+from posthog.clickhouse.table_engines import AggregatingMergeTree, Distributed, ReplicationScheme
+
+# Index of the values of event and person properties, for autocompleting property filters without scanning events or
+# persons. It's updated hourly with the values of the properties of the events that happened and the persons that were
+# updated in the hour before, up to PROPERTY_VALUES_PER_KEY of them for each property, and forgets the values that
+# weren't seen in PROPERTY_VALUES_TTL_WEEKS.
+
+PROPERTY_VALUES_DATA_TABLE = lambda: "sharded_property_values" if settings.CLICKHOUSE_REPLICATION else "property_values"
+PROPERTY_VALUES_TTL_WEEKS = 4
+PROPERTY_VALUES_PER_KEY = 100
+
+TRUNCATE_PROPERTY_VALUES_TABLE_SQL = (
+    lambda: f"TRUNCATE TABLE IF EXISTS {PROPERTY_VALUES_DATA_TABLE()} ON CLUSTER '{settings.CLICKHOUSE_CLUSTER}'"
+)
+
+PROPERTY_VALUES_TABLE_BASE_SQL = """
+CREATE TABLE IF NOT EXISTS {table_name} ON CLUSTER '{cluster}'
+(
+    team_id Int64,
+    property_type VARCHAR,
+    key VARCHAR,
+    value VARCHAR,
+    count SimpleAggregateFunction(sum, UInt64),
+    last_seen SimpleAggregateFunction(max, DateTime('UTC'))
+) ENGINE = {engine}
+"""
+
+PROPERTY_VALUES_DATA_TABLE_ENGINE = lambda: AggregatingMergeTree(
+    "property_values", replication_scheme=ReplicationScheme.SHARDED
+)
+PROPERTY_VALUES_TABLE_SQL = lambda: (
+    PROPERTY_VALUES_TABLE_BASE_SQL
+    + """ORDER BY (team_id, property_type, key, value)
+{ttl_period}
+{storage_policy}
+"""
+).format(
+    table_name=PROPERTY_VALUES_DATA_TABLE(),
+    cluster=settings.CLICKHOUSE_CLUSTER,
+    engine=PROPERTY_VALUES_DATA_TABLE_ENGINE(),
+    ttl_period=ttl_period("last_seen", PROPERTY_VALUES_TTL_WEEKS),
+    storage_policy=STORAGE_POLICY(),
+)
+
+# Values of a team are all on the same shard, so that every lookup only reads from one
+DISTRIBUTED_PROPERTY_VALUES_TABLE_SQL = lambda: PROPERTY_VALUES_TABLE_BASE_SQL.format(
+    table_name="property_values",
+    cluster=settings.CLICKHOUSE_CLUSTER,
+    engine=Distributed(data_table=PROPERTY_VALUES_DATA_TABLE(), sharding_key="sipHash64(team_id)"),
+)
+
+INSERT_EVENT_PROPERTY_VALUES_SQL = f"""
+INSERT INTO property_values (team_id, property_type, key, value, count, last_seen)
+SELECT team_id, 'event', property.1 AS key, {trim_quotes_expr("property.2")} AS value, count() AS value_count, max(timestamp) AS last_seen
+FROM events
+ARRAY JOIN JSONExtractKeysAndValuesRaw(properties) AS property
+WHERE team_id = %(team_id)s AND timestamp >= %(since)s AND timestamp < %(until)s AND value != ''
+GROUP BY team_id, key, value
+ORDER BY team_id, key, value_count DESC
+LIMIT {PROPERTY_VALUES_PER_KEY} BY team_id, key
+"""
+
+INSERT_PERSON_PROPERTY_VALUES_SQL = f"""
+INSERT INTO property_values (team_id, property_type, key, value, count, last_seen)
+SELECT team_id, 'person', property.1 AS key, {trim_quotes_expr("property.2")} AS value, count() AS value_count, max(_timestamp) AS last_seen
+FROM person
+ARRAY JOIN JSONExtractKeysAndValuesRaw(properties) AS property
+WHERE team_id = %(team_id)s AND _timestamp >= %(since)s AND _timestamp < %(until)s AND is_deleted = 0 AND value != ''
+GROUP BY team_id, key, value
+ORDER BY team_id, key, value_count DESC
+LIMIT {PROPERTY_VALUES_PER_KEY} BY team_id, key
+"""
+
+SELECT_PROPERTY_VALUES_SQL = """
+SELECT value, sum(count) AS total
+FROM property_values
+WHERE team_id = %(team_id)s AND property_type = %(property_type)s AND key = %(key)s {value_filter}
+GROUP BY value
+ORDER BY total DESC, max(last_seen) DESC
+LIMIT %(limit)s
+"""
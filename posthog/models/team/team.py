@@ -3,10 +3,13 @@ from typing import TYPE_CHECKING, Any, List, Optional
 
 import posthoganalytics
 import pytz
+from django.conf import settings
 from django.contrib.postgres.fields import ArrayField
 from django.core.validators import MinLengthValidator
-from django.db import models
+from django.db import models, transaction
+from django.dispatch import receiver
 
+from posthog.cache_utils import TTLCache, publish_invalidation
 from posthog.constants import AvailableFeature
 from posthog.helpers.dashboard_templates import create_dashboard_from_template
 from posthog.models.dashboard import Dashboard
@@ -31,6 +34,14 @@ DEPRECATED_ATTRS = (
     "event_properties_numerical",
 )
 
+# Teams looked up by `get_team_from_cache_or_token`, keyed by api_token
+team_token_cache: TTLCache["Team"] = TTLCache(
+    maxsize=settings.TEAM_TOKEN_CACHE_MAX_SIZE,
+    ttl=settings.TEAM_TOKEN_CACHE_TTL_SECONDS,
+    negative_ttl=settings.TEAM_TOKEN_CACHE_NEGATIVE_TTL_SECONDS,
+    invalidation_channel=settings.TEAM_CACHE_INVALIDATION_PUBSUB_CHANNEL,
+)
+
 
 class TeamManager(models.Manager):
     def set_test_account_filters(self, organization: Optional[Any]) -> List:
@@ -78,6 +89,19 @@ class TeamManager(models.Manager):
         except Team.DoesNotExist:
             return None
 
+    def get_team_from_cache_or_token(self, token: Optional[str]) -> Optional["Team"]:
+        """
+        Same as `get_team_from_token`, but served from a per-process cache for hot paths like /decide.
+        The returned team is shared between requests, so it must be treated as read-only.
+        """
+        if not token:
+            return None
+        hit, team = team_token_cache.get(token)
+        if not hit:
+            team = self.get_team_from_token(token)
+            team_token_cache.set(token, team)
+        return team
+
 
 def get_default_data_attributes() -> List[str]:
     return ["data-attr"]
@@ -218,6 +242,21 @@ class Team(UUIDClassicModel):
         enabled_teams = get_list(get_instance_setting("STRICT_CACHING_TEAMS"))
         return str(self.pk) in enabled_teams or "all" in enabled_teams
 
+    @property
+    def events_rollup_enabled(self) -> bool:
+        enabled_teams = get_list(get_instance_setting("EVENTS_ROLLUP_TEAMS"))
+        return str(self.pk) in enabled_teams or "all" in enabled_teams
+
+    @property
+    def single_pass_breakdowns_enabled(self) -> bool:
+        enabled_teams = get_list(get_instance_setting("SINGLE_PASS_BREAKDOWN_TEAMS"))
+        return str(self.pk) in enabled_teams or "all" in enabled_teams
+
+    @property
+    def property_values_index_enabled(self) -> bool:
+        enabled_teams = get_list(get_instance_setting("PROPERTY_VALUES_INDEX_TEAMS"))
+        return str(self.pk) in enabled_teams or "all" in enabled_teams
+
     @property
     def geoip_property_overrides_enabled(self) -> bool:
         enabled_teams = get_list(get_instance_setting("GEOIP_PROPERTY_OVERRIDES_TEAMS"))
@@ -231,3 +270,29 @@ class Team(UUIDClassicModel):
         return str(self.pk)
 
     __repr__ = sane_repr("uuid", "name", "api_token")
+
+    _saved_api_token: Optional[str] = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the token we were loaded with, so that rotating it also evicts the old one from token caches
+        instance._saved_api_token = instance.__dict__.get("api_token")
+        return instance
+
+
+@receiver([models.signals.post_save, models.signals.post_delete], sender=Team)
+def invalidate_team_token_caches(sender, instance: Team, **kwargs):
+    tokens = [instance.api_token]
+    if instance._saved_api_token and instance._saved_api_token != instance.api_token:
+        tokens.append(instance._saved_api_token)
+    instance._saved_api_token = instance.api_token
+
+    _publish_team_token_invalidations(tokens)
+    # Processes that load the team before this is committed cache it as it was, so they're told again once it is
+    transaction.on_commit(lambda: _publish_team_token_invalidations(tokens))
+
+
+def _publish_team_token_invalidations(tokens: List[str]) -> None:
+    for token in tokens:
+        publish_invalidation(settings.TEAM_CACHE_INVALIDATION_PUBSUB_CHANNEL, token)
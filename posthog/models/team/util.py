@@ -3,8 +3,9 @@ from typing import Any, List
 import structlog
 
 from posthog.client import sync_execute
-from posthog.models.event.sql import EVENTS_DATA_TABLE
+from posthog.models.event.sql import EVENTS_DATA_TABLE, EVENTS_ROLLUP_DATA_TABLE
 from posthog.models.person import Person, PersonDistinctId
+from posthog.models.property.sql import PROPERTY_VALUES_DATA_TABLE
 from posthog.models.team import Team
 from posthog.settings import CLEAR_CLICKHOUSE_REMOVED_DATA_SCHEDULE_CRON, CLICKHOUSE_CLUSTER
 from posthog.utils import get_crontab
@@ -14,6 +15,7 @@ logger = structlog.get_logger(__name__)
 # Note: Session recording, dead letter queue, logs deletion will be handled by TTL
 TABLES_TO_DELETE_FROM = lambda: [
     EVENTS_DATA_TABLE(),
+    EVENTS_ROLLUP_DATA_TABLE(),
     "person",
     "person_distinct_id",
     "person_distinct_id2",
@@ -21,6 +23,7 @@ TABLES_TO_DELETE_FROM = lambda: [
     "cohortpeople",
     "person_static_cohort",
     "plugin_log_entries",
+    PROPERTY_VALUES_DATA_TABLE(),
 ]
 
 
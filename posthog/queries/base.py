@@ -1,16 +1,27 @@
 import re
-from typing import Any, Callable, Dict, List, Union, cast
+from functools import lru_cache, partial
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Pattern,
+    Union,
+    cast,
+)
 
 from dateutil.relativedelta import relativedelta
 from django.db.models import Exists, OuterRef, Q
 from rest_framework.exceptions import ValidationError
 
+from posthog.clickhouse.query_executor import query_executor
 from posthog.models.cohort import Cohort
 from posthog.models.filters.filter import Filter
 from posthog.models.person import Person
 from posthog.models.property import Property
 from posthog.models.team import Team
-from posthog.utils import get_compare_period_dates, is_valid_regex
+from posthog.utils import get_compare_period_dates
 
 
 def determine_compared_filter(filter) -> Filter:
@@ -43,24 +54,29 @@ def convert_to_comparison(trend_entity: List[Dict[str, Any]], filter, label: str
 """
     handle_compare takes an Entity, Filter and a callable.
     It'll automatically create a new entity with the 'current' and 'previous' labels and automatically pick the right date_from and date_to filters .
-    It will then call func(entity, filter, team_id).
+    It will then call func(entity, filter, team_id), for both periods at once when comparing.
 """
 
 
 def handle_compare(filter, func: Callable, team: Team, **kwargs) -> List:
     entities_list = []
-    trend_entity = func(filter=filter, team=team, **kwargs)
     if filter.compare:
+        compared_filter = determine_compared_filter(filter)
+        trend_entity, compared_trend_entity = query_executor.run(
+            [
+                partial(func, filter=filter, team=team, **kwargs),
+                partial(func, filter=compared_filter, team=team, **kwargs),
+            ],
+            team_id=team.pk,
+        )
+
         trend_entity = convert_to_comparison(trend_entity, filter, "current")
         entities_list.extend(trend_entity)
 
-        compared_filter = determine_compared_filter(filter)
-        compared_trend_entity = func(filter=compared_filter, team=team, **kwargs)
-
         compared_trend_entity = convert_to_comparison(compared_trend_entity, compared_filter, "previous",)
         entities_list.extend(compared_trend_entity)
     else:
-        entities_list.extend(trend_entity)
+        entities_list.extend(func(filter=filter, team=team, **kwargs))
     return entities_list
 
 
@@ -72,6 +88,15 @@ TIME_IN_SECONDS: Dict[str, Any] = {
 }
 
 
+@lru_cache(maxsize=1024)
+def compile_regex(value: str) -> Optional[Pattern]:
+    "Compiles each regex once per process, returning None for invalid ones."
+    try:
+        return re.compile(value)
+    except re.error:
+        return None
+
+
 def match_property(property: Property, override_property_values: Dict[str, Any]) -> bool:
     # only looks for matches where key exists in override_property_values
     # doesn't support operator is_not_set
@@ -107,10 +132,12 @@ def match_property(property: Property, override_property_values: Dict[str, Any])
         return str(value).lower() not in str(override_value).lower()
 
     if operator == "regex":
-        return is_valid_regex(str(value)) and re.compile(str(value)).search(str(override_value)) is not None
+        pattern = compile_regex(str(value))
+        return pattern is not None and pattern.search(str(override_value)) is not None
 
     if operator == "not_regex":
-        return is_valid_regex(str(value)) and re.compile(str(value)).search(str(override_value)) is None
+        pattern = compile_regex(str(value))
+        return pattern is not None and pattern.search(str(override_value)) is None
 
     if operator == "gt":
         return type(override_value) == type(value) and override_value > value
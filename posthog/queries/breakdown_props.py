@@ -22,6 +22,7 @@ from posthog.queries.column_optimizer.column_optimizer import ColumnOptimizer
 from posthog.queries.groups_join_query import GroupsJoinQuery
 from posthog.queries.person_distinct_id_query import get_team_distinct_ids_query
 from posthog.queries.person_query import PersonQuery
+from posthog.queries.sampling import get_sample_clause
 from posthog.queries.session_query import SessionQuery
 from posthog.queries.trends.sql import HISTOGRAM_ELEMENTS_ARRAY_OF_KEY_SQL, TOP_ELEMENTS_ARRAY_OF_KEY_SQL
 from posthog.queries.util import parse_timestamps
@@ -132,6 +133,7 @@ def get_breakdown_prop_values(
         bucketing_expression = _to_bucketing_expression(cast(int, filter.breakdown_histogram_bin_count))
         elements_query = HISTOGRAM_ELEMENTS_ARRAY_OF_KEY_SQL.format(
             bucketing_expression=bucketing_expression,
+            sample_clause=get_sample_clause(filter),
             value_expression=value_expression,
             parsed_date_from=parsed_date_from,
             parsed_date_to=parsed_date_to,
@@ -145,6 +147,7 @@ def get_breakdown_prop_values(
     else:
         elements_query = TOP_ELEMENTS_ARRAY_OF_KEY_SQL.format(
             value_expression=value_expression,
+            sample_clause=get_sample_clause(filter),
             parsed_date_from=parsed_date_from,
             parsed_date_to=parsed_date_to,
             prop_filters=prop_filters,
@@ -33,6 +33,7 @@ from posthog.queries.breakdown_props import (
 )
 from posthog.queries.funnels.funnel_event_query import FunnelEventQuery
 from posthog.queries.funnels.sql import FUNNEL_INNER_EVENT_STEPS_QUERY
+from posthog.queries.sampling import get_confidence_interval, scale
 from posthog.utils import relative_date_parse
 
 
@@ -183,6 +184,14 @@ class ClickhouseFunnelBase(ABC):
                 total_people += results[step.index]
 
             serialized_result = self._serialize_step(step, total_people, [])  # persons not needed on initial return
+            if self._filter.sampling_factor:
+                # Overestimated for persons with several distinct_ids, which are more likely to be sampled
+                serialized_result.update(
+                    {
+                        "count": scale(total_people, self._filter.sampling_factor),
+                        "confidence_interval": get_confidence_interval(total_people, self._filter.sampling_factor),
+                    }
+                )
             if cast(int, step.index) > 0:
                 serialized_result.update(
                     {
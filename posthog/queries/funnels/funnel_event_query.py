@@ -6,6 +6,7 @@ from posthog.models.group.util import get_aggregation_target_field
 from posthog.models.property.util import get_property_string_expr
 from posthog.models.utils import PersonPropertiesMode
 from posthog.queries.event_query import EventQuery
+from posthog.queries.sampling import get_sample_clause
 
 
 class FunnelEventQuery(EventQuery):
@@ -107,7 +108,7 @@ class FunnelEventQuery(EventQuery):
         self.params.update(groups_params)
 
         query = f"""
-            SELECT {', '.join(_fields)} FROM events {self.EVENT_TABLE_ALIAS}
+            SELECT {', '.join(_fields)} FROM events {self.EVENT_TABLE_ALIAS} {get_sample_clause(self._filter)}
             {self._get_distinct_id_query()}
             {person_query}
             {groups_query}
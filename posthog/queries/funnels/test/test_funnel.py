@@ -12,6 +12,7 @@ from posthog.models.filters import Filter
 from posthog.queries.funnels import ClickhouseFunnel, ClickhouseFunnelActors
 from posthog.queries.funnels.test.breakdown_cases import assert_funnel_results_equal, funnel_breakdown_test_factory
 from posthog.queries.funnels.test.conversion_time_cases import funnel_conversion_time_test_factory
+from posthog.queries.sampling import get_confidence_interval
 from posthog.tasks.update_cache import update_cache_item
 from posthog.test.base import (
     APIBaseTest,
@@ -2281,6 +2282,36 @@ def funnel_test_factory(Funnel, event_factory, person_factory):
             self.assertEqual(result[0]["name"], "user signed up")
             self.assertEqual(result[0]["count"], 0)
 
+        def test_sampled_counts_are_scaled_back_up(self):
+            filters = {
+                "events": [
+                    {"id": "user signed up", "type": "events", "order": 0},
+                    {"id": "paid", "type": "events", "order": 1},
+                ],
+                "insight": INSIGHT_FUNNELS,
+                "date_from": "2020-01-01",
+                "date_to": "2020-01-14",
+                "sampling_factor": 0.5,
+            }
+
+            for user in range(20):
+                _create_person(distinct_ids=[f"user_{user}"], team_id=self.team.pk)
+                _create_event(
+                    team=self.team, event="user signed up", distinct_id=f"user_{user}", timestamp="2020-01-02T14:00:00Z"
+                )
+                if user % 2:
+                    _create_event(
+                        team=self.team, event="paid", distinct_id=f"user_{user}", timestamp="2020-01-10T14:00:00Z"
+                    )
+
+            result = Funnel(Filter(data=filters), self.team).run()
+
+            for step in result:
+                sampled_count = step["count"] / 2
+                self.assertTrue(sampled_count.is_integer())
+                self.assertEqual(step["confidence_interval"], get_confidence_interval(sampled_count, 0.5))
+            self.assertTrue(result[1]["count"] <= result[0]["count"] <= 40 and result[0]["count"] > 0)
+
     return TestGetFunnel
 
 
@@ -5,12 +5,19 @@ from django.utils import timezone
 from posthog.client import sync_execute
 from posthog.models.event.sql import SELECT_PROP_VALUES_SQL, SELECT_PROP_VALUES_SQL_WITH_FILTER
 from posthog.models.person.sql import SELECT_PERSON_PROP_VALUES_SQL, SELECT_PERSON_PROP_VALUES_SQL_WITH_FILTER
+from posthog.models.property.sql import SELECT_PROPERTY_VALUES_SQL
 from posthog.models.property.util import get_property_string_expr
 from posthog.models.team import Team
 from posthog.utils import relative_date_parse
 
+EVENT_PROPERTY_VALUES_LIMIT = 10
+PERSON_PROPERTY_VALUES_LIMIT = 20
+
+
+def get_property_values_for_key(key: str, team: Team, value: Optional[str] = None, prefix: bool = False):
+    if team.property_values_index_enabled:
+        return get_indexed_property_values_for_key(key, team, "event", value, prefix, EVENT_PROPERTY_VALUES_LIMIT)
 
-def get_property_values_for_key(key: str, team: Team, value: Optional[str] = None):
     property_field, _ = get_property_string_expr("events", key, "%(key)s", "properties")
     parsed_date_from = "AND timestamp >= '{}'".format(relative_date_parse("-7d").strftime("%Y-%m-%d 00:00:00"))
     parsed_date_to = "AND timestamp <= '{}'".format(timezone.now().strftime("%Y-%m-%d 23:59:59"))
@@ -20,7 +27,7 @@ def get_property_values_for_key(key: str, team: Team, value: Optional[str] = Non
             SELECT_PROP_VALUES_SQL_WITH_FILTER.format(
                 parsed_date_from=parsed_date_from, parsed_date_to=parsed_date_to, property_field=property_field
             ),
-            {"team_id": team.pk, "key": key, "value": "%{}%".format(value)},
+            {"team_id": team.pk, "key": key, "value": _value_pattern(value, prefix)},
         )
     return sync_execute(
         SELECT_PROP_VALUES_SQL.format(
@@ -30,14 +37,40 @@ def get_property_values_for_key(key: str, team: Team, value: Optional[str] = Non
     )
 
 
-def get_person_property_values_for_key(key: str, team: Team, value: Optional[str] = None):
+def get_person_property_values_for_key(key: str, team: Team, value: Optional[str] = None, prefix: bool = False):
+    if team.property_values_index_enabled:
+        return get_indexed_property_values_for_key(key, team, "person", value, prefix, PERSON_PROPERTY_VALUES_LIMIT)
+
     property_field, _ = get_property_string_expr("person", key, "%(key)s", "properties")
 
     if value:
         return sync_execute(
             SELECT_PERSON_PROP_VALUES_SQL_WITH_FILTER.format(property_field=property_field),
-            {"team_id": team.pk, "key": key, "value": "%{}%".format(value)},
+            {"team_id": team.pk, "key": key, "value": _value_pattern(value, prefix)},
         )
     return sync_execute(
         SELECT_PERSON_PROP_VALUES_SQL.format(property_field=property_field), {"team_id": team.pk, "key": key},
     )
+
+
+def get_indexed_property_values_for_key(
+    key: str, team: Team, property_type: str, value: Optional[str], prefix: bool, limit: int
+):
+    """
+    The values of a property from the property values index, as rows of the value and how often it was seen, the most
+    seen first. See `posthog/models/property/sql.py` for what the index holds.
+    """
+    return sync_execute(
+        SELECT_PROPERTY_VALUES_SQL.format(value_filter="AND value ILIKE %(value)s" if value else ""),
+        {
+            "team_id": team.pk,
+            "property_type": property_type,
+            "key": key,
+            "value": _value_pattern(value, prefix) if value else None,
+            "limit": limit,
+        },
+    )
+
+
+def _value_pattern(value: str, prefix: bool) -> str:
+    return "{}%".format(value) if prefix else "%{}%".format(value)
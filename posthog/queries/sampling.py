@@ -0,0 +1,70 @@
+"""
+Sampling runs insights over a fraction of the events of a team, picked by the sampling key of the events table,
+`cityHash64(distinct_id)`, so that queries over a lot of events take a fraction of the time.
+
+Counts of the sample are scaled back up by the sampling factor, and come with the range the actual count is within with
+95% confidence. Every distinct_id is in the sample with a probability of the sampling factor, so that the sampled count
+of `N` distinct_ids is binomial, with a variance of `N * factor * (1 - factor)`, `N` being estimated from the sampled
+count. Events of a distinct_id being sampled all together, the ranges of event counts are narrower than they should be
+the more events distinct_ids have each.
+
+Persons aren't sampled as a whole though: funnels, and trends counting unique users (`dau`, `weekly_active`,
+`monthly_active`), aggregate by person, and a person with `k` distinct_ids is in the sample as soon as any of them is,
+with a probability of `1 - (1 - factor) ** k`. Their scaled counts overestimate the actual ones for teams whose persons
+have several distinct_ids each, by up to `k` times for small factors, and the confidence intervals don't account for it.
+They're only unbiased for teams aggregating users by distinct_id, or whose persons mostly have a single distinct_id.
+"""
+from math import sqrt
+from typing import Any, Dict, List, Tuple
+
+from posthog.constants import MONTHLY_ACTIVE, WEEKLY_ACTIVE
+from posthog.models.entity import Entity
+from posthog.models.filters import Filter
+
+# z-score of the bounds of a two-sided 95% confidence interval
+CONFIDENCE_Z_SCORE = 1.96
+
+# Maths counting events or actors, which sampling divides by the sampling factor
+COUNTING_MATHS = [None, "total", "dau", WEEKLY_ACTIVE, MONTHLY_ACTIVE, "unique_group", "unique_session"]
+
+
+def get_sample_clause(filter: Filter) -> str:
+    "The SAMPLE clause of a query of the events table, to follow the table in its FROM clause."
+    return f"SAMPLE {filter.sampling_factor}" if filter.sampling_factor else ""
+
+
+def scale(value: float, sampling_factor: float) -> float:
+    "The count or sum over every user, estimated from the `value` of the sample."
+    return round(value / sampling_factor, 2)
+
+
+def get_confidence_interval(count: float, sampling_factor: float) -> Tuple[float, float]:
+    "The range the count over every user is within with 95% confidence, for the `count` of the sample."
+    estimate = count / sampling_factor
+    margin = CONFIDENCE_Z_SCORE * sqrt(count * (1 - sampling_factor)) / sampling_factor
+    # Whatever is in the sample is part of the count
+    return round(max(count, estimate - margin), 2), round(estimate + margin, 2)
+
+
+def scale_trends_results(results: List[Dict[str, Any]], filter: Filter, entity: Entity) -> List[Dict[str, Any]]:
+    """
+    Scales the results of an entity queried with sampling back up, with the confidence intervals of counts. Other
+    maths, e.g. averages or percentiles, are left as the sample has them.
+    """
+    sampling_factor = filter.sampling_factor
+    if not sampling_factor or (entity.math not in COUNTING_MATHS and entity.math != "sum"):
+        return results
+
+    for result in results:
+        if "aggregated_value" in result:
+            if entity.math in COUNTING_MATHS:
+                result["confidence_interval"] = get_confidence_interval(result["aggregated_value"], sampling_factor)
+            result["aggregated_value"] = scale(result["aggregated_value"], sampling_factor)
+        else:
+            if entity.math in COUNTING_MATHS:
+                result["confidence_intervals"] = [
+                    get_confidence_interval(value, sampling_factor) for value in result["data"]
+                ]
+            result["data"] = [scale(value, sampling_factor) for value in result["data"]]
+            result["count"] = scale(result["count"], sampling_factor)
+    return results
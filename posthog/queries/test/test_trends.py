@@ -3,16 +3,17 @@ from datetime import datetime
 from typing import Dict, List, Optional, Tuple, Union
 from unittest.mock import patch
 
-from django.conf import settings
-from django.core.cache import cache
 from django.utils import timezone
 from freezegun import freeze_time
 from rest_framework.exceptions import ValidationError
 
+from posthog.client import sync_execute
 from posthog.constants import ENTITY_ID, ENTITY_TYPE, TREND_FILTER_TYPE_EVENTS, TRENDS_BAR_VALUE, TRENDS_TABLE
 from posthog.models import Action, ActionStep, Cohort, Entity, Filter, Organization, Person
+from posthog.models.event.sql import DROP_EVENTS_ROLLUP_MV_SQL, EVENTS_ROLLUP_MV_SQL
 from posthog.models.instance_setting import override_instance_config, set_instance_setting
 from posthog.models.person.util import create_person_distinct_id
+from posthog.queries.sampling import get_confidence_interval
 from posthog.queries.trends.trends import Trends
 from posthog.test.base import (
     APIBaseTest,
@@ -24,7 +25,6 @@ from posthog.test.base import (
     test_with_materialized_columns,
 )
 from posthog.test.test_journeys import journeys_for
-from posthog.utils import generate_cache_key
 
 
 def breakdown_label(entity: Entity, value: Union[str, int]) -> Dict[str, Optional[Union[str, int]]]:
@@ -4411,233 +4411,291 @@ class TestFOSSTrends(trend_test_factory(Trends)):  # type: ignore
     maxDiff = None
 
 
-class TestTrendUtils(ClickhouseTestMixin, APIBaseTest):
+class TestTrendsBucketCache(ClickhouseTestMixin, APIBaseTest):
     maxDiff = None
 
-    def test_get_cached_result_no_cache(self):
-        set_instance_setting("STRICT_CACHING_TEAMS", "all")
+    def _create_sign_ups(self, *days_and_browsers: Tuple[int, str]):
+        for day, browser in days_and_browsers:
+            _create_event(
+                team=self.team,
+                event="sign up",
+                distinct_id="blabla",
+                properties={"$browser": browser},
+                timestamp=datetime(2020, 1, day, 12),
+            )
+        flush_persons_and_events()
 
-        filter = Filter(
-            data={
-                "date_to": "2020-11-01 10:26:00",
-                "events": [{"id": "sign up", "name": "sign up"},],
-                "interval": "hour",
-            },
-            team=self.team,
+    def _run(self, **filter_data) -> List[Dict]:
+        return Trends().run(
+            Filter(data={"date_from": "-6d", "events": [{"id": "sign up"}], **filter_data}, team=self.team), self.team
         )
 
-        is_present = Trends().get_cached_result(filter, self.team)
-        self.assertIsNone(is_present)
-
-    def test_get_cached_result_bad_cache(self):
+    @freeze_time("2020-01-07T18:00:00Z")
+    def test_only_computes_buckets_that_are_not_cached(self):
         set_instance_setting("STRICT_CACHING_TEAMS", "all")
+        self._create_sign_ups((1, "Chrome"), (5, "Chrome"), (7, "Chrome"))
+
+        result = self._run()
+        self.assertEqual(result[0]["data"], [1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 1.0])
+
+        # Days that are done with are taken from the cache, the current one is computed again
+        self._create_sign_ups((5, "Chrome"), (7, "Chrome"))
+        result = self._run()
+        self.assertEqual(result[0]["data"], [1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 2.0])
+        self.assertEqual(result[0]["days"][0], "2020-01-01")
+        self.assertEqual(result[0]["count"], 4.0)
+
+        # Whatever the date range, and display
+        result = self._run(date_from="-2d", display="ActionsLineGraphCumulative")
+        self.assertEqual(result[0]["data"], [1.0, 1.0, 3.0])
+        self.assertEqual(result[0]["filter"]["date_from"], "-2d")
+
+        # Without strict caching all of it is computed
+        set_instance_setting("STRICT_CACHING_TEAMS", "")
+        result = self._run()
+        self.assertEqual(result[0]["data"], [1.0, 0.0, 0.0, 0.0, 2.0, 0.0, 2.0])
+
+    @freeze_time("2020-01-07T18:00:00Z")
+    def test_queries_nothing_when_all_buckets_are_cached(self):
+        set_instance_setting("STRICT_CACHING_TEAMS", "all")
+        self._create_sign_ups((1, "Chrome"), (3, "Chrome"))
+        self._run(date_to="2020-01-04")
 
-        fake_cached = {
-            "result": [{"days": ["2020-11-01 05:20:00", "2020-11-01 10:22:00", "2020-11-01 10:25:00",], "data": [],}]
-        }
-
-        filter = Filter(
-            data={
-                "date_to": "2020-11-01 10:26:00",
-                "events": [{"id": "sign up", "name": "sign up"},],
-                "interval": "hour",
-            },
-            team=self.team,
-        )
-        cache_key = generate_cache_key(f"{filter.toJSON()}_{self.team.pk}")
-        cache.set(
-            cache_key, fake_cached, settings.CACHED_RESULTS_TTL,
-        )
+        with self.capture_select_queries() as queries:
+            result = self._run(date_to="2020-01-04")
 
-        is_present = Trends().get_cached_result(filter, self.team)
-        self.assertIsNone(is_present)
+        self.assertEqual(result[0]["data"], [1.0, 0.0, 1.0, 0.0])
+        self.assertEqual([query for query in queries if "FROM events" in query], [])
 
-    def test_get_cached_result_hour(self):
+    @freeze_time("2020-01-07T18:00:00Z")
+    def test_breakdowns_are_not_cached(self):
         set_instance_setting("STRICT_CACHING_TEAMS", "all")
+        self._create_sign_ups((1, "Chrome"), (2, "Safari"), (7, "Chrome"))
 
-        fake_cached = {
-            "result": [
-                {
-                    "days": ["2020-11-01 05:20:00", "2020-11-01 10:22:00", "2020-11-01 10:25:00",],
-                    "data": [0.0, 0.0, 0.0],
-                }
-            ]
-        }
-
-        filter = Filter(
-            data={
-                "date_to": "2020-11-01 10:26:00",
-                "events": [{"id": "sign up", "name": "sign up"},],
-                "interval": "hour",
-            },
-            team=self.team,
-        )
-        cache_key = generate_cache_key(f"{filter.toJSON()}_{self.team.pk}")
-        cache.set(
-            cache_key, fake_cached, settings.CACHED_RESULTS_TTL,
+        result = self._run(breakdown="$browser")
+        self.assertEqual(
+            [(series["breakdown_value"], series["data"]) for series in result],
+            [("Chrome", [1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0]), ("Safari", [0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0])],
         )
 
-        res = Trends().get_cached_result(filter, self.team)
-        self.assertIsNotNone(res)
-
-        filter = Filter(
-            data={
-                "date_to": "2020-11-02 05:26:00",
-                "events": [{"id": "sign up", "name": "sign up"},],
-                "interval": "hour",
-            },
-            team=self.team,
+        # Top values change with events of any day
+        self._create_sign_ups((2, "Firefox"), (3, "Firefox"), (4, "Firefox"))
+        result = self._run(breakdown="$browser")
+        self.assertEqual(
+            [(series["breakdown_value"], series["data"]) for series in result],
+            [
+                ("Firefox", [0.0, 1.0, 1.0, 1.0, 0.0, 0.0, 0.0]),
+                ("Chrome", [1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0]),
+                ("Safari", [0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0]),
+            ],
         )
 
-        res = Trends().get_cached_result(filter, self.team)
-        self.assertIsNone(res)
 
-    def test_get_cached_result_day(self):
-        set_instance_setting("STRICT_CACHING_TEAMS", "all")
-        fake_cached = {"result": [{"days": ["2020-01-02", "2020-01-03", "2020-01-04",], "data": [0.0, 0.0, 0.0]}]}
-        filter = Filter(
-            data={
-                "date_from": "2020-01-02",
-                "date_to": "2020-01-04",
-                "events": [{"id": "sign up", "name": "sign up"},],
-            },
-            team=self.team,
-        )
-        cache_key = generate_cache_key(f"{filter.toJSON()}_{self.team.pk}")
-        cache.set(
-            cache_key, fake_cached, settings.CACHED_RESULTS_TTL,
-        )
-
-        res = Trends().get_cached_result(filter, self.team)
-        self.assertTrue(res)
+class TestTrendsSampling(ClickhouseTestMixin, APIBaseTest):
+    maxDiff = None
 
-        fake_cached = {"result": [{"days": ["2020-01-01", "2020-01-02", "2020-01-03",], "data": [0.0, 0.0, 0.0]}]}
+    def _create_sign_ups(self, users: int):
+        for user in range(users):
+            _create_event(
+                team=self.team,
+                event="sign up",
+                distinct_id=f"user_{user}",
+                properties={"$browser": "Chrome" if user % 2 else "Safari", "duration": user},
+                timestamp=datetime(2020, 1, 2, 12),
+            )
+        flush_persons_and_events()
 
-        cache.set(
-            cache_key, fake_cached, settings.CACHED_RESULTS_TTL,
+    def _run(self, **filter_data) -> List[Dict]:
+        return Trends().run(
+            Filter(
+                data={"date_from": "2020-01-01", "date_to": "2020-01-03", "events": [{"id": "sign up"}], **filter_data},
+                team=self.team,
+            ),
+            self.team,
         )
 
-        res = Trends().get_cached_result(filter, self.team)
-        self.assertFalse(res)
+    def test_get_confidence_interval(self):
+        self.assertEqual(get_confidence_interval(100, 0.1), (814.06, 1185.94))
+        # The sample is part of the count
+        self.assertEqual(get_confidence_interval(1, 0.5), (1, 4.77))
+        self.assertEqual(get_confidence_interval(0, 0.5), (0, 0.0))
+
+    def test_sampled_counts_are_scaled_back_up(self):
+        self._create_sign_ups(40)
+
+        with self.capture_select_queries() as queries:
+            result = self._run(sampling_factor=0.5)
+
+        self.assertIn("SAMPLE 0.5", [query for query in queries if "FROM events" in query][0])
+        sampled_count = result[0]["data"][1] / 2
+        self.assertTrue(0 < sampled_count <= 40 and sampled_count.is_integer())
+        self.assertEqual(result[0]["data"], [0.0, sampled_count * 2, 0.0])
+        self.assertEqual(result[0]["count"], sampled_count * 2)
+        self.assertEqual(
+            result[0]["confidence_intervals"], [(0, 0.0), get_confidence_interval(sampled_count, 0.5), (0, 0.0)],
+        )
 
-    def test_get_cached_result_week(self):
-        set_instance_setting("STRICT_CACHING_TEAMS", "all")
+        # Other maths are as the sample has them
+        result = self._run(sampling_factor=0.5, events=[{"id": "sign up", "math": "max", "math_property": "duration"}])
+        self.assertNotIn("confidence_intervals", result[0])
 
-        fake_cached = {"result": [{"days": ["2020-11-01", "2020-11-08", "2020-11-15",], "data": [0.0, 0.0, 0.0]}]}
+    def test_sampled_breakdown_and_aggregate_values(self):
+        self._create_sign_ups(40)
 
-        filter = Filter(
-            data={"date_to": "2020-11-16", "events": [{"id": "sign up", "name": "sign up"},], "interval": "week",},
-            team=self.team,
-        )
-        cache_key = generate_cache_key(f"{filter.toJSON()}_{self.team.pk}")
-        cache.set(
-            cache_key, fake_cached, settings.CACHED_RESULTS_TTL,
-        )
+        with self.capture_select_queries() as queries:
+            result = self._run(sampling_factor=0.5, breakdown="$browser")
 
-        res = Trends().get_cached_result(filter, self.team)
-        self.assertTrue(res)
+        self.assertTrue(all("SAMPLE 0.5" in query for query in queries if "FROM events" in query))
+        for series in result:
+            self.assertEqual(series["confidence_intervals"][1], get_confidence_interval(series["data"][1] / 2, 0.5))
 
-        filter = Filter(
-            data={"date_to": "2020-11-23", "events": [{"id": "sign up", "name": "sign up"},], "interval": "week",},
-            team=self.team,
+        result = self._run(sampling_factor=0.5, display=TRENDS_TABLE)
+        self.assertEqual(
+            result[0]["confidence_interval"], get_confidence_interval(result[0]["aggregated_value"] / 2, 0.5)
         )
 
-        res = Trends().get_cached_result(filter, self.team)
-        self.assertFalse(res)
+    def test_formulas_are_not_sampled(self):
+        self._create_sign_ups(40)
 
-    def test_get_cached_result_month(self):
-        set_instance_setting("STRICT_CACHING_TEAMS", "all")
+        with self.capture_select_queries() as queries:
+            result = self._run(sampling_factor=0.5, events=[{"id": "sign up"}, {"id": "sign up"}], formula="A + B")
 
-        fake_cached = {"result": [{"days": ["2020-09-01", "2020-10-01", "2020-11-01",], "data": [0.0, 0.0, 0.0]}]}
+        self.assertFalse(any("SAMPLE" in query for query in queries))
+        self.assertEqual(result[0]["data"], [0.0, 80.0, 0.0])
 
-        filter = Filter(
-            data={"date_to": "2020-11-16", "events": [{"id": "sign up", "name": "sign up"},], "interval": "month",},
-            team=self.team,
-        )
-        cache_key = generate_cache_key(f"{filter.toJSON()}_{self.team.pk}")
-        cache.set(
-            cache_key, fake_cached, settings.CACHED_RESULTS_TTL,
-        )
-
-        res = Trends().get_cached_result(filter, self.team)
-        self.assertTrue(res)
+    def test_sampling_is_part_of_the_cache_key(self):
+        filter = Filter(data={"events": [{"id": "sign up"}]})
 
-        filter = Filter(
-            data={"date_to": "2020-12-01", "events": [{"id": "sign up", "name": "sign up"},], "interval": "week",},
-            team=self.team,
-        )
+        self.assertNotEqual(filter.toJSON(), filter.with_data({"sampling_factor": 0.1}).toJSON())
+        self.assertEqual(filter.toJSON(), filter.with_data({"sampling_factor": 1}).toJSON())
+        with self.assertRaises(ValidationError):
+            filter.with_data({"sampling_factor": 0}).sampling_factor
 
-        res = Trends().get_cached_result(filter, self.team)
-        self.assertFalse(res)
 
-    def test_merge_result(self):
-        set_instance_setting("STRICT_CACHING_TEAMS", "all")
-        fake_cached = {
-            "sign up - Chrome_0": {
-                "label": "sign up - Chrome",
-                "days": ["2020-01-02", "2020-01-03", "2020-01-04",],
-                "data": [23.0, 15.0, 1.0],
-            }
-        }
-        filter = Filter(
-            data={
-                "date_from": "2020-01-02",
-                "date_to": "2020-01-04",
-                "events": [{"id": "sign up", "name": "sign up"},],
-            },
-            team=self.team,
-        )
-        result = [{"label": "sign up - Chrome", "data": [15.0, 12.0],}]
+class TestTrendsEventsRollup(ClickhouseTestMixin, APIBaseTest):
+    maxDiff = None
 
-        merged_result, _ = Trends().merge_results(result, fake_cached, 0, filter, self.team)
-        self.assertEqual(merged_result[0]["data"], [23.0, 15.0, 12.0])
+    def setUp(self):
+        super().setUp()
+        # Materialized views aren't created for tests otherwise
+        sync_execute(EVENTS_ROLLUP_MV_SQL())
+        self.addCleanup(sync_execute, DROP_EVENTS_ROLLUP_MV_SQL())
 
-    def test_merge_result_no_cache(self):
+        for day, hour, user in [(1, 23, 1), (2, 0, 1), (2, 12, 1), (2, 12, 2), (3, 6, 3)]:
+            _create_event(
+                team=self.team,
+                event="sign up",
+                distinct_id=f"user_{user}",
+                properties={"$browser": "Chrome"},
+                timestamp=datetime(2020, 1, day, hour, 30),
+            )
+        _create_event(team=self.team, event="log in", distinct_id="user_1", timestamp=datetime(2020, 1, 2, 12))
+        flush_persons_and_events()
 
+    def _run_with_and_without_rollup(self, **filter_data) -> Tuple[List[Dict], List[Dict], List[str]]:
         filter = Filter(
-            data={
-                "date_from": "2020-01-02",
-                "date_to": "2020-01-04",
-                "events": [{"id": "sign up", "name": "sign up"},],
-            },
+            data={"date_from": "2020-01-01", "date_to": "2020-01-03", "events": [{"id": "sign up"}], **filter_data},
             team=self.team,
         )
+        with override_instance_config("AGGREGATE_BY_DISTINCT_IDS_TEAMS", "all"):
+            expected = Trends().run(filter, self.team)
+            with override_instance_config("EVENTS_ROLLUP_TEAMS", "all"), self.capture_select_queries() as queries:
+                result = Trends().run(filter, self.team)
+        return result, expected, queries
+
+    def _assert_rollup_has_same_results(self, **filter_data):
+        result, expected, queries = self._run_with_and_without_rollup(**filter_data)
+
+        self.assertTrue(any("FROM events_rollup" in query for query in queries))
+        self.assertEqual(result, expected)
+        return result
+
+    def test_counts_are_read_from_rollup(self):
+        result = self._assert_rollup_has_same_results()
+        self.assertEqual(result[0]["data"], [1.0, 3.0, 1.0])
+
+        result = self._assert_rollup_has_same_results(events=[{"id": "sign up", "math": "dau"}])
+        self.assertEqual(result[0]["data"], [1.0, 2.0, 1.0])
+
+        self._assert_rollup_has_same_results(events=[{"id": None}])
+        self._assert_rollup_has_same_results(interval="hour", date_from="2020-01-02", date_to="2020-01-02")
+        self._assert_rollup_has_same_results(interval="week")
+        self._assert_rollup_has_same_results(display=TRENDS_TABLE, events=[{"id": "sign up", "math": "dau"}])
+
+    def test_rollup_in_timezone_whole_hours_off_utc(self):
+        self.team.timezone = "America/New_York"
+        self.team.save()
+
+        result = self._assert_rollup_has_same_results()
+        self.assertEqual(result[0]["data"], [2.0, 2.0, 1.0])
+
+    def test_queries_the_rollup_cannot_answer_read_events(self):
+        for filter_data in [
+            {"properties": [{"key": "$browser", "value": "Chrome"}]},
+            {"events": [{"id": "sign up", "math": "weekly_active"}]},
+            {"date_from": "2020-01-02T12:15:00Z"},
+            {"sampling_factor": 0.5},
+            {"breakdown": "$browser"},
+        ]:
+            _, _, queries = self._run_with_and_without_rollup(**filter_data)
+            self.assertFalse(any("events_rollup" in query for query in queries), filter_data)
+
+        self.team.timezone = "Asia/Kolkata"
+        self.team.save()
+        _, _, queries = self._run_with_and_without_rollup()
+        self.assertFalse(any("events_rollup" in query for query in queries))
+
+
+class TestTrendsSinglePassBreakdown(ClickhouseTestMixin, APIBaseTest):
+    maxDiff = None
 
-        result = [{"label": "sign up - Chrome", "data": [15.0, 12.0],}]
-
-        merged_result, _ = Trends().merge_results(result, {}, 0, filter, self.team)
-
-        self.assertEqual(merged_result[0]["data"], [15.0, 12.0])
+    def setUp(self):
+        super().setUp()
+        for browser, users in [("Chrome", 4), ("Safari", 3), ("Firefox", 2), ("Edge", 1)]:
+            for user in range(users):
+                _create_event(
+                    team=self.team,
+                    event="sign up",
+                    distinct_id=f"{browser}_{user}",
+                    properties={"$browser": browser, "duration": user},
+                    timestamp=datetime(2020, 1, 1 + user, 12),
+                )
+        flush_persons_and_events()
 
-    def test_merge_result_multiple(self):
-        set_instance_setting("STRICT_CACHING_TEAMS", "all")
-        fake_cached = {
-            "sign up - Chrome_0": {
-                "label": "sign up - Chrome",
-                "days": ["2020-01-02", "2020-01-03", "2020-01-04",],
-                "data": [23.0, 15.0, 1.0],
-            },
-            "sign up - Safari_0": {
-                "label": "sign up - Safari",
-                "days": ["2020-01-02", "2020-01-03", "2020-01-04",],
-                "data": [12.0, 11.0, 8.0],
-            },
-        }
+    def _run_in_one_and_two_passes(self, **filter_data) -> Tuple[List[Dict], List[Dict], List[str]]:
         filter = Filter(
             data={
-                "date_from": "2020-01-02",
-                "date_to": "2020-01-04",
-                "events": [{"id": "sign up", "name": "sign up"},],
+                "date_from": "2020-01-01",
+                "date_to": "2020-01-05",
+                "events": [{"id": "sign up"}],
+                "breakdown": "$browser",
+                "breakdown_limit": 3,
+                **filter_data,
             },
             team=self.team,
         )
-
-        result = [
-            {"label": "sign up - Chrome", "data": [15.0, 12.0],},
-            {"label": "sign up - Safari", "data": [15.0, 9.0],},
-        ]
-
-        merged_result, _ = Trends().merge_results(result, fake_cached, 0, filter, self.team)
-
-        self.assertEqual(merged_result[0]["data"], [23.0, 15.0, 12.0])
-        self.assertEqual(merged_result[1]["data"], [12.0, 11.0, 9.0])
+        expected = Trends().run(filter, self.team)
+        with override_instance_config("SINGLE_PASS_BREAKDOWN_TEAMS", "all"), self.capture_select_queries() as queries:
+            result = Trends().run(filter, self.team)
+        return result, expected, [query for query in queries if "FROM events" in query]
+
+    def test_top_values_are_picked_in_the_breakdown_query(self):
+        for filter_data in [{}, {"events": [{"id": "sign up", "math": "dau"}]}, {"display": TRENDS_TABLE}]:
+            result, expected, queries = self._run_in_one_and_two_passes(**filter_data)
+
+            self.assertEqual(len(queries), 1, filter_data)
+            self.assertEqual(result, expected)
+            self.assertEqual([series["breakdown_value"] for series in result], ["Chrome", "Firefox", "Safari"])
+
+        result, _, _ = self._run_in_one_and_two_passes()
+        self.assertEqual(result[0]["data"], [1.0, 1.0, 1.0, 1.0, 0.0])
+
+    def test_breakdowns_that_need_their_values_beforehand_take_two_passes(self):
+        for filter_data in [
+            {"breakdown_histogram_bin_count": 2, "breakdown": "duration"},
+            {"events": [{"id": "sign up", "math": "avg", "math_property": "duration"}]},
+        ]:
+            result, expected, queries = self._run_in_one_and_two_passes(**filter_data)
+
+            self.assertEqual(len(queries), 2, filter_data)
+            self.assertEqual(result, expected)
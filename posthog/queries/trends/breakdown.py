@@ -33,17 +33,22 @@ from posthog.queries.column_optimizer.column_optimizer import ColumnOptimizer
 from posthog.queries.groups_join_query import GroupsJoinQuery
 from posthog.queries.person_distinct_id_query import get_team_distinct_ids_query
 from posthog.queries.person_query import PersonQuery
+from posthog.queries.sampling import get_sample_clause
 from posthog.queries.session_query import SessionQuery
 from posthog.queries.trends.sql import (
     BREAKDOWN_ACTIVE_USER_CONDITIONS_SQL,
     BREAKDOWN_ACTIVE_USER_INNER_SQL,
     BREAKDOWN_AGGREGATE_QUERY_SQL,
+    BREAKDOWN_ALL_VALUES_FILTER_SQL,
     BREAKDOWN_COHORT_JOIN_SQL,
     BREAKDOWN_CUMULATIVE_INNER_SQL,
     BREAKDOWN_HISTOGRAM_PROP_JOIN_SQL,
     BREAKDOWN_INNER_SQL,
     BREAKDOWN_PROP_JOIN_SQL,
     BREAKDOWN_QUERY_SQL,
+    BREAKDOWN_SINGLE_PASS_AGGREGATE_QUERY_SQL,
+    BREAKDOWN_SINGLE_PASS_INNER_SQL,
+    BREAKDOWN_SINGLE_PASS_QUERY_SQL,
     SESSION_MATH_BREAKDOWN_AGGREGATE_QUERY_SQL,
     SESSION_MATH_BREAKDOWN_INNER_SQL,
 )
@@ -71,6 +76,24 @@ class TrendsBreakdown:
         self.column_optimizer = column_optimizer or ColumnOptimizer(self.filter, self.team_id)
         self.using_person_on_events = using_person_on_events
 
+    @cached_property
+    def _uses_single_pass(self) -> bool:
+        "Whether the top breakdown values are picked by the breakdown query itself, rather than by a query beforehand."
+        return (
+            self.team.single_pass_breakdowns_enabled
+            and self.filter.breakdown_type != "cohort"
+            and not self.filter.using_histogram
+            and self.entity.math_property != "$session_duration"
+            and (
+                self.filter.display in NON_TIME_SERIES_DISPLAY_TYPES
+                # Values are ranked by adding up what they're ranked by in every interval
+                or (
+                    self.entity.math in [None, "total", "dau", "sum"]
+                    and not (self.filter.display == TRENDS_CUMULATIVE and self.entity.math == "dau")
+                )
+            )
+        )
+
     @cached_property
     def _person_properties_mode(self) -> PersonPropertiesMode:
         return (
@@ -149,15 +172,16 @@ class TrendsBreakdown:
         }
 
         _params, _breakdown_filter_params = {}, {}
+        rank_operation = "count(*)" if self.entity.math == "dau" else aggregate_operation
 
         if self.filter.breakdown_type == "cohort":
             _params, breakdown_filter, _breakdown_filter_params, breakdown_value = self._breakdown_cohort_params()
         else:
             _params, breakdown_filter, _breakdown_filter_params, breakdown_value = self._breakdown_prop_params(
-                "count(*)" if self.entity.math == "dau" else aggregate_operation, math_params,
+                rank_operation, math_params,
             )
 
-        if len(_params["values"]) == 0:
+        if not self._uses_single_pass and len(_params["values"]) == 0:
             # If there are no breakdown values, we are sure that there's no relevant events, so instead of adjusting
             # a "real" SELECT for this, we only include the below dummy SELECT.
             # It's a drop-in replacement for a "real" one, simply always returning 0 rows.
@@ -182,15 +206,28 @@ class TrendsBreakdown:
                 # generalise this query to work for everything, not just sessions.
                 content_sql = SESSION_MATH_BREAKDOWN_AGGREGATE_QUERY_SQL.format(
                     breakdown_filter=breakdown_filter,
+                    sample_clause=get_sample_clause(self.filter),
+                    person_join=person_join_condition,
+                    groups_join=groups_join_condition,
+                    sessions_join_condition=sessions_join_condition,
+                    aggregate_operation=aggregate_operation,
+                    breakdown_value=breakdown_value,
+                )
+            elif self._uses_single_pass:
+                content_sql = BREAKDOWN_SINGLE_PASS_AGGREGATE_QUERY_SQL.format(
+                    breakdown_filter=breakdown_filter,
+                    sample_clause=get_sample_clause(self.filter),
                     person_join=person_join_condition,
                     groups_join=groups_join_condition,
                     sessions_join_condition=sessions_join_condition,
                     aggregate_operation=aggregate_operation,
+                    rank_operation=rank_operation,
                     breakdown_value=breakdown_value,
                 )
             else:
                 content_sql = BREAKDOWN_AGGREGATE_QUERY_SQL.format(
                     breakdown_filter=breakdown_filter,
+                    sample_clause=get_sample_clause(self.filter),
                     person_join=person_join_condition,
                     groups_join=groups_join_condition,
                     sessions_join_condition=sessions_join_condition,
@@ -216,6 +253,7 @@ class TrendsBreakdown:
                 )
                 inner_sql = BREAKDOWN_ACTIVE_USER_INNER_SQL.format(
                     breakdown_filter=breakdown_filter,
+                    sample_clause=get_sample_clause(self.filter),
                     person_join=person_join_condition,
                     groups_join=groups_join_condition,
                     sessions_join=sessions_join_condition,
@@ -231,6 +269,7 @@ class TrendsBreakdown:
             elif self.filter.display == TRENDS_CUMULATIVE and self.entity.math == "dau":
                 inner_sql = BREAKDOWN_CUMULATIVE_INNER_SQL.format(
                     breakdown_filter=breakdown_filter,
+                    sample_clause=get_sample_clause(self.filter),
                     person_join=person_join_condition,
                     groups_join=groups_join_condition,
                     sessions_join=sessions_join_condition,
@@ -246,6 +285,7 @@ class TrendsBreakdown:
                 # generalise this query to work for everything, not just sessions.
                 inner_sql = SESSION_MATH_BREAKDOWN_INNER_SQL.format(
                     breakdown_filter=breakdown_filter,
+                    sample_clause=get_sample_clause(self.filter),
                     person_join=person_join_condition,
                     groups_join=groups_join_condition,
                     sessions_join=sessions_join_condition,
@@ -254,9 +294,23 @@ class TrendsBreakdown:
                     breakdown_value=breakdown_value,
                     start_of_week_fix=start_of_week_fix(self.filter),
                 )
+            elif self._uses_single_pass:
+                inner_sql = BREAKDOWN_SINGLE_PASS_INNER_SQL.format(
+                    breakdown_filter=breakdown_filter,
+                    sample_clause=get_sample_clause(self.filter),
+                    person_join=person_join_condition,
+                    groups_join=groups_join_condition,
+                    sessions_join=sessions_join_condition,
+                    aggregate_operation=aggregate_operation,
+                    rank_operation=rank_operation,
+                    interval_annotation=interval_annotation,
+                    breakdown_value=breakdown_value,
+                    start_of_week_fix=start_of_week_fix(self.filter),
+                )
             else:
                 inner_sql = BREAKDOWN_INNER_SQL.format(
                     breakdown_filter=breakdown_filter,
+                    sample_clause=get_sample_clause(self.filter),
                     person_join=person_join_condition,
                     groups_join=groups_join_condition,
                     sessions_join=sessions_join_condition,
@@ -266,9 +320,9 @@ class TrendsBreakdown:
                     start_of_week_fix=start_of_week_fix(self.filter),
                 )
 
-            breakdown_query = BREAKDOWN_QUERY_SQL.format(
-                interval=interval_annotation, num_intervals=num_intervals, inner_sql=inner_sql,
-            )
+            breakdown_query = (
+                BREAKDOWN_SINGLE_PASS_QUERY_SQL if self._uses_single_pass else BREAKDOWN_QUERY_SQL
+            ).format(interval=interval_annotation, num_intervals=num_intervals, inner_sql=inner_sql)
             self.params.update(
                 {"seconds_in_interval": seconds_in_interval, "num_intervals": num_intervals,}
             )
@@ -286,6 +340,18 @@ class TrendsBreakdown:
         return params, breakdown_filter, breakdown_filter_params, "value"
 
     def _breakdown_prop_params(self, aggregate_operation: str, math_params: Dict):
+        # :TRICKY: We only support string breakdown for event/person properties
+        assert isinstance(self.filter.breakdown, str)
+
+        breakdown_value = self._get_breakdown_value(self.filter.breakdown)
+        if self._uses_single_pass:
+            return (
+                {"limit": self.filter.breakdown_limit_or_default, "offset": self.filter.offset},
+                BREAKDOWN_ALL_VALUES_FILTER_SQL,
+                {},
+                breakdown_value,
+            )
+
         values_arr = get_breakdown_prop_values(
             self.filter,
             self.entity,
@@ -296,10 +362,6 @@ class TrendsBreakdown:
             person_properties_mode=self._person_properties_mode,
         )
 
-        # :TRICKY: We only support string breakdown for event/person properties
-        assert isinstance(self.filter.breakdown, str)
-
-        breakdown_value = self._get_breakdown_value(self.filter.breakdown)
         numeric_property_filter = ""
         if self.filter.using_histogram:
             numeric_property_filter = f"AND {breakdown_value} is not null"
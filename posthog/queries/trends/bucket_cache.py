@@ -0,0 +1,218 @@
+"""
+Caches trends results interval bucket by interval bucket, so that refreshing an insight only computes the buckets that
+aren't cached yet or can still change, however long its date range.
+
+Buckets are keyed by the filter without its date range, so that any date range, and the previous period of compare
+mode, reuses the buckets computed for any other. The results for the buckets that are missing are queried for in one
+go, from the first one that's missing up to the end of the date range, and merged with the cached ones before they're
+parsed. Only buckets that are entirely within the date range and that ended at least `OPEN_BUCKET_GRACE` ago are
+cached, as events still come in for the ones that didn't.
+
+Breakdown queries aren't cached, as the breakdown values they show are the top ones over the whole date range, which
+any bucket can change.
+"""
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple, cast
+
+import pytz
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from posthog.constants import (
+    MONTHLY_ACTIVE,
+    NON_TIME_SERIES_DISPLAY_TYPES,
+    TRENDS_CUMULATIVE,
+    TRENDS_LIFECYCLE,
+    WEEKLY_ACTIVE,
+)
+from posthog.models.entity import Entity
+from posthog.models.filters import Filter
+from posthog.models.filters.mixins.utils import cached_property
+from posthog.models.team import Team
+from posthog.queries.util import get_time_diff
+from posthog.utils import generate_cache_key
+
+# Events of the last hour may still be on their way
+OPEN_BUCKET_GRACE = timedelta(hours=1)
+
+INTERVAL_DELTAS: Dict[str, relativedelta] = {
+    "hour": relativedelta(hours=1),
+    "day": relativedelta(days=1),
+    "week": relativedelta(weeks=1),
+    "month": relativedelta(months=1),
+}
+
+# Don't change the results of any single bucket
+FILTER_KEYS_IGNORED = ["date_from", "date_to", "compare", "display", "insight"]
+
+
+class TrendsBucketCache:
+    def __init__(self, filter: Filter, team: Team, entity: Entity):
+        self.filter = filter
+        self.team = team
+        self.entity = entity
+        self._buckets: List[datetime] = []
+        self._cached: Dict[str, Dict[str, Any]] = {}
+
+    @cached_property
+    def enabled(self) -> bool:
+        "Whether every bucket of the query is computed on its own, rather than depending on the rest of the range."
+        return (
+            self.filter.date_from is not None
+            and self.filter.interval in INTERVAL_DELTAS
+            and not self.filter.breakdown
+            and self.filter.display not in NON_TIME_SERIES_DISPLAY_TYPES
+            and self.filter.shown_as != TRENDS_LIFECYCLE
+            and not self.filter.formula
+            and self.filter.smoothing_intervals <= 1
+            and not self.filter.using_histogram
+            and self.entity.math not in [WEEKLY_ACTIVE, MONTHLY_ACTIVE]
+            and self.entity.math_property != "$session_duration"
+            # Counts people the first time they're seen within the range
+            and not (self.filter.display == TRENDS_CUMULATIVE and self.entity.math == "dau")
+            and self.team.strict_caching_enabled
+        )
+
+    def query_filter(self) -> Optional[Filter]:
+        "The filter to query for the buckets that aren't cached, or None if they all are. Loads the cached buckets."
+        if not self.enabled:
+            return self.filter
+
+        self._buckets = self._enumerate_buckets()
+        cacheable = self._cacheable_buckets()
+        cached = cache.get_many([self._bucket_key(bucket) for bucket in cacheable])
+
+        for bucket in self._buckets:
+            entry = cached.get(self._bucket_key(bucket)) if bucket in cacheable else None
+            if entry is None:
+                break
+            self._cached[self._day(bucket)] = entry
+
+        missing = self._buckets[len(self._cached) :]
+        if not self._cached:
+            return self.filter
+        if not missing:
+            return None
+        date_from = self._localize(missing[0]).astimezone(pytz.UTC)
+        return self.filter.with_data({"date_from": date_from.strftime("%Y-%m-%dT%H:%M:%S")})
+
+    def merge(self, rows: List) -> Optional[List]:
+        """
+        Caches the buckets of the rows that can be, and fills in the cached ones, for rows of the whole date range.
+        Returns None if the rows are missing buckets after all, which then need to be queried for over the whole range.
+        """
+        if not self.enabled:
+            return rows
+
+        fresh: Dict[str, Tuple[Any, Any]] = {}
+        for row in rows:
+            dates, counts = row[0], row[1]
+            fresh.update({self._day(date): (date, count) for date, count in zip(dates, counts)})
+
+        self._store(fresh)
+
+        if not self._cached:
+            return rows
+
+        dates, counts = [], []
+        for bucket in self._buckets:
+            day = self._day(bucket)
+            if day in self._cached:
+                date, count = self._cached[day]["date"], self._cached[day]["count"]
+            elif day in fresh:
+                date, count = fresh[day]
+            else:
+                # e.g. an hour skipped by daylight saving time
+                self._cached = {}
+                return None
+            dates.append(date)
+            counts.append(count)
+        return [(dates, counts)]
+
+    def _store(self, fresh: Dict[str, Tuple[Any, Any]]) -> None:
+        entries = {}
+        for bucket in self._cacheable_buckets():
+            day = self._day(bucket)
+            if day in self._cached or day not in fresh:
+                continue
+            date, count = fresh[day]
+            entries[self._bucket_key(bucket)] = {"date": date, "count": count}
+        if entries:
+            cache.set_many(entries, settings.CACHED_RESULTS_TTL)
+
+    @cached_property
+    def _key_prefix(self) -> str:
+        filter_dict = {key: value for key, value in self.filter.to_dict().items() if key not in FILTER_KEYS_IGNORED}
+        return generate_cache_key(
+            "trends_buckets_{}_{}_{}_{}".format(
+                json.dumps(filter_dict, sort_keys=True, default=str),
+                json.dumps(self.entity.to_dict(), sort_keys=True, default=str),
+                self.team.pk,
+                self.team.timezone,
+            )
+        )
+
+    def _bucket_key(self, bucket: datetime) -> str:
+        return f"{self._key_prefix}_{self._day(bucket)}"
+
+    def _day(self, bucket: datetime) -> str:
+        # The way buckets are labelled in results, which ClickHouse returns in the team's timezone
+        return bucket.strftime("%Y-%m-%d{}".format(" %H:%M:%S" if self.filter.interval == "hour" else ""))
+
+    def _enumerate_buckets(self) -> List[datetime]:
+        "The starts of the buckets of the date range, in the wall-clock time of the team's timezone."
+        buckets = []
+        bucket = self._truncate(self._local_date_from)
+        while bucket <= self._local_date_to:
+            buckets.append(bucket)
+            bucket += INTERVAL_DELTAS[self.filter.interval]
+        return buckets
+
+    def _cacheable_buckets(self) -> List[datetime]:
+        "The buckets that are entirely within the date range, and done with."
+        closed_before = timezone.now() - OPEN_BUCKET_GRACE
+        return [
+            bucket
+            for bucket in self._buckets
+            if bucket >= self._local_date_from
+            and bucket + INTERVAL_DELTAS[self.filter.interval] <= self._local_date_to + timedelta(seconds=1)
+            and self._localize(bucket + INTERVAL_DELTAS[self.filter.interval]) <= closed_before
+        ]
+
+    @cached_property
+    def _local_date_from(self) -> datetime:
+        date_from = self._to_local(cast(datetime, self.filter.date_from), self.filter.date_from_has_explicit_time)
+        # Like queries do, ranges of a couple of intervals or more start at the start of the first one
+        _, _, round_interval = get_time_diff(
+            self.filter.interval, self.filter.date_from, self.filter.date_to, team_id=self.team.pk
+        )
+        return self._truncate(date_from) if round_interval else date_from
+
+    @cached_property
+    def _local_date_to(self) -> datetime:
+        return self._to_local(self.filter.date_to, self.filter.date_to_has_explicit_time or not self.filter._date_to)
+
+    def _to_local(self, moment: datetime, explicit_time: bool) -> datetime:
+        if explicit_time:
+            if moment.tzinfo is None:
+                moment = moment.replace(tzinfo=pytz.UTC)
+            return moment.astimezone(pytz.timezone(self.team.timezone)).replace(tzinfo=None)
+        # Dates without a time are dates in the team's timezone
+        return moment.replace(tzinfo=None)
+
+    def _localize(self, bucket: datetime) -> datetime:
+        return pytz.timezone(self.team.timezone).localize(bucket)
+
+    def _truncate(self, moment: datetime) -> datetime:
+        if self.filter.interval == "hour":
+            return moment.replace(minute=0, second=0, microsecond=0)
+        start_of_day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        if self.filter.interval == "week":
+            # Weeks start on Sunday
+            return start_of_day - timedelta(days=(start_of_day.weekday() + 1) % 7)
+        if self.filter.interval == "month":
+            return start_of_day.replace(day=1)
+        return start_of_day
@@ -0,0 +1,98 @@
+"""
+Reads trends that count events, or the unique users doing them, from `events_rollup`, the hourly rollup of events by
+event, rather than from the events themselves.
+
+Rows of the rollup are whole hours in UTC, so they only add up to the same results as events do for date ranges that
+start and end on whole hours, and intervals that do so in the team's timezone, i.e. in any timezone that's a whole
+number of hours off UTC. Unique users are counted by distinct id, with `uniq`, so only for teams that already trade
+accuracy for speed with `AGGREGATE_BY_DISTINCT_IDS_TEAMS`.
+"""
+from datetime import datetime
+from typing import Any, Dict, Tuple
+
+import pytz
+
+from posthog.constants import TREND_FILTER_TYPE_EVENTS, TRENDS_CUMULATIVE
+from posthog.models.entity import Entity
+from posthog.models.entity.util import get_entity_filtering_params
+from posthog.models.filters import Filter
+from posthog.models.filters.mixins.utils import cached_property
+from posthog.models.team import Team
+from posthog.queries.trends.sql import EVENTS_ROLLUP_QUERY_SQL
+from posthog.queries.util import date_from_clause, get_time_diff, get_trunc_func_ch, parse_timestamps
+
+
+class EventsRollupQuery:
+    def __init__(self, filter: Filter, entity: Entity, team: Team):
+        self._filter = filter
+        self._entity = entity
+        self._team = team
+
+    @cached_property
+    def is_eligible(self) -> bool:
+        "Whether the rollup has the same results as the events table for the query."
+        return (
+            self._team.events_rollup_enabled
+            and self._entity.type == TREND_FILTER_TYPE_EVENTS
+            and (
+                self._entity.math in [None, "total"]
+                or (self._entity.math == "dau" and self._team.aggregate_users_by_distinct_id)
+            )
+            and not self._filter.breakdown
+            and not self._filter.property_groups.values
+            and not self._entity.property_groups.values
+            and not self._filter.filter_test_accounts
+            and not self._filter.sampling_factor
+            # Counts people the first time they're seen within the range
+            and not (self._filter.display == TRENDS_CUMULATIVE and self._entity.math == "dau")
+            and self._date_range_is_whole_hours
+        )
+
+    @property
+    def aggregate_operation(self) -> str:
+        return "uniqMerge(distinct_ids)" if self._entity.math == "dau" else "sum(event_count)"
+
+    def get_query(self) -> Tuple[str, Dict[str, Any]]:
+        "A query of the rollup with the columns VOLUME_SQL and VOLUME_TOTAL_AGGREGATE_SQL need of an event query."
+        entity_params, entity_format_params = get_entity_filtering_params(self._entity, self._team.pk)
+        query = EVENTS_ROLLUP_QUERY_SQL.format(
+            parsed_date_from=date_from_clause(get_trunc_func_ch(self._filter.interval), self._round_interval),
+            parsed_date_to=self._parsed_date_to,
+            **entity_format_params,
+        )
+        return query, {**self._date_params, **entity_params}
+
+    @cached_property
+    def _round_interval(self) -> bool:
+        _, _, round_interval = get_time_diff(
+            self._filter.interval, self._filter.date_from, self._filter.date_to, team_id=self._team.pk
+        )
+        return round_interval
+
+    @cached_property
+    def _timestamps(self) -> Tuple[str, str, Dict[str, Any]]:
+        return parse_timestamps(filter=self._filter, team=self._team)
+
+    @property
+    def _parsed_date_to(self) -> str:
+        return self._timestamps[1]
+
+    @property
+    def _date_params(self) -> Dict[str, Any]:
+        return self._timestamps[2]
+
+    @property
+    def _date_range_is_whole_hours(self) -> bool:
+        date_from, date_to = self._date_params.get("date_from"), self._date_params["date_to"]
+        # Ranges of a couple of intervals or more start at the start of the first interval
+        if date_from is not None and not self._round_interval and not date_from.endswith(":00:00"):
+            return False
+        # Without an end, ranges end now, and the rollup of the hour has every event of it so far
+        if self._filter._date_to and not date_to.endswith(":59:59"):
+            return False
+        timezone = pytz.timezone(self._team.timezone)
+        return all(
+            timezone.utcoffset(datetime.strptime(moment, "%Y-%m-%d %H:%M:%S"), is_dst=False).total_seconds() % 3600 == 0
+            for moment in [date_from, date_to]
+            if moment is not None
+        )
@@ -48,6 +48,12 @@ SELECT groupArray(day_start) as date, groupArray({aggregate}) as data FROM (
 SETTINGS timeout_before_checking_execution_speed = 60
 """
 
+# Stands in for the event query of VOLUME_SQL and VOLUME_TOTAL_AGGREGATE_SQL, with a row per event and hour
+EVENTS_ROLLUP_QUERY_SQL = """
+SELECT hour as timestamp, event_count, distinct_ids FROM events_rollup
+WHERE team_id = %(team_id)s {entity_query} {parsed_date_from} {parsed_date_to}
+"""
+
 CUMULATIVE_SQL = """
 SELECT person_id, min(timestamp) as timestamp
 FROM ({event_query}) GROUP BY person_id
@@ -58,7 +64,7 @@ SELECT groupArray(value) FROM (
     SELECT
         {value_expression},
         {aggregate_operation} as count
-    FROM events e
+    FROM events e {sample_clause}
     {person_join_clauses}
     {groups_join_clauses}
     {sessions_join_clauses}
@@ -75,7 +81,7 @@ SELECT {bucketing_expression} FROM (
     SELECT
         {value_expression},
         {aggregate_operation} as count
-    FROM events e
+    FROM events e {sample_clause}
     {person_join_clauses}
     {groups_join_clauses}
     {sessions_join_clauses}
@@ -149,12 +155,51 @@ GROUP BY breakdown_value
 ORDER BY breakdown_value
 """
 
+# Picks the top breakdown values in the same pass as it computes their totals, ranking values by the sum of their
+# `rank_total` over every interval. Intervals are zero filled like in BREAKDOWN_QUERY_SQL.
+BREAKDOWN_SINGLE_PASS_QUERY_SQL = """
+SELECT
+    arraySort(arrayDistinct(arrayConcat(ticks, value_days))) AS date,
+    arrayMap(day -> arraySum(arrayFilter((total, value_day) -> value_day = day, totals, value_days)), date) AS data,
+    breakdown_value
+FROM (
+    SELECT groupArray(day_start) AS value_days, groupArray(total) AS totals, sum(rank_total) AS breakdown_rank, breakdown_value
+    FROM ({inner_sql})
+    GROUP BY breakdown_value
+    ORDER BY breakdown_rank DESC, breakdown_value DESC
+    LIMIT %(limit)s OFFSET %(offset)s
+)
+CROSS JOIN (
+    SELECT groupArray(day_start) AS ticks FROM (
+        SELECT {interval}(toDateTime(%(date_to)s, %(timezone)s) - number * %(seconds_in_interval)s) AS day_start
+        FROM numbers({num_intervals})
+        UNION ALL
+        SELECT {interval}(toDateTime(%(date_from)s, %(timezone)s)) AS day_start
+    )
+)
+ORDER BY breakdown_value
+"""
+
+BREAKDOWN_SINGLE_PASS_INNER_SQL = """
+SELECT
+    {aggregate_operation} as total,
+    {rank_operation} as rank_total,
+    {interval_annotation}(timestamp, {start_of_week_fix} %(timezone)s) as day_start,
+    {breakdown_value} as breakdown_value
+FROM events e {sample_clause}
+{person_join}
+{groups_join}
+{sessions_join}
+{breakdown_filter}
+GROUP BY day_start, breakdown_value
+"""
+
 BREAKDOWN_INNER_SQL = """
 SELECT
     {aggregate_operation} as total,
     {interval_annotation}(timestamp, {start_of_week_fix} %(timezone)s) as day_start,
     {breakdown_value} as breakdown_value
-FROM events e
+FROM events e {sample_clause}
 {person_join}
 {groups_join}
 {sessions_join}
@@ -169,7 +214,7 @@ FROM (
     SELECT any(session_duration) as session_duration, day_start, breakdown_value FROM (
         SELECT $session_id, session_duration, {interval_annotation}(timestamp, {start_of_week_fix} %(timezone)s) as day_start,
             {breakdown_value} as breakdown_value
-        FROM events e
+        FROM events e {sample_clause}
         {person_join}
         {groups_join}
         {sessions_join}
@@ -196,7 +241,7 @@ FROM (
         timestamp,
         {breakdown_value} as breakdown_value
         FROM
-        events e
+        events e {sample_clause}
         {person_join}
         {groups_join}
         {sessions_join}
@@ -215,7 +260,7 @@ FROM (
     ) d
     CROSS JOIN (
         SELECT toStartOfDay(toDateTime(timestamp), %(timezone)s) as timestamp, {person_id_alias}.person_id AS person_id, {breakdown_value} as breakdown_value
-        FROM events e
+        FROM events e {sample_clause}
         {person_join}
         {groups_join}
         {sessions_join}
@@ -231,7 +276,7 @@ FROM (
 
 BREAKDOWN_AGGREGATE_QUERY_SQL = """
 SELECT {aggregate_operation} AS total, {breakdown_value} AS breakdown_value
-FROM events e
+FROM events e {sample_clause}
 {person_join}
 {groups_join}
 {sessions_join_condition}
@@ -241,12 +286,28 @@ ORDER BY breakdown_value
 """
 
 
+BREAKDOWN_SINGLE_PASS_AGGREGATE_QUERY_SQL = """
+SELECT total, breakdown_value FROM (
+    SELECT {aggregate_operation} AS total, {rank_operation} AS breakdown_rank, {breakdown_value} AS breakdown_value
+    FROM events e {sample_clause}
+    {person_join}
+    {groups_join}
+    {sessions_join_condition}
+    {breakdown_filter}
+    GROUP BY breakdown_value
+    ORDER BY breakdown_rank DESC, breakdown_value DESC
+    LIMIT %(limit)s OFFSET %(offset)s
+)
+ORDER BY breakdown_value
+"""
+
+
 SESSION_MATH_BREAKDOWN_AGGREGATE_QUERY_SQL = """
 SELECT {aggregate_operation} AS total, breakdown_value
 FROM (
     SELECT any(session_duration) as session_duration, breakdown_value FROM (
         SELECT $session_id, session_duration, {breakdown_value} AS breakdown_value FROM
-            events e
+            events e {sample_clause}
             {person_join}
             {groups_join}
             {sessions_join_condition}
@@ -268,6 +329,11 @@ WHERE e.team_id = %(team_id)s {event_filter} {filters} {parsed_date_from} {parse
   {actions_query}
 """
 
+BREAKDOWN_ALL_VALUES_FILTER_SQL = """
+WHERE e.team_id = %(team_id)s {event_filter} {filters} {parsed_date_from} {parsed_date_to}
+  {actions_query}
+"""
+
 BREAKDOWN_HISTOGRAM_PROP_JOIN_SQL = """
 WHERE e.team_id = %(team_id)s {event_filter} {filters} {parsed_date_from} {parsed_date_to} {numeric_property_filter}
   {actions_query}
@@ -9,6 +9,7 @@ from posthog.models.entity import Entity
 from posthog.models.event.sql import NULL_SQL
 from posthog.models.filters import Filter
 from posthog.models.team import Team
+from posthog.queries.trends.rollup import EventsRollupQuery
 from posthog.queries.trends.sql import (
     ACTIVE_USER_SQL,
     AGGREGATE_SQL,
@@ -29,19 +30,25 @@ class TrendsTotalVolume:
 
         trunc_func = get_trunc_func_ch(filter.interval)
         interval_func = get_interval_func_ch(filter.interval)
-        aggregate_operation, join_condition, math_params = process_math(entity, team, person_id_alias="person_id")
-
-        trend_event_query = TrendsEventQuery(
-            filter=filter,
-            entity=entity,
-            team=team,
-            should_join_distinct_ids=True
-            if join_condition != ""
-            or (entity.math in [WEEKLY_ACTIVE, MONTHLY_ACTIVE] and not team.aggregate_users_by_distinct_id)
-            else False,
-            using_person_on_events=team.actor_on_events_querying_enabled,
-        )
-        event_query, event_query_params = trend_event_query.get_query()
+
+        rollup_query = EventsRollupQuery(filter=filter, entity=entity, team=team)
+        if rollup_query.is_eligible:
+            aggregate_operation, math_params = rollup_query.aggregate_operation, {}
+            event_query, event_query_params = rollup_query.get_query()
+        else:
+            aggregate_operation, join_condition, math_params = process_math(entity, team, person_id_alias="person_id")
+
+            trend_event_query = TrendsEventQuery(
+                filter=filter,
+                entity=entity,
+                team=team,
+                should_join_distinct_ids=True
+                if join_condition != ""
+                or (entity.math in [WEEKLY_ACTIVE, MONTHLY_ACTIVE] and not team.aggregate_users_by_distinct_id)
+                else False,
+                using_person_on_events=team.actor_on_events_querying_enabled,
+            )
+            event_query, event_query_params = trend_event_query.get_query()
 
         content_sql_params = {
             "aggregate_operation": aggregate_operation,
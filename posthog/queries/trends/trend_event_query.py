@@ -9,6 +9,7 @@ from posthog.models.property.util import get_property_string_expr
 from posthog.models.utils import PersonPropertiesMode
 from posthog.queries.event_query import EventQuery
 from posthog.queries.person_query import PersonQuery
+from posthog.queries.sampling import get_sample_clause
 from posthog.queries.trends.util import get_active_user_params
 from posthog.queries.util import date_from_clause, get_time_diff, get_trunc_func_ch, parse_timestamps
 
@@ -87,7 +88,7 @@ class TrendsEventQuery(EventQuery):
         self.params.update(session_params)
 
         query = f"""
-            SELECT {_fields} FROM events {self.EVENT_TABLE_ALIAS}
+            SELECT {_fields} FROM events {self.EVENT_TABLE_ALIAS} {get_sample_clause(self._filter)}
             {self._get_distinct_id_query()}
             {person_query}
             {groups_query}
@@ -1,29 +1,17 @@
 import copy
-import threading
-from datetime import datetime, timedelta
 from itertools import accumulate
-from typing import (
-    Any,
-    Callable,
-    Dict,
-    List,
-    Optional,
-    Tuple,
-    Union,
-    cast,
-)
+from typing import Any, Callable, Dict, List, Tuple, cast
 
-import pytz
-from dateutil import parser
 from django.db.models.query import Prefetch
 
+from posthog.clickhouse.query_executor import query_executor
 from posthog.client import sync_execute
 from posthog.constants import (
     NON_BREAKDOWN_DISPLAY_TYPES,
+    SAMPLING_FACTOR,
     TREND_FILTER_TYPE_ACTIONS,
     TRENDS_CUMULATIVE,
     TRENDS_LIFECYCLE,
-    TRENDS_LINEAR,
 )
 from posthog.models.action import Action
 from posthog.models.action_step import ActionStep
@@ -31,11 +19,12 @@ from posthog.models.entity import Entity
 from posthog.models.filters import Filter
 from posthog.models.team import Team
 from posthog.queries.base import handle_compare
+from posthog.queries.sampling import scale_trends_results
 from posthog.queries.trends.breakdown import TrendsBreakdown
+from posthog.queries.trends.bucket_cache import TrendsBucketCache
 from posthog.queries.trends.formula import TrendsFormula
 from posthog.queries.trends.lifecycle import Lifecycle
 from posthog.queries.trends.total_volume import TrendsTotalVolume
-from posthog.utils import generate_cache_key, get_safe_cache
 
 
 class Trends(TrendsTotalVolume, Lifecycle, TrendsFormula):
@@ -51,141 +40,50 @@ class Trends(TrendsTotalVolume, Lifecycle, TrendsFormula):
 
         return sql, params, parse_function
 
-    # Use cached result even on refresh if team has strict caching enabled
-    def get_cached_result(self, filter: Filter, team: Team) -> Optional[List[Dict[str, Any]]]:
-
-        if not team.strict_caching_enabled or filter.breakdown or filter.display != TRENDS_LINEAR:
-            return None
-
-        cache_key = generate_cache_key(f"{filter.toJSON()}_{team.pk}")
-        cached_result_package = get_safe_cache(cache_key)
-        cached_result = (
-            cached_result_package.get("result")
-            if cached_result_package and isinstance(cached_result_package, dict)
-            else None
-        )
-
-        if not cached_result:
-            return None
-
-        _is_present = self.is_present_timerange(cached_result, filter, team)
-
-        return cached_result if _is_present else None
-
-    # Determine if the current timerange is present in the cache
-    def is_present_timerange(self, cached_result: List[Dict[str, Any]], filter: Filter, team: Team) -> bool:
-        if (
-            len(cached_result) > 0
-            and cached_result[0].get("days")
-            and cached_result[0].get("data")
-            and len(cached_result[0]["days"]) > 0
-            and len(cached_result[0]["days"]) == len(cached_result[0]["data"])
-        ):
-            latest_date = cached_result[0]["days"][len(cached_result[0]["days"]) - 1]
-
-            parsed_latest_date = parser.parse(latest_date)
-            parsed_latest_date = parsed_latest_date.replace(tzinfo=pytz.timezone(team.timezone))
-            _is_present = is_filter_date_present(filter, parsed_latest_date)
+    def _get_query_for_entity(self, filter: Filter, team: Team, entity: Entity) -> Tuple[Callable[[], List], Callable]:
+        """
+        Returns a function querying for the results of the entity, from the buckets of the date range that were cached
+        if the team has strict caching enabled, and the function parsing them.
+        """
+        bucket_cache = TrendsBucketCache(filter, team, entity)
+        query_filter = bucket_cache.query_filter()
+
+        sql, params, parse_function = self._get_sql_for_entity(filter, team, entity)
+        if query_filter is not None and query_filter is not filter:
+            query_sql, query_params, _ = self._get_sql_for_entity(query_filter, team, entity)
         else:
-            _is_present = False
-
-        return _is_present
+            query_sql, query_params = sql, params
 
-    # Use a condensed filter if a cached result exists in the current timerange
-    def adjusted_filter(self, filter: Filter, team: Team) -> Tuple[Filter, Optional[Dict[str, Any]]]:
-        cached_result = self.get_cached_result(filter, team)
+        def query() -> List:
+            rows = bucket_cache.merge(sync_execute(query_sql, query_params) if query_filter is not None else [])
+            if rows is None:
+                rows = bucket_cache.merge(sync_execute(sql, params))
+            return cast(List, rows)
 
-        new_filter = filter.with_data({"date_from": interval_unit(filter.interval)}) if cached_result else filter
-
-        label_to_payload = {}
-        if cached_result:
-            for payload in cached_result:
-                label_to_payload[f'{payload["label"]}_{payload["action"]["order"]}'] = payload
-
-        return new_filter, label_to_payload
-
-    def merge_results(
-        self, result, cached_result: Optional[Dict[str, Any]], entity_order: int, filter: Filter, team: Team
-    ):
-        if cached_result and filter.display != TRENDS_CUMULATIVE:
-            new_res = []
-
-            for payload in result:
-                cached_series = cached_result.pop(f'{payload["label"]}_{entity_order}')
-                data = cached_series["data"]
-                data.pop()
-                data.append(payload["data"].pop())
-                cached_series["data"] = data
-                new_res.append(cached_series)
-
-            return new_res, cached_result
-        elif filter.display == TRENDS_CUMULATIVE:
-            return self._handle_cumulative(result), {}
-        else:
-            return result, {}
+        return query, parse_function
 
     def _run_query(self, filter: Filter, team: Team, entity: Entity) -> List[Dict[str, Any]]:
-        adjusted_filter, cached_result = self.adjusted_filter(filter, team)
-        sql, params, parse_function = self._get_sql_for_entity(adjusted_filter, team, entity)
-
-        result = sync_execute(sql, params)
-        result = parse_function(result)
-        serialized_data = self._format_serialized(entity, result)
-        merged_results, cached_result = self.merge_results(
-            serialized_data, cached_result, entity.order or entity.index, filter, team
-        )
-
-        if cached_result:
-            for value in cached_result.values():
-                merged_results.append(value)
-
-        return merged_results
-
-    def _run_query_for_threading(self, result: List, index: int, sql, params):
-        result[index] = sync_execute(sql, params)
+        query, parse_function = self._get_query_for_entity(filter, team, entity)
+        return self._format_result(filter, entity, parse_function(query()))
 
     def _run_parallel(self, filter: Filter, team: Team) -> List[Dict[str, Any]]:
-        result: List[Union[None, List[Dict[str, Any]]]] = [None] * len(filter.entities)
-        parse_functions: List[Union[None, Callable]] = [None] * len(filter.entities)
-        cached_result = None
-        jobs = []
-
-        for entity in filter.entities:
-            adjusted_filter, cached_result = self.adjusted_filter(filter, team)
-            sql, params, parse_function = self._get_sql_for_entity(adjusted_filter, team, entity)
-            parse_functions[entity.index] = parse_function
-            thread = threading.Thread(target=self._run_query_for_threading, args=(result, entity.index, sql, params),)
-            jobs.append(thread)
-
-        # Start the threads (i.e. calculate the random number lists)
-        for j in jobs:
-            j.start()
+        queries = [self._get_query_for_entity(filter, team, entity) for entity in filter.entities]
+        results: List[Any] = query_executor.run([query for query, _ in queries], team_id=team.pk)
 
-        # Ensure all of the threads have finished
-        for j in jobs:
-            j.join()
-
-        # Parse results for each thread
-        for entity in filter.entities:
-            serialized_data = cast(List[Callable], parse_functions)[entity.index](result[entity.index])
-            serialized_data = self._format_serialized(entity, serialized_data)
-            merged_results, cached_result = self.merge_results(
-                serialized_data, cached_result, entity.order or entity.index, filter, team
-            )
-            result[entity.index] = merged_results
-
-        # flatten results
         flat_results: List[Dict[str, Any]] = []
-        for item in result:
-            for flat in cast(List[Dict[str, Any]], item):
-                flat_results.append(flat)
-
-            if cached_result:
-                for value in cached_result.values():
-                    flat_results.append(value)
-
+        for entity, (_, parse_function), result in zip(filter.entities, queries, results):
+            flat_results.extend(self._format_result(filter, entity, parse_function(result)))
         return flat_results
 
+    def _format_result(self, filter: Filter, entity: Entity, result: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        serialized_data = self._format_serialized(entity, result)
+        if filter.display == TRENDS_CUMULATIVE:
+            serialized_data = self._handle_cumulative(serialized_data)
+        if filter.shown_as != TRENDS_LIFECYCLE:
+            # Lifecycle queries aren't sampled
+            serialized_data = scale_trends_results(serialized_data, filter, entity)
+        return serialized_data
+
     def run(self, filter: Filter, team: Team, *args, **kwargs) -> List[Dict[str, Any]]:
         actions = Action.objects.filter(team_id=team.pk).order_by("-id")
         if len(filter.actions) > 0:
@@ -193,6 +91,8 @@ class Trends(TrendsTotalVolume, Lifecycle, TrendsFormula):
         actions = actions.prefetch_related(Prefetch("steps", queryset=ActionStep.objects.order_by("id")))
 
         if filter.formula:
+            # Formulas can't be scaled back up like the counts they're computed from, so they aren't sampled
+            filter = filter.with_data({SAMPLING_FACTOR: None})
             return handle_compare(filter, self._run_formula_query, team)
 
         for entity in filter.entities:
@@ -234,29 +134,3 @@ class Trends(TrendsTotalVolume, Lifecycle, TrendsFormula):
         for metrics in entity_metrics:
             metrics.update(data=list(accumulate(metrics["data"])))
         return entity_metrics
-
-
-def is_filter_date_present(filter: Filter, latest_cached_datetime: datetime) -> bool:
-    diff = filter.date_to - latest_cached_datetime
-
-    if filter.interval == "hour":
-        return diff < timedelta(hours=1)
-    elif filter.interval == "day":
-        return diff < timedelta(days=1)
-    elif filter.interval == "week":
-        return diff < timedelta(weeks=1)
-    elif filter.interval == "month":
-        return diff < timedelta(days=30)
-
-
-def interval_unit(interval: str) -> str:
-    if interval == "hour":
-        return "-1hr"
-    if interval == "day":
-        return "-1d"
-    elif interval == "week":
-        return "-1w"
-    elif interval == "month":
-        return "-1m"
-    else:
-        raise ValueError("Invalid interval")
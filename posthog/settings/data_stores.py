@@ -97,6 +97,35 @@ CLICKHOUSE_ENABLE_STORAGE_POLICY = get_from_env("CLICKHOUSE_ENABLE_STORAGE_POLIC
 
 CLICKHOUSE_CONN_POOL_MIN = get_from_env("CLICKHOUSE_CONN_POOL_MIN", 20, type_cast=int)
 CLICKHOUSE_CONN_POOL_MAX = get_from_env("CLICKHOUSE_CONN_POOL_MAX", 1000, type_cast=int)
+# Number of query templates kept with their comments stripped, see `_prepare_query` in posthog/client.py
+CLICKHOUSE_PREPARED_QUERY_CACHE_SIZE = get_from_env("CLICKHOUSE_PREPARED_QUERY_CACHE_SIZE", 2000, type_cast=int)
+# Results cached by `cache_sync_execute` are also kept in memory by each process, for a shorter while than in Redis
+CLICKHOUSE_RESULT_CACHE_LOCAL_SIZE = get_from_env("CLICKHOUSE_RESULT_CACHE_LOCAL_SIZE", 500, type_cast=int)
+CLICKHOUSE_RESULT_CACHE_LOCAL_TTL = get_from_env("CLICKHOUSE_RESULT_CACHE_LOCAL_TTL", 10, type_cast=int)
+CLICKHOUSE_RESULT_CACHE_LOCAL_MAX_BYTES = get_from_env(
+    "CLICKHOUSE_RESULT_CACHE_LOCAL_MAX_BYTES", 1_000_000, type_cast=int
+)
+# Encoded results larger than this are compressed with zstd
+CLICKHOUSE_RESULT_CACHE_COMPRESSION_THRESHOLD = get_from_env(
+    "CLICKHOUSE_RESULT_CACHE_COMPRESSION_THRESHOLD", 16_384, type_cast=int
+)
+# How long identical queries wait on one another before running anyway
+CLICKHOUSE_RESULT_CACHE_LOCK_TIMEOUT = get_from_env("CLICKHOUSE_RESULT_CACHE_LOCK_TIMEOUT", 60, type_cast=int)
+# Threads shared by all requests of a process to run their queries in parallel, see posthog/clickhouse/query_executor.py
+# With 0 the queries are run one after the other by the caller instead, which tests do like Celery's eager mode
+CLICKHOUSE_QUERY_EXECUTOR_WORKERS = get_from_env("CLICKHOUSE_QUERY_EXECUTOR_WORKERS", 0 if TEST else 16, type_cast=int)
+CLICKHOUSE_QUERY_EXECUTOR_WORKERS_PER_TEAM = get_from_env(
+    "CLICKHOUSE_QUERY_EXECUTOR_WORKERS_PER_TEAM", 4, type_cast=int
+)
+# Queries each process lets run at once, in total and per team, see posthog/clickhouse/admission.py. 0 turns it off
+CLICKHOUSE_ADMISSION_MAX_CONCURRENT = get_from_env("CLICKHOUSE_ADMISSION_MAX_CONCURRENT", 32, type_cast=int)
+CLICKHOUSE_ADMISSION_MAX_CONCURRENT_PER_TEAM = get_from_env(
+    "CLICKHOUSE_ADMISSION_MAX_CONCURRENT_PER_TEAM", 8, type_cast=int
+)
+# How long queries wait for a slot before giving up
+CLICKHOUSE_ADMISSION_TIMEOUT_SECONDS = get_from_env("CLICKHOUSE_ADMISSION_TIMEOUT_SECONDS", 30, type_cast=int)
+# Queries run for a request are killed once it's been going on for this long, matching the timeout of gunicorn workers
+CLICKHOUSE_REQUEST_TIMEOUT_SECONDS = get_from_env("CLICKHOUSE_REQUEST_TIMEOUT_SECONDS", 90, type_cast=int)
 
 CLICKHOUSE_STABLE_HOST = get_from_env("CLICKHOUSE_STABLE_HOST", CLICKHOUSE_HOST)
 # If enabled, some queries will use system.cluster table to query each shard
@@ -136,6 +165,21 @@ KAFKA_SASL_MECHANISM = os.getenv("KAFKA_SASL_MECHANISM", None)
 KAFKA_SASL_USER = os.getenv("KAFKA_SASL_USER", None)
 KAFKA_SASL_PASSWORD = os.getenv("KAFKA_SASL_PASSWORD", None)
 
+# With a buffer size, produced records are handed to Kafka by a background thread through a bounded in-memory queue,
+# which spills over to append-only segment files while it's full or Kafka is unavailable. Spilled records are only
+# replayed if the spillover directory is still there when the next process starts, so it has to be on a persistent
+# volume. Off by default, producing directly.
+KAFKA_PRODUCER_BUFFER_SIZE = get_from_env("KAFKA_PRODUCER_BUFFER_SIZE", 0, type_cast=int)
+KAFKA_PRODUCER_SPILLOVER_DIR = os.getenv("KAFKA_PRODUCER_SPILLOVER_DIR")
+if KAFKA_PRODUCER_BUFFER_SIZE > 0 and not KAFKA_PRODUCER_SPILLOVER_DIR:
+    raise ImproperlyConfigured(
+        "KAFKA_PRODUCER_SPILLOVER_DIR is required with KAFKA_PRODUCER_BUFFER_SIZE, and must be on a persistent volume"
+    )
+KAFKA_PRODUCER_SPILLOVER_SEGMENT_BYTES = get_from_env(
+    "KAFKA_PRODUCER_SPILLOVER_SEGMENT_BYTES", 16 * 1024 * 1024, type_cast=int
+)
+KAFKA_PRODUCER_MAX_BACKOFF_SECONDS = get_from_env("KAFKA_PRODUCER_MAX_BACKOFF_SECONDS", 30, type_cast=int)
+
 SUFFIX = "_test" if TEST else ""
 
 KAFKA_EVENTS_PLUGIN_INGESTION: str = (
@@ -71,6 +71,21 @@ CONSTANCE_CONFIG = {
         "Whether to always try to find cached data for historical intervals on trends",
         str,
     ),
+    "EVENTS_ROLLUP_TEAMS": (
+        get_from_env("EVENTS_ROLLUP_TEAMS", ""),
+        "(Advanced) Whether trends counting events or unique users by event can be read from hourly rollups of events. Only enable once they're backfilled.",
+        str,
+    ),
+    "SINGLE_PASS_BREAKDOWN_TEAMS": (
+        get_from_env("SINGLE_PASS_BREAKDOWN_TEAMS", ""),
+        "Whether trends breakdowns pick their top values in the same query as they compute them, rather than in a query beforehand.",
+        str,
+    ),
+    "PROPERTY_VALUES_INDEX_TEAMS": (
+        get_from_env("PROPERTY_VALUES_INDEX_TEAMS", ""),
+        "Whether property values are autocompleted from the hourly index of property values, rather than by scanning events and persons. Only enable once the index has been updated for a week.",
+        str,
+    ),
     "EMAIL_ENABLED": (
         get_from_env("EMAIL_ENABLED", True, type_cast=str_to_bool),
         "Whether email service is enabled or not.",
@@ -168,6 +183,9 @@ SETTINGS_ALLOWING_API_OVERRIDE = (
     "ENABLE_ACTOR_ON_EVENTS_TEAMS",
     "GEOIP_PROPERTY_OVERRIDES_TEAMS",
     "STRICT_CACHING_TEAMS",
+    "EVENTS_ROLLUP_TEAMS",
+    "SINGLE_PASS_BREAKDOWN_TEAMS",
+    "PROPERTY_VALUES_INDEX_TEAMS",
     "SLACK_APP_CLIENT_ID",
     "SLACK_APP_CLIENT_SECRET",
     "SLACK_APP_SIGNING_SECRET",
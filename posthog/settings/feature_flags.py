@@ -1,6 +1,7 @@
 import os
 
-from posthog.settings.utils import get_list
+from posthog.settings.base_variables import TEST
+from posthog.settings.utils import get_from_env, get_list
 
 # These flags will be force-enabled on the frontend
 # The features here are released, but the flags are just not yet removed from the code
@@ -9,3 +10,8 @@ PERSISTED_FEATURE_FLAGS = get_list(os.getenv("PERSISTED_FEATURE_FLAGS", "")) + [
     "insight-legends",
     "simplify-actions",
 ]
+
+# Per-process cache of each team's active flags for /decide, checked against a version bumped on every flag save.
+# Disabled in tests by default, as flag changes rolled back between tests don't bump the version.
+FEATURE_FLAGS_CACHE_MAX_SIZE = get_from_env("FEATURE_FLAGS_CACHE_MAX_SIZE", 5_000, type_cast=int)
+FEATURE_FLAGS_CACHE_TTL_SECONDS = get_from_env("FEATURE_FLAGS_CACHE_TTL_SECONDS", 0 if TEST else 600, type_cast=int)
@@ -1,8 +1,30 @@
 import os
 
+from posthog.settings.base_variables import TEST
 from posthog.settings.utils import get_from_env, get_list
 
 INGESTION_LAG_METRIC_TEAM_IDS = get_list(os.getenv("INGESTION_LAG_METRIC_TEAM_IDS", ""))
 
 # KEEP IN SYNC WITH plugin-server/src/config/config.ts
 BUFFER_CONVERSION_SECONDS = get_from_env("BUFFER_CONVERSION_SECONDS", default=60, type_cast=int)
+
+# Per-process cache of project API token lookups made by capture and decide, invalidated via Redis pub/sub.
+# Disabled in tests by default, as Team changes rolled back between tests don't fire invalidations.
+TEAM_CACHE_INVALIDATION_PUBSUB_CHANNEL = os.getenv("TEAM_CACHE_INVALIDATION_PUBSUB_CHANNEL", "invalidate-team-token")
+TEAM_TOKEN_CACHE_MAX_SIZE = get_from_env("TEAM_TOKEN_CACHE_MAX_SIZE", 10_000, type_cast=int)
+TEAM_TOKEN_CACHE_TTL_SECONDS = get_from_env("TEAM_TOKEN_CACHE_TTL_SECONDS", 0 if TEST else 300, type_cast=int)
+TEAM_TOKEN_CACHE_NEGATIVE_TTL_SECONDS = get_from_env(
+    "TEAM_TOKEN_CACHE_NEGATIVE_TTL_SECONDS", 0 if TEST else 30, type_cast=int
+)
+
+# Upper bound on the size of a request body after decompression, so that small gzip bombs can't exhaust memory
+MAX_DECOMPRESSED_REQUEST_SIZE = get_from_env("MAX_DECOMPRESSED_REQUEST_SIZE", 100 * 1024 * 1024, type_cast=int)
+
+# When set, feature flags added to web events by capture are cached across requests for this many seconds.
+# Flag changes take effect immediately, but person property changes can take this long to be reflected.
+CAPTURE_FEATURE_FLAGS_CACHE_TTL_SECONDS = get_from_env("CAPTURE_FEATURE_FLAGS_CACHE_TTL_SECONDS", 0, type_cast=int)
+
+# Codec used to compress recording snapshots before they're chunked, see `posthog/helpers/session_recording.py`.
+# Readers understand every codec, so only switch codecs once all web and worker instances run a version that does.
+SESSION_RECORDING_SNAPSHOT_COMPRESSION = os.getenv("SESSION_RECORDING_SNAPSHOT_COMPRESSION", "gzip-base64")
+SESSION_RECORDING_COMPRESSION_WORKERS = get_from_env("SESSION_RECORDING_COMPRESSION_WORKERS", 4, type_cast=int)
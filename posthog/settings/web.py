@@ -70,9 +70,24 @@ MIDDLEWARE = [
     "django_prometheus.middleware.PrometheusAfterMiddleware",
 ]
 
+# Capture-only processes (see `posthog/wsgi_capture.py`) serve nothing but the ingestion endpoints, which need none of
+# the session, auth or CSRF handling above. With `CAPTURE_ONLY` set, they run with this stack and urlconf instead.
+CAPTURE_ONLY = get_from_env("CAPTURE_ONLY", False, type_cast=str_to_bool)
+CAPTURE_MIDDLEWARE = [
+    "django_prometheus.middleware.PrometheusBeforeMiddleware",
+    "django_structlog.middlewares.RequestMiddleware",
+    "django.middleware.security.SecurityMiddleware",
+    "posthog.health.healthcheck_middleware",
+    "django_prometheus.middleware.PrometheusAfterMiddleware",
+]
+
 if STATSD_HOST is not None:
-    MIDDLEWARE.insert(0, "django_statsd.middleware.StatsdMiddleware")
-    MIDDLEWARE.append("django_statsd.middleware.StatsdMiddlewareTimer")
+    for middleware in (MIDDLEWARE, CAPTURE_MIDDLEWARE):
+        middleware.insert(0, "django_statsd.middleware.StatsdMiddleware")
+        middleware.append("django_statsd.middleware.StatsdMiddlewareTimer")
+
+if CAPTURE_ONLY:
+    MIDDLEWARE = CAPTURE_MIDDLEWARE
 
 # Append Enterprise Edition as an app if available
 try:
@@ -94,7 +109,7 @@ else:
 # Max size of a POST body (for event ingestion)
 DATA_UPLOAD_MAX_MEMORY_SIZE = 20971520  # 20 MB
 
-ROOT_URLCONF = "posthog.urls"
+ROOT_URLCONF = "posthog.urls_capture" if CAPTURE_ONLY else "posthog.urls"
 
 TEMPLATES = [
     {
@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+import structlog
+from django.utils import timezone
+from statshog.defaults.django import statsd
+
+from posthog.clickhouse.query_tagging import tag_queries
+from posthog.client import sync_execute
+from posthog.models.property.sql import INSERT_EVENT_PROPERTY_VALUES_SQL, INSERT_PERSON_PROPERTY_VALUES_SQL
+from posthog.tasks.update_cache import active_teams
+
+logger = structlog.get_logger(__name__)
+
+# Limits of each team's queries, so that a team with a lot of data can't hog the cluster
+PROPERTY_VALUES_MAX_EXECUTION_TIME = 300
+PROPERTY_VALUES_MAX_MEMORY_USAGE = 4 * 1024 * 1024 * 1024
+
+
+def update_property_values(until: Optional[datetime] = None) -> None:
+    """
+    Adds the values of the properties of the events that happened and the persons that were updated in the hour before
+    `until`, by default the last whole hour, to the property values index. Run hourly, after events of the hour came in.
+
+    Teams are indexed one at a time, so that each query only reads that team's part of the tables, and only those that
+    ingested events in the last few days, as the others have nothing new to index. A team that fails to be indexed
+    misses the hour, without holding up the teams after it.
+    """
+    until = (until or timezone.now()).replace(minute=0, second=0, microsecond=0)
+    since = (until - timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+    settings = {
+        "max_execution_time": PROPERTY_VALUES_MAX_EXECUTION_TIME,
+        "max_memory_usage": PROPERTY_VALUES_MAX_MEMORY_USAGE,
+    }
+
+    for team_id in sorted(active_teams()):
+        query_args = {"team_id": team_id, "since": since, "until": until.strftime("%Y-%m-%d %H:%M:%S")}
+        try:
+            with tag_queries(kind="property_values", id=f"{team_id}:{since}"):
+                sync_execute(INSERT_EVENT_PROPERTY_VALUES_SQL, query_args, settings=settings)
+                sync_execute(INSERT_PERSON_PROPERTY_VALUES_SQL, query_args, settings=settings)
+        except Exception:
+            statsd.incr("update_property_values_error", tags={"team": team_id})
+            logger.exception("update_property_values_failed", team_id=team_id, since=since)
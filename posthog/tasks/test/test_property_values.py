@@ -0,0 +1,121 @@
+from datetime import datetime
+from unittest.mock import patch
+
+import pytz
+from freezegun import freeze_time
+
+from posthog.client import sync_execute
+from posthog.models import Organization, Team
+from posthog.models.instance_setting import override_instance_config
+from posthog.tasks.property_values import update_property_values
+from posthog.test.base import APIBaseTest, ClickhouseTestMixin, _create_event, _create_person, flush_persons_and_events
+
+
+class TestPropertyValues(ClickhouseTestMixin, APIBaseTest):
+    def setUp(self):
+        super().setUp()
+        # Events of the tests are too old for any team to count as active
+        patcher = patch(
+            "posthog.tasks.property_values.active_teams",
+            side_effect=lambda: list(Team.objects.values_list("pk", flat=True)),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _create_events(self):
+        with freeze_time("2020-01-20 19:30:00"):
+            for value in ["Chrome"] * 4 + ["Safari"] * 3 + ["Firefox"] * 2 + ["Chromium"]:
+                _create_event(distinct_id="bla", event="$pageview", team=self.team, properties={"$browser": value})
+            _create_event(distinct_id="bla", event="$pageview", team=self.team, properties={"$browser": ""})
+            _create_event(distinct_id="bla", event="$pageview", team=self.team, properties={"other_prop": "Chrome"})
+
+            team2 = Organization.objects.bootstrap(None)[2]
+            _create_event(distinct_id="bla", event="$pageview", team=team2, properties={"$browser": "Edge"})
+
+        with freeze_time("2020-01-20 20:30:00"):
+            # Not in the hour being indexed yet
+            _create_event(distinct_id="bla", event="$pageview", team=self.team, properties={"$browser": "Opera"})
+        flush_persons_and_events()
+
+    def _values(self, endpoint: str, **params):
+        query = "&".join(f"{key}={value}" for key, value in params.items())
+        return self.client.get(f"/api/projects/{self.team.id}/{endpoint}/values/?{query}").json()
+
+    def test_event_property_values_from_index(self):
+        self._create_events()
+        update_property_values(until=datetime(2020, 1, 20, 20, 15, tzinfo=pytz.UTC))
+
+        with override_instance_config("PROPERTY_VALUES_INDEX_TEAMS", "all"), freeze_time("2020-01-20 20:45:00"):
+            response = self._values("events", key="$browser")
+            self.assertEqual([value["name"] for value in response], ["Chrome", "Safari", "Firefox", "Chromium"])
+
+            response = self._values("events", key="$browser", value="hrom")
+            self.assertEqual([value["name"] for value in response], ["Chrome", "Chromium"])
+
+            response = self._values("events", key="$browser", value="hrom", match="prefix")
+            self.assertEqual(response, [])
+
+            response = self._values("events", key="$browser", value="Saf", match="prefix")
+            self.assertEqual([value["name"] for value in response], ["Safari"])
+
+    def test_property_values_are_added_up_across_hours(self):
+        self._create_events()
+        update_property_values(until=datetime(2020, 1, 20, 20, tzinfo=pytz.UTC))
+        update_property_values(until=datetime(2020, 1, 20, 21, tzinfo=pytz.UTC))
+
+        with freeze_time("2020-01-20 21:30:00"):
+            for _ in range(4):
+                _create_event(distinct_id="bla", event="$pageview", team=self.team, properties={"$browser": "Opera"})
+        flush_persons_and_events()
+        update_property_values(until=datetime(2020, 1, 20, 22, tzinfo=pytz.UTC))
+
+        with override_instance_config("PROPERTY_VALUES_INDEX_TEAMS", str(self.team.pk)), freeze_time(
+            "2020-01-20 22:15:00"
+        ):
+            response = self._values("events", key="$browser")
+            self.assertEqual(
+                [value["name"] for value in response], ["Opera", "Chrome", "Safari", "Firefox", "Chromium"]
+            )
+
+    def test_teams_after_one_that_fails_are_still_indexed(self):
+        self._create_events()
+
+        def execute(query, args, settings):
+            if args["team_id"] != self.team.pk:
+                raise Exception("Memory limit exceeded")
+            return sync_execute(query, args, settings=settings)
+
+        with patch("posthog.tasks.property_values.active_teams", return_value=[0, self.team.pk]), patch(
+            "posthog.tasks.property_values.sync_execute", side_effect=execute
+        ):
+            update_property_values(until=datetime(2020, 1, 20, 20, tzinfo=pytz.UTC))
+
+        with override_instance_config("PROPERTY_VALUES_INDEX_TEAMS", "all"), freeze_time("2020-01-20 20:45:00"):
+            response = self._values("events", key="$browser")
+            self.assertEqual([value["name"] for value in response], ["Chrome", "Safari", "Firefox", "Chromium"])
+
+    def test_person_property_values_from_index(self):
+        with freeze_time("2020-01-20 19:30:00"):
+            _create_person(distinct_ids=["1"], team=self.team, properties={"email": "ben@posthog.com"})
+            _create_person(distinct_ids=["2"], team=self.team, properties={"email": "marius@posthog.com"})
+            _create_person(distinct_ids=["3"], team=self.team, properties={"email": "bernard@example.com"})
+        flush_persons_and_events()
+        update_property_values(until=datetime(2020, 1, 20, 20, tzinfo=pytz.UTC))
+
+        with override_instance_config("PROPERTY_VALUES_INDEX_TEAMS", "all"):
+            response = self._values("persons", key="email", value="posthog")
+            self.assertCountEqual(
+                response, [{"name": "ben@posthog.com", "count": 1}, {"name": "marius@posthog.com", "count": 1}]
+            )
+
+            response = self._values("persons", key="email", value="be", match="prefix")
+            self.assertCountEqual(
+                response, [{"name": "ben@posthog.com", "count": 1}, {"name": "bernard@example.com", "count": 1}]
+            )
+
+    def test_property_values_scan_events_when_index_is_disabled(self):
+        self._create_events()
+
+        with freeze_time("2020-01-20 20:45:00"):
+            response = self._values("events", key="$browser", value="Chr", match="prefix")
+            self.assertCountEqual([value["name"] for value in response], ["Chrome", "Chromium"])
@@ -773,7 +773,8 @@ class TestUpdateCache(APIBaseTest):
 
         tasks, queue_length = update_cached_items()
 
-        assert tasks == 5
+        # They all have the same results, so they're refreshed all at once
+        assert tasks == 1
         assert queue_length == parallel_insight_cache + 5
 
         for call_item in patch_update_cache_item.call_args_list:
@@ -789,6 +790,88 @@ class TestUpdateCache(APIBaseTest):
         for insight in other_insights_out_of_range:
             assert not Insight.objects.get(pk=insight.pk).last_refresh == datetime(2022, 1, 2).replace(tzinfo=pytz.utc)
 
+    @patch("posthog.tasks.update_cache.group.apply_async")
+    @patch("posthog.celery.update_cache_item_task.s")
+    @freeze_time("2022-01-03T00:00:00.000Z")
+    def test_refreshes_tiles_with_the_same_results_once(
+        self, patch_update_cache_item: MagicMock, _patch_apply_async: MagicMock
+    ) -> None:
+        pageviews = Insight.objects.create(team=self.team, filters={"events": [{"id": "$pageview"}]})
+        signups = Insight.objects.create(team=self.team, filters={"events": [{"id": "signed up"}]})
+
+        rarely_viewed = create_shared_dashboard(
+            team=self.team, is_shared=True, last_accessed_at=now() - timedelta(days=3)
+        )
+        often_viewed = create_shared_dashboard(team=self.team, is_shared=True, last_accessed_at=now())
+        also_often_viewed = create_shared_dashboard(team=self.team, is_shared=True, last_accessed_at=now())
+        tiles = [
+            DashboardTile.objects.create(insight=pageviews, dashboard=rarely_viewed),
+            DashboardTile.objects.create(insight=signups, dashboard=often_viewed),
+            DashboardTile.objects.create(insight=signups, dashboard=also_often_viewed),
+            DashboardTile.objects.create(insight=signups, dashboard=rarely_viewed),
+        ]
+
+        tasks, queue_length = update_cached_items()
+
+        assert tasks == 2
+        assert queue_length == 4
+        # Among tiles as stale as each other, those on dashboards people are looking at come first
+        assert [call_item[0][2]["insight_id"] for call_item in patch_update_cache_item.call_args_list] == [
+            signups.pk,
+            pageviews.pk,
+        ]
+
+        for call_item in patch_update_cache_item.call_args_list:
+            update_cache_item(*call_item[0])
+
+        for tile in tiles:
+            assert DashboardTile.objects.get(pk=tile.pk).last_refresh == now()
+
+    @patch("posthog.tasks.update_cache.group.apply_async")
+    @patch("posthog.celery.update_cache_item_task.s")
+    @freeze_time("2022-01-03T00:00:00.000Z")
+    def test_shared_insights_are_refreshed_alongside_as_many_tiles_as_can_be(
+        self, patch_update_cache_item: MagicMock, _patch_apply_async: MagicMock
+    ) -> None:
+        set_instance_setting(key="PARALLEL_DASHBOARD_ITEM_CACHE", value=2)
+        dashboard = create_shared_dashboard(team=self.team, is_shared=True, last_accessed_at=now())
+        for event in ["$pageview", "signed up", "paid"]:
+            insight = Insight.objects.create(team=self.team, filters={"events": [{"id": event}]})
+            DashboardTile.objects.create(insight=insight, dashboard=dashboard)
+        shared_insight = create_shared_insight(
+            team=self.team,
+            is_enabled=True,
+            filters={"events": [{"id": "$autocapture"}]},
+            last_refresh=datetime(2022, 1, 1).replace(tzinfo=pytz.utc),
+        )
+
+        tasks, queue_length = update_cached_items()
+
+        assert tasks == 3
+        assert queue_length == 4
+        assert patch_update_cache_item.call_args_list[-1][0][2]["insight_id"] == shared_insight.pk
+
+    @patch("posthog.tasks.update_cache.group.apply_async")
+    @patch("posthog.celery.update_cache_item_task.s")
+    @freeze_time("2022-01-03T00:00:00.000Z")
+    def test_tiles_people_are_looking_at_are_refreshed_before_staler_ones(
+        self, patch_update_cache_item: MagicMock, _patch_apply_async: MagicMock
+    ) -> None:
+        set_instance_setting(key="PARALLEL_DASHBOARD_ITEM_CACHE", value=1)
+        often_viewed = create_shared_dashboard(team=self.team, is_shared=True, last_accessed_at=now())
+        rarely_viewed = create_shared_dashboard(
+            team=self.team, is_shared=True, last_accessed_at=now() - timedelta(days=3)
+        )
+        pageviews = Insight.objects.create(team=self.team, filters={"events": [{"id": "$pageview"}]})
+        signups = Insight.objects.create(team=self.team, filters={"events": [{"id": "signed up"}]})
+        DashboardTile.objects.create(insight=pageviews, dashboard=often_viewed, last_refresh=now() - timedelta(hours=1))
+        DashboardTile.objects.create(insight=signups, dashboard=rarely_viewed, last_refresh=now() - timedelta(hours=2))
+
+        tasks, _ = update_cached_items()
+
+        assert tasks == 1
+        assert patch_update_cache_item.call_args_list[0][0][2]["insight_id"] == pageviews.pk
+
     @freeze_time("2021-08-25T22:09:14.252Z")
     def test_cache_key_that_matches_no_assets_still_counts_as_a_refresh_attempt_for_dashboard_tiles(self) -> None:
         test_hash = "märg koer lamab parimal tekil"
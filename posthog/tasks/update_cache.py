@@ -4,7 +4,6 @@ from typing import Any, Dict, List, Optional, Tuple, Union
 
 import structlog
 from celery import group
-from celery.canvas import Signature
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
 from django.core.cache import cache
@@ -57,6 +56,10 @@ IN_A_DAY = 86_400
 
 
 def active_teams() -> List[int]:
+    return list(active_team_ages())
+
+
+def active_team_ages() -> Dict[int, float]:
     """
     Teams are stored in a sorted set. [{team_id: score}, {team_id: score}].
     Their "score" is the number of seconds since last event.
@@ -84,14 +87,20 @@ def active_teams() -> List[int]:
         redis.expire(RECENTLY_ACCESSED_TEAMS_REDIS_KEY, IN_A_DAY)
         all_teams = teams_by_recency
 
-    return [int(team) for team, _ in all_teams]
+    return {int(team): float(age) for team, age in all_teams}
 
 
 def update_cached_items() -> Tuple[int, int]:
-    PARALLEL_INSIGHT_CACHE = get_instance_setting("PARALLEL_DASHBOARD_ITEM_CACHE")
-    recent_teams = active_teams()
+    """
+    Schedules refreshing the insights that are due for it, once for every cache key rather than once for every tile
+    and shared insight, as tiles on any number of dashboards can show the same results. `update_cache_item` then
+    updates all the tiles and insights with that cache key at once.
 
-    tasks: List[Optional[Signature]] = []
+    Returns the number of refreshes scheduled, and the number of tiles and shared insights that were due.
+    """
+    PARALLEL_INSIGHT_CACHE = get_instance_setting("PARALLEL_DASHBOARD_ITEM_CACHE")
+    team_ages = active_team_ages()
+    recent_teams = list(team_ages)
 
     dashboard_tiles = (
         DashboardTile.objects.filter(insight__team_id__in=recent_teams)
@@ -113,9 +122,6 @@ def update_cached_items() -> Tuple[int, int]:
         .order_by(F("last_refresh").asc(nulls_first=True), F("refresh_attempt").asc())
     )
 
-    for dashboard_tile in dashboard_tiles[0:PARALLEL_INSIGHT_CACHE]:
-        tasks.append(task_for_cache_update_candidate(dashboard_tile))
-
     shared_insights = (
         Insight.objects.filter(team_id__in=recent_teams)
         .filter(sharingconfiguration__enabled=True)
@@ -126,17 +132,70 @@ def update_cached_items() -> Tuple[int, int]:
         .order_by(F("last_refresh").asc(nulls_first=True))
     )
 
-    for insight in shared_insights[0:PARALLEL_INSIGHT_CACHE]:
-        tasks.append(task_for_cache_update_candidate(insight))
+    # Tiles and shared insights each get their own refreshes. Of those that went longest without one, those most due for
+    # one get them first. Candidates with a cache key that's already being refreshed come along with it, without taking
+    # up a refresh.
+    window = PARALLEL_INSIGHT_CACHE * CACHE_UPDATE_CANDIDATE_WINDOW
+    refreshes: Dict[str, Tuple[CacheType, Dict]] = {}
+    candidates_count = 0
+    now = timezone.now()
+    for candidates in (dashboard_tiles[0:window], shared_insights[0:window]):
+        available_refreshes = PARALLEL_INSIGHT_CACHE
+        for candidate in sorted(
+            candidates, key=lambda candidate: cache_update_priority(candidate, team_ages, now), reverse=True
+        ):
+            if available_refreshes == 0:
+                break
+            task_params = task_params_for_cache_update_candidate(candidate)
+            candidates_count += 1
+            if task_params is None:
+                continue
+            cache_key, cache_type, payload = task_params
+            if cache_key not in refreshes:
+                refreshes[cache_key] = (cache_type, payload)
+                available_refreshes -= 1
 
     gauge_cache_update_candidates(dashboard_tiles, shared_insights)
+    statsd.gauge("update_cache_queue.deduplicated_candidates", candidates_count - len(refreshes))
 
-    tasks = list(filter(None, tasks))
+    tasks = [
+        update_cache_item_task.s(cache_key, cache_type, payload)
+        for cache_key, (cache_type, payload) in refreshes.items()
+    ]
     group(tasks).apply_async()
     return len(tasks), dashboard_tiles.count() + shared_insights.count()
 
 
-def task_for_cache_update_candidate(candidate: Union[DashboardTile, Insight]) -> Optional[Signature]:
+# How many candidates for each refresh scheduled at once are looked at, at most, for ones with the same cache key
+CACHE_UPDATE_CANDIDATE_WINDOW = 5
+# Results, dashboards and teams that went this long without a refresh, a visit or an event all count as long gone
+CACHE_UPDATE_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+
+
+def cache_update_priority(
+    candidate: Union[DashboardTile, Insight], team_ages: Dict[int, float], now: datetime.datetime
+) -> float:
+    """
+    How much the candidate is due for a refresh, the higher the sooner: how long its results went without one, divided
+    by how many hours ago its dashboard was last looked at and its team last ingested an event, as refreshing results
+    nobody looks at, or that have nothing new to show, can wait.
+    """
+    insight = candidate if isinstance(candidate, Insight) else candidate.insight
+    last_accessed_at = None if isinstance(candidate, Insight) else candidate.dashboard.last_accessed_at
+
+    staleness = (now - candidate.last_refresh).total_seconds() if candidate.last_refresh else None
+    access_age = (now - last_accessed_at).total_seconds() if last_accessed_at else None
+    team_age = team_ages.get(insight.team_id)
+    staleness, access_age, team_age = (
+        CACHE_UPDATE_MAX_AGE_SECONDS if age is None else min(max(age, 0), CACHE_UPDATE_MAX_AGE_SECONDS)
+        for age in (staleness, access_age, team_age)
+    )
+    return staleness / ((1 + access_age / 3600) * (1 + team_age / 3600))
+
+
+def task_params_for_cache_update_candidate(
+    candidate: Union[DashboardTile, Insight]
+) -> Optional[Tuple[str, CacheType, Dict]]:
     candidate_tile: Optional[DashboardTile] = None if isinstance(candidate, Insight) else candidate
     candidate_insight: Insight = candidate if isinstance(candidate, Insight) else candidate.insight
     candidate_dashboard: Optional[Dashboard] = None if isinstance(candidate, Insight) else candidate.dashboard
@@ -144,7 +203,7 @@ def task_for_cache_update_candidate(candidate: Union[DashboardTile, Insight]) ->
     try:
         cache_key, cache_type, payload = insight_update_task_params(candidate_insight, candidate_dashboard)
         update_filters_hash(cache_key, candidate_dashboard, candidate_insight)
-        return update_cache_item_task.s(cache_key, cache_type, payload)
+        return cache_key, cache_type, payload
     except Exception as e:
         candidate_insight.refresh_attempt = (candidate_insight.refresh_attempt or 0) + 1
         candidate_insight.save(update_fields=["refresh_attempt"])
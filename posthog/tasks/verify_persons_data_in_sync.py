@@ -1,14 +1,14 @@
 import json
 from collections import Counter, defaultdict
 from datetime import timedelta
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List
 
 import structlog
 from django.db.models.query import Prefetch
 from django.utils.timezone import now
 
 from posthog.celery import app
-from posthog.client import sync_execute
+from posthog.client import execute_iter
 from posthog.models.person import Person
 
 logger = structlog.get_logger(__name__)
@@ -94,11 +94,11 @@ def _team_integrity_statistics(person_data: List[Any]) -> Counter:
     )
 
     ch_persons = _index_by(
-        sync_execute(GET_PERSON_CH_QUERY, {"person_ids": person_uuids, "team_ids": team_ids}), lambda row: row[0]
+        execute_iter(GET_PERSON_CH_QUERY, {"person_ids": person_uuids, "team_ids": team_ids}), lambda row: row[0]
     )
 
     ch_distinct_ids_mapping = _index_by(
-        sync_execute(GET_DISTINCT_IDS_CH_QUERY, {"person_ids": person_uuids, "team_ids": team_ids}),
+        execute_iter(GET_DISTINCT_IDS_CH_QUERY, {"person_ids": person_uuids, "team_ids": team_ids}),
         lambda row: row[1],
         flat=False,
     )
@@ -155,7 +155,7 @@ def _emit_metrics(integrity_results: Counter) -> None:
         statsd.gauge(f"posthog_person_integrity_{key}", value)
 
 
-def _index_by(collection: List[Any], key_fn: Any, flat: bool = True) -> Dict:
+def _index_by(collection: Iterable[Any], key_fn: Any, flat: bool = True) -> Dict:
     result: Dict = {} if flat else defaultdict(list)
     for item in collection:
         if flat:
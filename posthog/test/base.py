@@ -440,20 +440,30 @@ class ClickhouseTestMixin(QueryMatchingTest):
         queries = []
         original_get_client = ch_pool.get_client
 
-        # Spy on the `clichhouse_driver.Client.execute` method. This is a bit of
-        # a roundabout way to handle this, but it seems tricky to spy on the
-        # unbound class method `Client.execute` directly easily
+        # Spy on the `clichhouse_driver.Client.execute` and `execute_iter` methods.
+        # This is a bit of a roundabout way to handle this, but it seems tricky to
+        # spy on the unbound class method `Client.execute` directly easily
         @contextmanager
         def get_client():
             with original_get_client() as client:
                 original_client_execute = client.execute
+                original_client_execute_iter = client.execute_iter
 
-                def execute_wrapper(query, *args, **kwargs):
+                def capture_query(query):
                     if sqlparse.format(query, strip_comments=True).strip().startswith(query_prefixes):
                         queries.append(query)
+
+                def execute_wrapper(query, *args, **kwargs):
+                    capture_query(query)
                     return original_client_execute(query, *args, **kwargs)
 
-                with patch.object(client, "execute", wraps=execute_wrapper) as _:
+                def execute_iter_wrapper(query, *args, **kwargs):
+                    capture_query(query)
+                    return original_client_execute_iter(query, *args, **kwargs)
+
+                with patch.object(client, "execute", wraps=execute_wrapper) as _, patch.object(
+                    client, "execute_iter", wraps=execute_iter_wrapper
+                ) as _:
                     yield client
 
         with patch("posthog.client.ch_pool.get_client", wraps=get_client) as _:
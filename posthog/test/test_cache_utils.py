@@ -0,0 +1,107 @@
+import threading
+import time
+from unittest.mock import patch
+
+import fakeredis
+from django.test import SimpleTestCase
+
+from posthog.cache_utils import TTLCache, publish_invalidation, single_flight
+
+
+class TestTTLCache(SimpleTestCase):
+    def test_get_and_set(self):
+        cache: TTLCache[int] = TTLCache(maxsize=10, ttl=60)
+
+        self.assertEqual(cache.get("a"), (False, None))
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), (True, 1))
+
+    def test_caches_none_with_negative_ttl(self):
+        cache: TTLCache[int] = TTLCache(maxsize=10, ttl=60, negative_ttl=5)
+
+        with patch("posthog.cache_utils.time.monotonic", return_value=100):
+            cache.set("missing", None)
+            cache.set("present", 1)
+            self.assertEqual(cache.get("missing"), (True, None))
+
+        with patch("posthog.cache_utils.time.monotonic", return_value=106):
+            self.assertEqual(cache.get("missing"), (False, None))
+            self.assertEqual(cache.get("present"), (True, 1))
+
+        with patch("posthog.cache_utils.time.monotonic", return_value=161):
+            self.assertEqual(cache.get("present"), (False, None))
+
+    def test_evicts_least_recently_used(self):
+        cache: TTLCache[int] = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get("b"), (False, None))
+        self.assertEqual(cache.get("a"), (True, 1))
+        self.assertEqual(cache.get("c"), (True, 3))
+
+    def test_zero_ttl_disables_cache(self):
+        cache: TTLCache[int] = TTLCache(maxsize=10, ttl=0)
+        cache.set("a", 1)
+
+        self.assertEqual(cache.get("a"), (False, None))
+
+    def test_publish_invalidation(self):
+        cache: TTLCache[int] = TTLCache(maxsize=10, ttl=60, invalidation_channel="test-invalidation")
+        other_cache: TTLCache[int] = TTLCache(maxsize=10, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        other_cache.set("a", 1)
+
+        with patch("posthog.cache_utils.get_client") as get_client:
+            publish_invalidation("test-invalidation", "a")
+            get_client.return_value.publish.assert_called_once_with("test-invalidation", "a")
+
+        self.assertEqual(cache.get("a"), (False, None))
+        self.assertEqual(cache.get("b"), (True, 2))
+        self.assertEqual(other_cache.get("a"), (True, 1))
+
+
+class TestSingleFlight(SimpleTestCase):
+    def test_only_one_caller_goes_at_a_time(self):
+        redis_client = fakeredis.FakeStrictRedis()
+        leaders = []
+
+        def compute():
+            with single_flight("test-key", timeout=5, redis_client=redis_client) as leader:
+                if leader:
+                    time.sleep(0.1)
+                leaders.append(leader)
+
+        threads = [threading.Thread(target=compute) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(leaders), [False, False, False, False, True])
+        self.assertEqual(redis_client.keys(), [])
+
+    def test_waits_on_other_processes_through_redis(self):
+        redis_client = fakeredis.FakeStrictRedis()
+        redis_client.set("single_flight:test-key", "other-process", px=100)
+
+        with single_flight("test-key", timeout=5, redis_client=redis_client, poll_interval=0.01) as leader:
+            self.assertFalse(leader)
+            self.assertFalse(redis_client.exists("single_flight:test-key"))
+
+        with single_flight("test-key", timeout=5, redis_client=redis_client) as leader:
+            self.assertTrue(leader)
+
+    def test_does_not_wait_when_asked_not_to(self):
+        redis_client = fakeredis.FakeStrictRedis()
+        redis_client.set("single_flight:test-key", "other-process", px=5000)
+
+        start = time.monotonic()
+        with single_flight("test-key", timeout=5, redis_client=redis_client, wait=False) as leader:
+            self.assertFalse(leader)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertTrue(redis_client.exists("single_flight:test-key"))
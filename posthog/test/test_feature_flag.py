@@ -1,4 +1,5 @@
 from typing import cast
+from unittest.mock import patch
 
 from django.db import connection
 
@@ -9,8 +10,11 @@ from posthog.models.feature_flag import (
     FeatureFlagMatcher,
     FlagsMatcherCache,
     get_active_feature_flags,
+    get_feature_flags_for_team,
+    get_feature_flags_version,
     hash_key_overrides,
     set_feature_flag_hash_key_overrides,
+    team_feature_flags_cache,
 )
 from posthog.models.group import Group
 from posthog.test.base import BaseTest, QueryMatchingTest, snapshot_postgres_queries
@@ -589,6 +593,66 @@ class TestFeatureFlagMatcher(BaseTest, QueryMatchingTest):
         return FeatureFlag.objects.create(team=self.team, name="Beta feature", key=key, created_by=self.user, **kwargs)
 
 
+class TestFeatureFlagsForTeamCache(BaseTest):
+    def setUp(self):
+        super().setUp()
+        team_feature_flags_cache.clear()
+
+    def tearDown(self):
+        team_feature_flags_cache.clear()
+        super().tearDown()
+
+    @patch.object(team_feature_flags_cache, "ttl", 60)
+    def test_flags_are_cached_until_a_flag_changes(self):
+        feature_flag = FeatureFlag.objects.create(
+            team=self.team,
+            key="multivariate-flag",
+            created_by=self.user,
+            filters={
+                "groups": [{"properties": [{"key": "email", "value": "tim@posthog.com", "type": "person"}]}],
+                "multivariate": {
+                    "variants": [
+                        {"key": "first-variant", "rollout_percentage": 50},
+                        {"key": "second-variant", "rollout_percentage": 50},
+                    ]
+                },
+            },
+        )
+
+        with self.assertNumQueries(1):
+            flags = get_feature_flags_for_team(self.team.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_feature_flags_for_team(self.team.pk), flags)
+
+        self.assertEqual([flag.key for flag in flags], ["multivariate-flag"])
+        self.assertEqual(flags[0].parsed_conditions[0].properties[0].key, "email")
+        self.assertEqual(
+            flags[0].variant_lookup_table,
+            [
+                {"value_min": 0, "value_max": 0.5, "key": "first-variant"},
+                {"value_min": 0.5, "value_max": 1, "key": "second-variant"},
+            ],
+        )
+
+        feature_flag.active = False
+        feature_flag.save()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_feature_flags_for_team(self.team.pk), [])
+
+    @patch.object(team_feature_flags_cache, "ttl", 60)
+    def test_flags_cached_before_a_change_is_committed_are_reloaded(self):
+        feature_flag = FeatureFlag.objects.create(team=self.team, key="beta-feature", created_by=self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            feature_flag.active = False
+            feature_flag.save()
+            # Loaded by another process before the change is visible to it
+            team_feature_flags_cache.set(self.team.pk, (get_feature_flags_version(self.team.pk), [feature_flag]))
+
+        self.assertEqual(get_feature_flags_for_team(self.team.pk), [])
+
+
 class TestFeatureFlagHashKeyOverrides(BaseTest, QueryMatchingTest):
 
     person: Person
@@ -1,6 +1,7 @@
 from unittest import mock
 
 from posthog.models import Dashboard, DashboardTile, Organization, PluginConfig, Team, User
+from posthog.models.team.team import team_token_cache
 from posthog.plugins.test.mock import mocked_plugin_requests_get
 
 from .base import BaseTest
@@ -63,3 +64,37 @@ class TestTeam(BaseTest):
         self.assertEqual(PluginConfig.objects.filter(team=new_team, enabled=True).count(), 1)
         self.assertEqual(PluginConfig.objects.filter(team=new_team, enabled=True).get().plugin.name, "helloworldplugin")
         self.assertEqual(mock_get.call_count, 2)
+
+    @mock.patch.object(team_token_cache, "ttl", 60)
+    def test_get_team_from_cache_or_token(self):
+        team_token_cache.clear()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(Team.objects.get_team_from_cache_or_token(self.team.api_token), self.team)
+        with self.assertNumQueries(0):
+            self.assertEqual(Team.objects.get_team_from_cache_or_token(self.team.api_token), self.team)
+
+        # Rotating the token evicts the team cached under the old one
+        old_token = self.team.api_token
+        self.team.api_token = "phc_rotated_token"
+        self.team.save()
+
+        with self.assertNumQueries(1):
+            self.assertIsNone(Team.objects.get_team_from_cache_or_token(old_token))
+
+        team_token_cache.clear()
+
+    @mock.patch.object(team_token_cache, "ttl", 60)
+    def test_team_cached_before_a_change_is_committed_is_evicted(self):
+        team_token_cache.clear()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team.anonymize_ips = True
+            self.team.save()
+            # Loaded by another process before the change is visible to it
+            team_token_cache.set(self.team.api_token, Team(pk=self.team.pk, api_token=self.team.api_token))
+
+        with self.assertNumQueries(1):
+            self.assertTrue(Team.objects.get_team_from_cache_or_token(self.team.api_token).anonymize_ips)
+
+        team_token_cache.clear()
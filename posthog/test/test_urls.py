@@ -1,5 +1,9 @@
+import json
 import uuid
+from unittest.mock import patch
 
+from django.conf import settings
+from django.test import override_settings
 from rest_framework import status
 
 from posthog.test.base import APIBaseTest
@@ -98,3 +102,19 @@ class TestUrls(APIBaseTest):
         #     response,
         #     "Do you want to give the PostHog Toolbar on <strong>https://domain.com/sdf</strong> access to your PostHog data?",
         # )
+
+    @override_settings(ROOT_URLCONF="posthog.urls_capture", MIDDLEWARE=settings.CAPTURE_MIDDLEWARE)
+    @patch("posthog.kafka_client.client._KafkaProducer.produce")
+    def test_capture_only_app_serves_ingestion_endpoints(self, kafka_produce):
+        data = {"event": "$pageview", "properties": {"distinct_id": "2", "token": self.team.api_token}}
+
+        response = self.client.post("/e/", {"data": json.dumps(data)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(kafka_produce.call_count, 1)
+
+        response = self.client.post("/decide/?v=2", {"data": json.dumps({"token": self.team.api_token})})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.client.get("/_livez").status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get("/api/users/@me/").status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get("/login").status_code, status.HTTP_404_NOT_FOUND)
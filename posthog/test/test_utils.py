@@ -1,3 +1,6 @@
+import base64
+import gzip
+import json
 from unittest.mock import call, patch
 
 import pytest
@@ -5,6 +8,7 @@ from django.core.handlers.wsgi import WSGIRequest
 from django.http import HttpRequest
 from django.test import TestCase
 from django.test.client import RequestFactory
+from django.test.utils import override_settings
 from freezegun import freeze_time
 from rest_framework.request import Request
 
@@ -280,22 +284,42 @@ class TestLoadDataFromRequest(TestCase):
             str(ctx.exception),
         )
 
-    @patch("posthog.utils.gzip")
-    def test_can_decompress_gzipped_body_received_with_no_compression_flag(self, patched_gzip):
+    def test_can_decompress_gzipped_body_received_with_no_compression_flag(self):
         # see https://sentry.io/organizations/posthog2/issues/3136510367
         # one organization is causing a request parsing error by sending an encoded body
         # but the empty string for the compression value
         # this accounts for a large majority of our Sentry errors
 
-        patched_gzip.decompress.return_value = '{"what is it": "the decompressed value"}'
-
         rf = RequestFactory()
         # a request with no compression set
-        post_request = rf.post("/s/", "the gzip compressed string", "text/plain")
+        post_request = rf.post("/s/", gzip.compress(b'{"what is it": "the decompressed value"}'), "text/plain",)
 
         data = load_data_from_request(post_request)
         self.assertEqual({"what is it": "the decompressed value"}, data)
 
+    def test_decodes_plain_and_base64_json(self):
+        rf = RequestFactory()
+        payload = {"event": "$pageview", "properties": {"distinct_id": "ϥ", "value": float("nan")}}
+        encoded = json.dumps(payload).encode("utf-8")
+
+        plain = load_data_from_request(rf.post("/s/", encoded, "application/json"))
+        self.assertEqual(plain, {"event": "$pageview", "properties": {"distinct_id": "ϥ", "value": None}})
+
+        form = load_data_from_request(rf.post("/s/", {"data": base64.b64encode(encoded).decode("utf-8")}))
+        self.assertEqual(form, plain)
+
+    @override_settings(MAX_DECOMPRESSED_REQUEST_SIZE=1000)
+    def test_rejects_payloads_decompressing_past_the_limit(self):
+        rf = RequestFactory()
+        post_request = rf.post(
+            "/s/?compression=gzip", gzip.compress(b'{"padding": "' + b" " * 2000 + b'"}'), "text/plain",
+        )
+
+        with self.assertRaises(RequestParsingError) as ctx:
+            load_data_from_request(post_request)
+
+        self.assertEqual("Failed to decompress data. Decompressed data exceeds 1000 bytes", str(ctx.exception))
+
 
 class TestShouldRefresh(TestCase):
     def test_should_refresh_with_refresh_true(self):
@@ -1,9 +1,10 @@
+import heapq
+import itertools
 import uuid
-from collections import OrderedDict
 from functools import partial
 from threading import Condition, Thread
 from time import perf_counter
-from typing import Callable, Dict, Optional, Tuple
+from typing import Callable, Dict, List, Tuple
 
 import structlog
 from django.conf import settings
@@ -36,7 +37,10 @@ class SingleThreadedTimer(Thread):
         self.timeout_ms = timeout_ms
         self.started = False
         self.lock = Condition()
-        self.tasks: OrderedDict = OrderedDict()
+        self.tasks: Dict[str, TimerTask] = {}
+        # When tasks are due, soonest first. Cancelled tasks are skipped once they come up
+        self.queue: List[Tuple[float, int, str]] = []
+        self.sequence = itertools.count()
 
     def schedule(self, callback: Callable, *args, **kwargs) -> TimerTask:
         """
@@ -45,21 +49,26 @@ class SingleThreadedTimer(Thread):
 
         First call to this starts a background daemon thread.
         """
+        return self.schedule_in(self.timeout_ms, callback, *args, **kwargs)
+
+    def schedule_in(self, delay_ms: float, callback: Callable, *args, **kwargs) -> TimerTask:
+        "Like `schedule`, but for tasks to be called in `delay_ms` rather than `timeout_ms`."
         self.start()
 
         with self.lock:
             task = TimerTask(callback, *args, **kwargs)
-            self.tasks[task.id] = (task, perf_counter())
+            self.tasks[task.id] = task
+            heapq.heappush(self.queue, (perf_counter() + delay_ms / 1000.0, next(self.sequence), task.id))
             self.lock.notify()
 
             return task
 
     def cancel(self, task: TimerTask) -> None:
         with self.lock:
-            try:
-                del self.tasks[task.id]
-            except:
-                pass
+            self.tasks.pop(task.id, None)
+            if len(self.queue) > 2 * len(self.tasks) + 100:
+                self.queue = [entry for entry in self.queue if entry[2] in self.tasks]
+                heapq.heapify(self.queue)
             self.lock.notify()
 
     # :TRICKY: We override start() to make it easy to start the thread when scheduling the first task
@@ -73,30 +82,24 @@ class SingleThreadedTimer(Thread):
             job = None
             with self.lock:
                 sleep = self._sleep_time_until_next_task()
-                if len(self.tasks) == 0:
+                if len(self.queue) == 0:
                     # Wait until a task is scheduled
                     self.lock.wait()
                 elif sleep > 0:
                     self.lock.wait(sleep)
                 else:
-                    _, (job, _) = self.tasks.popitem(last=False)
+                    _, _, task_id = heapq.heappop(self.queue)
+                    job = self.tasks.pop(task_id, None)
 
             if job is not None:
                 job.run()
 
-    def _next_task(self) -> Optional[Tuple[TimerTask, float]]:
-        for _, task_and_time in self.tasks.items():
-            return task_and_time
-        return None
-
     def _sleep_time_until_next_task(self) -> float:
         "Return time until the next task should be executed, if any task is scheduled"
-        next_task = self._next_task()
-        if next_task is None:
+        if not self.queue:
             return 0
-        else:
-            _, start_time = next_task
-            return start_time + self.timeout_ms / 1000.0 - perf_counter()
+        due, _, _ = self.queue[0]
+        return due - perf_counter()
 
 
 class TestSingleThreadedTimer(SingleThreadedTimer):
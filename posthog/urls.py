@@ -1,10 +1,10 @@
-from typing import Any, Callable, List, Optional, cast
+from typing import Any, List, cast
 from urllib.parse import urlparse
 
 from django.conf import settings
 from django.contrib import admin
 from django.http import HttpRequest, HttpResponse
-from django.urls import URLPattern, include, path, re_path
+from django.urls import include, path, re_path
 from django.views.decorators import csrf
 from django.views.decorators.csrf import csrf_exempt
 from django_prometheus.exports import ExportToDjangoView
@@ -13,8 +13,6 @@ from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, Spec
 from posthog.api import (
     api_not_found,
     authentication,
-    capture,
-    decide,
     organizations_router,
     project_dashboards_router,
     projects_router,
@@ -27,6 +25,7 @@ from posthog.api import (
 from posthog.api.decide import hostname_in_app_urls
 from posthog.demo import demo_route
 from posthog.models import User
+from posthog.urls_capture import ingestion_urlpatterns, opt_slash_path
 
 from .utils import render_template
 from .views import health, login_required, preflight_check, robots_txt, security_txt, stats
@@ -93,12 +92,6 @@ def authorize_and_redirect(request: HttpRequest) -> HttpResponse:
     )
 
 
-def opt_slash_path(route: str, view: Callable, name: Optional[str] = None) -> URLPattern:
-    """Catches path with or without trailing slash, taking into account query param and hash."""
-    # Ignoring the type because while name can be optional on re_path, mypy doesn't agree
-    return re_path(fr"^{route}/?(?:[?#].*)?$", view, name=name)  # type: ignore
-
-
 urlpatterns = [
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     # Optional UI:
@@ -136,13 +129,7 @@ urlpatterns = [
     path("exporter/<str:access_token>", sharing.SharingViewerPageViewSet.as_view({"get": "retrieve"})),
     re_path(r"^demo.*", login_required(demo_route)),
     # ingestion
-    opt_slash_path("decide", decide.get_decide),
-    opt_slash_path("e", capture.get_event),
-    opt_slash_path("engage", capture.get_event),
-    opt_slash_path("track", capture.get_event),
-    opt_slash_path("capture", capture.get_event),
-    opt_slash_path("batch", capture.get_event),
-    opt_slash_path("s", capture.get_event),  # session recordings
+    *ingestion_urlpatterns,
     opt_slash_path("robots.txt", robots_txt),
     opt_slash_path(".well-known/security.txt", security_txt),
     # auth
@@ -0,0 +1,33 @@
+"""
+URLs served by capture-only processes (see `posthog/wsgi_capture.py`), which are also mounted as part of the full app.
+
+`_livez` and `_readyz` are answered by `healthcheck_middleware` before routing.
+"""
+from typing import Callable, Optional
+
+from django.urls import URLPattern, re_path
+
+from posthog.api import capture, decide
+from posthog.views import health
+
+
+def opt_slash_path(route: str, view: Callable, name: Optional[str] = None) -> URLPattern:
+    """Catches path with or without trailing slash, taking into account query param and hash."""
+    # Ignoring the type because while name can be optional on re_path, mypy doesn't agree
+    return re_path(fr"^{route}/?(?:[?#].*)?$", view, name=name)  # type: ignore
+
+
+ingestion_urlpatterns = [
+    opt_slash_path("decide", decide.get_decide),
+    opt_slash_path("e", capture.get_event),
+    opt_slash_path("engage", capture.get_event),
+    opt_slash_path("track", capture.get_event),
+    opt_slash_path("capture", capture.get_event),
+    opt_slash_path("batch", capture.get_event),
+    opt_slash_path("s", capture.get_event),  # session recordings
+]
+
+urlpatterns = [
+    opt_slash_path("_health", health),
+    *ingestion_urlpatterns,
+]
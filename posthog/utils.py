@@ -4,6 +4,7 @@ import datetime
 import datetime as dt
 import gzip
 import hashlib
+import io
 import json
 import os
 import re
@@ -30,6 +31,7 @@ from typing import (
 from urllib.parse import urljoin, urlparse
 
 import lzstring
+import orjson
 import pytz
 from celery.schedules import crontab
 from dateutil import parser
@@ -475,22 +477,84 @@ def base64_decode(data):
     return data.decode("utf8", "surrogatepass").encode("utf-16", "surrogatepass")
 
 
+def _parse_json(data: Union[str, bytes]) -> Any:
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        # orjson is stricter than we need to be: it rejects NaN, Infinity, lone surrogates and non UTF-8 input,
+        # which the standard library handles, and which still gives us the error message if the JSON is invalid
+        pass
+
+    try:
+        # parse_constant gets called in case of NaN, Infinity etc
+        # default behaviour is to put those into the DB directly
+        # but we just want it to return None
+        return json.loads(data, parse_constant=lambda x: None)
+    except (json.JSONDecodeError, UnicodeDecodeError) as error:
+        raise RequestParsingError("Invalid JSON: %s" % (str(error)))
+
+
+def _parse_base64_json(data: Union[str, bytes]) -> Any:
+    try:
+        if not isinstance(data, str):
+            data = data.decode()
+        decoded = base64.b64decode(data.replace(" ", "+") + "===")
+    except ValueError:
+        # Not base64 after all, have the JSON parser explain what's wrong with it
+        return _parse_json(data)
+
+    try:
+        return orjson.loads(decoded)
+    except orjson.JSONDecodeError:
+        pass
+
+    try:
+        # Older client libraries can send UTF-16 surrogates, which `base64_decode` knows how to handle
+        decoded = base64_decode(data)
+    except ValueError:
+        return _parse_json(data)
+    return _parse_json(decoded)
+
+
+def _gzip_decompress(data: bytes) -> bytes:
+    "Like `gzip.decompress`, but stops reading once the output exceeds `MAX_DECOMPRESSED_REQUEST_SIZE`."
+    try:
+        with gzip.GzipFile(fileobj=io.BytesIO(data)) as gzip_file:
+            decompressed = gzip_file.read(settings.MAX_DECOMPRESSED_REQUEST_SIZE + 1)
+    except (EOFError, OSError, zlib.error) as error:
+        raise RequestParsingError("Failed to decompress data. %s" % (str(error)))
+
+    if len(decompressed) > settings.MAX_DECOMPRESSED_REQUEST_SIZE:
+        raise RequestParsingError(
+            "Failed to decompress data. Decompressed data exceeds %d bytes" % settings.MAX_DECOMPRESSED_REQUEST_SIZE
+        )
+    return decompressed
+
+
+def _looks_like_json(data: Union[str, bytes]) -> bool:
+    stripped = data.lstrip()
+    if isinstance(stripped, bytes):
+        return stripped[:1] in (b"{", b"[")
+    return stripped[:1] in ("{", "[")
+
+
 def decompress(data: Any, compression: str):
+    """
+    Decodes a capture/decide payload, picking a single path based on the declared compression and the data itself:
+    gzip (declared, or sniffed from its magic bytes), lz64, plain JSON or base64 encoded JSON.
+    """
     if not data:
         return None
 
-    if compression == "gzip" or compression == "gzip-js":
+    if compression == "gzip" or compression == "gzip-js" or (compression == "" and data[:2] == b"\x1f\x8b"):
         if data == b"undefined":
             raise RequestParsingError(
                 "data being loaded from the request body for decompression is the literal string 'undefined'"
             )
 
-        try:
-            data = gzip.decompress(data)
-        except (EOFError, OSError, zlib.error) as error:
-            raise RequestParsingError("Failed to decompress data. %s" % (str(error)))
+        data = _gzip_decompress(data)
 
-    if compression == "lz64":
+    elif compression == "lz64":
         if not isinstance(data, str):
             data = data.decode()
         data = data.replace(" ", "+")
@@ -499,35 +563,17 @@ def decompress(data: Any, compression: str):
 
         if not data:
             raise RequestParsingError("Failed to decompress data.")
+        if len(data) > settings.MAX_DECOMPRESSED_REQUEST_SIZE:
+            raise RequestParsingError(
+                "Failed to decompress data. Decompressed data exceeds %d bytes" % settings.MAX_DECOMPRESSED_REQUEST_SIZE
+            )
 
         data = data.encode("utf-16", "surrogatepass").decode("utf-16")
 
-    base64_decoded = None
-    try:
-        base64_decoded = base64_decode(data)
-    except Exception:
-        pass
-
-    if base64_decoded:
-        data = base64_decoded
-
-    try:
-        # parse_constant gets called in case of NaN, Infinity etc
-        # default behaviour is to put those into the DB directly
-        # but we just want it to return None
-        data = json.loads(data, parse_constant=lambda x: None)
-    except (json.JSONDecodeError, UnicodeDecodeError) as error_main:
-        if compression == "":
-            try:
-                return decompress(data, "gzip")
-            except Exception as inner:
-                # re-trying with compression set didn't succeed, throw original error
-                raise RequestParsingError("Invalid JSON: %s" % (str(error_main))) from inner
-        else:
-            raise RequestParsingError("Invalid JSON: %s" % (str(error_main)))
-
     # TODO: data can also be an array, function assumes it's either None or a dictionary.
-    return data
+    if _looks_like_json(data):
+        return _parse_json(data)
+    return _parse_base64_json(data)
 
 
 # Used by non-DRF endpoints from capture.py and decide.py (/decide, /batch, /capture, etc)
@@ -0,0 +1,16 @@
+"""
+WSGI config for capture-only processes.
+
+These serve just the ingestion endpoints (`/e`, `/decide`, `/s` and friends) along with health checks, with the
+trimmed down middleware stack from `CAPTURE_MIDDLEWARE`, so that ingestion can be scaled and deployed separately
+from the rest of the app. Run with `GUNICORN_PROCESS_TYPE=capture`, see `gunicorn.config.py`.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "posthog.settings")
+os.environ["CAPTURE_ONLY"] = "true"
+
+application = get_wsgi_application()